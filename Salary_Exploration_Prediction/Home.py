@@ -1,10 +1,5 @@
 
-from matplotlib import pyplot as plt
-import numpy as np
 import streamlit as st
-import pandas as pd
-import pickle
-import seaborn as sns
 
 
 st.set_page_config(
@@ -0,0 +1,61 @@
+"""
+Helpers shared by the benchmarks.
+"""
+
+import os
+import sys
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PAGES = {
+    'Home': os.path.join(APP_DIR, 'Home.py'),
+    'Overview': os.path.join(APP_DIR, 'pages', 'Overview.py'),
+    'Dynamic_Visualization': os.path.join(APP_DIR, 'pages', 'Dynamic_Visualization.py'),
+    'Salary_Prediction': os.path.join(APP_DIR, 'pages', 'Salary_Prediction.py'),
+}
+
+# Heavy libraries whose import we want to keep out of the pages that do not need them
+HEAVY_MODULES = ['matplotlib', 'seaborn', 'plotly', 'sklearn']
+
+
+def peak_rss_mb():
+    """Peak resident memory of the current process in MB (None if it cannot be measured)."""
+    try:
+        import resource
+    except ImportError:
+        try:
+            import psutil
+        except ImportError:
+            return None
+        return psutil.Process().memory_info().peak_wset / 2 ** 20
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Bytes on macOS, kilobytes on Linux
+    return peak / 2 ** 20 if sys.platform == 'darwin' else peak / 2 ** 10
+
+
+def current_rss_mb():
+    """Current resident memory of the process in MB (None if it cannot be measured)."""
+    try:
+        with open('/proc/self/statm') as file:
+            return int(file.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+    except (OSError, ValueError, AttributeError):
+        try:
+            import psutil
+        except ImportError:
+            return None
+        return psutil.Process().memory_info().rss / 2 ** 20
+
+
+def loaded_heavy_modules():
+    return [name for name in HEAVY_MODULES if name in sys.modules]
+
+
+def use_app_imports():
+    # `streamlit run Home.py` puts the app folder on sys.path; the benchmarks do the same
+    if APP_DIR not in sys.path:
+        sys.path.insert(0, APP_DIR)
+
+
+def use_data_dir(folder):
+    # Point utils.data at <folder>/Data and <folder>/Models; call it before importing utils
+    os.environ['SALARY_APP_DATA_DIR'] = os.path.join(folder, 'Data')
+    os.environ['SALARY_APP_MODELS_DIR'] = os.path.join(folder, 'Models')
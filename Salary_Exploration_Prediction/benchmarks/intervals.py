@@ -0,0 +1,104 @@
+"""
+Benchmark of the prediction intervals against the plain prediction.
+
+For projections of several horizons, times one call of:
+
+- predict: the pickled RandomForestRegressor (what the page did before the
+  prediction table and the compact forest);
+- forest predict: the mean of the trees of the compact forest;
+- intervals: the mean and the quantiles of all the trees of the compact
+  forest, from its single batched pass (what the page does with the
+  prediction interval shown);
+- per-tree loop: the quantiles of the tree predictions taken by calling
+  predict() on every estimator of the pickled forest, the naive way.
+
+against a synthetic data folder (see benchmarks/synthetic.py) or an existing
+one. From the app folder:
+
+    python -m benchmarks.intervals --horizons 10 40 --output intervals.json
+"""
+
+import argparse
+import json
+import os
+import time
+import warnings
+
+import numpy as np
+
+from benchmarks.common import use_app_imports, use_data_dir
+
+
+def best_time(call, repeat):
+    # Lowest time of `repeat` calls, in milliseconds
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        call()
+        times.append(time.perf_counter() - start)
+    return min(times) * 1000
+
+
+def run(horizons, repeat=50):
+    from utils.forest import FOREST_PATH, load_forest
+    from utils.prediction import QUANTILES, feature_matrix, load_steps
+
+    forest = load_forest()
+    if forest is None:
+        raise SystemExit(f'No compact forest of the current model in {FOREST_PATH}: the intervals need '
+                         'a random forest model (train with --engines random_forest)')
+    model = load_steps()['model']
+
+    def per_tree_loop(X):
+        trees = np.stack([estimator.predict(X) for estimator in model.estimators_], axis=1)
+        return np.quantile(trees, QUANTILES, axis=1)
+
+    results = []
+    for horizon in horizons:
+        X = feature_matrix(1, 1, np.arange(5, 5 + horizon + 1))
+        with warnings.catch_warnings():
+            # The estimators were fitted without feature names
+            warnings.simplefilter('ignore', UserWarning)
+            timings = {
+                'predict_ms': best_time(lambda: model.predict(X), repeat),
+                'forest_predict_ms': best_time(lambda: forest.predict(X), repeat),
+                'intervals_ms': best_time(lambda: forest.predict_quantiles(X, QUANTILES), repeat),
+                'per_tree_loop_ms': best_time(lambda: per_tree_loop(X), repeat),
+            }
+        results.append({'horizon': horizon, 'rows': len(X), 'trees': forest.n_estimators,
+                         **{name: round(value, 3) for name, value in timings.items()}})
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Time the prediction intervals against the plain prediction.')
+    parser.add_argument('--data-folder', help='Folder with Data/ and Models/ (default: synthetic data)')
+    parser.add_argument('--horizons', type=int, nargs='*', default=[10, 40], help='Projection horizons timed')
+    parser.add_argument('--repeat', type=int, default=50, help='Calls timed per measurement (the best is kept)')
+    parser.add_argument('--output', help='Write the results to this JSON file')
+    args = parser.parse_args(argv)
+
+    folder = args.data_folder
+    if folder is None:
+        from benchmarks import synthetic
+        from benchmarks.pages import WORK_DIR
+
+        folder = os.path.join(WORK_DIR, 'x1')
+        if not os.path.exists(os.path.join(folder, 'Models', 'saved_steps.pkl')):
+            synthetic.build(folder, 1)
+    use_data_dir(folder)
+    use_app_imports()
+
+    results = run(args.horizons, args.repeat)
+    print(f'{"horizon":>8} {"rows":>5} {"predict":>10} {"forest":>10} {"intervals":>10} {"per-tree loop":>14}  (ms)')
+    for result in results:
+        print(f'{result["horizon"]:>8} {result["rows"]:>5} {result["predict_ms"]:>10.3f} '
+              f'{result["forest_predict_ms"]:>10.3f} {result["intervals_ms"]:>10.3f} '
+              f'{result["per_tree_loop_ms"]:>14.3f}')
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
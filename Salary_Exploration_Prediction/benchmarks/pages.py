@@ -0,0 +1,266 @@
+"""
+Headless benchmark of every page, section and prediction input.
+
+Each data scale is benchmarked in its own Python process pointed at a
+synthetic data folder (see benchmarks/synthetic.py, generated on first use)
+or at an existing one. In that process Streamlit's AppTest runner renders
+Home, every section of Overview and Dynamic Visualization, pages through
+the data table of 'Show Data Summary' (DATA_TABLE_SCENARIOS), and clicks
+'Predict Salary' for a sweep of countries, education levels and years of
+experience. For every scenario it records the wall time of the first run and
+of the repeated (warm) runs, the resident memory, and the size of what would
+be sent to the browser: the element messages plus the images they reference.
+From the app folder:
+
+    python -m benchmarks.pages --scales 1 10 100 --output pages.json
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.common import APP_DIR, PAGES, current_rss_mb, peak_rss_mb, use_app_imports, use_data_dir
+
+# Where the synthetic data folders are generated
+WORK_DIR = os.path.join(tempfile.gettempdir(), 'salary-benchmarks')
+
+SECTION_PAGES = ['Overview', 'Dynamic_Visualization']
+EXPERIENCE_SWEEP = [0, 5, 15, 40]
+
+# Views of the data table of the Data overview: sorted column and order, page
+# ('first' or 'last') and whether only the first country is kept
+DATA_TABLE_SCENARIOS = [
+    {'sort_by': None, 'order': 'Ascending', 'page': 'first', 'filtered': False},
+    {'sort_by': 'Salary', 'order': 'Descending', 'page': 'first', 'filtered': False},
+    {'sort_by': 'YearsCodePro', 'order': 'Ascending', 'page': 'last', 'filtered': False},
+    {'sort_by': 'Salary', 'order': 'Ascending', 'page': 'last', 'filtered': True},
+]
+
+
+# Size of the media files (st.image/st.pyplot bytes) by URL, see record_media()
+_media_sizes = {}
+
+
+def record_media():
+    """Remember the size of every media file the pages add, which AppTest does not keep."""
+    from streamlit.runtime.media_file_manager import MediaFileManager
+
+    add = MediaFileManager.add
+    if getattr(add, 'records_sizes', False):
+        return
+
+    def add_and_record(self, path_or_data, *args, **kwargs):
+        url = add(self, path_or_data, *args, **kwargs)
+        if isinstance(path_or_data, bytes):
+            _media_sizes[url] = len(path_or_data)
+        elif isinstance(path_or_data, str) and os.path.exists(path_or_data):
+            _media_sizes[url] = os.path.getsize(path_or_data)
+        return url
+    add_and_record.records_sizes = True
+    MediaFileManager.add = add_and_record
+
+
+def payload(at):
+    """Bytes of the element messages of the last run and of the figures among them."""
+    total = figures = 0
+    nodes = [at._tree]
+    while nodes:
+        node = nodes.pop()
+        children = getattr(node, 'children', None)
+        if children is not None:
+            nodes.extend(children.values())
+            continue
+        proto = getattr(node, 'proto', None)
+        if proto is None:
+            continue
+        size = proto.ByteSize()
+        if node.type == 'plotly_chart':
+            figures += size
+        elif node.type == 'image':
+            size += sum(_media_sizes.get(image.url, 0) for image in proto.imgs)
+            figures += size
+        total += size
+    return {'payload_bytes': total, 'figure_bytes': figures}
+
+
+def measure(scenario, action, repeat):
+    """Run `action()` (returns the AppTest) once cold and `repeat` more times, and record the run."""
+    rss_before = current_rss_mb()
+    start = time.perf_counter()
+    at = action()
+    first = time.perf_counter() - start
+    warm = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        at = action()
+        warm.append(time.perf_counter() - start)
+    result = dict(scenario)
+    result.update({
+        'first_run_seconds': round(first, 4),
+        'warm_run_seconds': round(statistics.median(warm), 4) if warm else None,
+        'rss_before_mb': rss_before,
+        'rss_after_mb': current_rss_mb(),
+        'peak_rss_mb': peak_rss_mb(),
+        'exceptions': [exception.message for exception in at.exception],
+    })
+    result.update(payload(at))
+    return result
+
+
+def page_runner(page, timeout):
+    from streamlit.testing.v1 import AppTest
+
+    def run(section=None):
+        at = AppTest.from_file(PAGES[page], default_timeout=timeout)
+        at.run()
+        if section is not None:
+            at.sidebar.radio[0].set_value(section).run()
+        return at
+    return run
+
+
+def widget(widgets, label):
+    # Widget of the page whose label starts with `label`
+    return next(found for found in widgets if found.label.startswith(label))
+
+
+def data_table_runner(timeout):
+    from streamlit.testing.v1 import AppTest
+
+    def run(sort_by, order, page, filtered):
+        at = AppTest.from_file(PAGES['Overview'], default_timeout=timeout)
+        at.run()
+        at.sidebar.radio[0].set_value('Data overview').run()
+        at.checkbox[0].check().run()
+        if filtered:
+            country = widget(at.multiselect, 'Country')
+            country.set_value(country.options[:1])
+        widget(at.selectbox, 'Sort by').set_value(sort_by)
+        widget(at.radio, 'Order').set_value(order)
+        at.run()
+        if page == 'last':
+            page_input = widget(at.number_input, 'Page')
+            page_input.set_value(int(page_input.proto.max)).run()
+        return at
+    return run
+
+
+def prediction_runner(timeout):
+    from streamlit.testing.v1 import AppTest
+
+    def run(country, education, experience):
+        at = AppTest.from_file(PAGES['Salary_Prediction'], default_timeout=timeout)
+        at.run()
+        at.sidebar.selectbox[0].set_value(country)
+        at.sidebar.selectbox[1].set_value(education)
+        at.sidebar.slider[0].set_value(experience)
+        at.button[0].click().run()
+        return at
+    return run
+
+
+def benchmark(repeat=2, sweep_countries=3, timeout=600, log=None):
+    """Benchmark every scenario in the current process and return the results."""
+    record_media()
+    results = []
+
+    def record(scenario, action):
+        result = measure(scenario, action, repeat)
+        results.append(result)
+        if log:
+            log(result)
+
+    record({'page': 'Home', 'section': None}, page_runner('Home', timeout))
+    for page in SECTION_PAGES:
+        run = page_runner(page, timeout)
+        sections = run().sidebar.radio[0].options
+        for section in sections:
+            record({'page': page, 'section': section}, lambda: run(section))
+
+    run = data_table_runner(timeout)
+    for scenario in DATA_TABLE_SCENARIOS:
+        record({'page': 'Overview', 'section': 'Show Data Summary', 'inputs': scenario}, lambda: run(**scenario))
+
+    from streamlit.testing.v1 import AppTest
+
+    run = prediction_runner(timeout)
+    at = AppTest.from_file(PAGES['Salary_Prediction'], default_timeout=timeout)
+    at.run()
+    countries = at.sidebar.selectbox[0].options[:sweep_countries]
+    education_levels = at.sidebar.selectbox[1].options
+    for country in countries:
+        for education in education_levels:
+            for experience in EXPERIENCE_SWEEP:
+                record(
+                    {'page': 'Salary_Prediction', 'section': 'Predict Salary',
+                     'inputs': {'country': country, 'education': education, 'experience': experience}},
+                    lambda: run(country, education, experience),
+                )
+    return results
+
+
+def run_folder(folder, label, args):
+    """Benchmark the data in `folder` in a child process."""
+    command = [sys.executable, '-m', 'benchmarks.pages', '--child', folder,
+               '--repeat', str(args.repeat), '--sweep-countries', str(args.sweep_countries)]
+    process = subprocess.run(command, cwd=APP_DIR, capture_output=True, text=True)
+    if process.returncode != 0:
+        raise RuntimeError(f'Benchmark of {folder} failed:\n{process.stderr[-2000:]}')
+    results = json.loads(process.stdout.strip().splitlines()[-1])
+    for result in results:
+        result['data'] = label
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark every page, section and prediction input.')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    parser.add_argument('--scales', nargs='*', type=float, default=[1],
+                        help='Synthetic survey sizes, as multiples of the 2023 survey')
+    parser.add_argument('--data-folder', help='Benchmark this folder (with Data/ and Models/) instead')
+    parser.add_argument('--work-dir', default=WORK_DIR, help='Where the synthetic data is generated')
+    parser.add_argument('--repeat', type=int, default=2, help='Warm runs of every scenario')
+    parser.add_argument('--sweep-countries', type=int, default=3, help='Countries of the prediction sweep')
+    parser.add_argument('--output', help='Write the results to this JSON file')
+    args = parser.parse_args(argv)
+
+    if args.child:
+        use_data_dir(args.child)
+        use_app_imports()
+        print(json.dumps(benchmark(args.repeat, args.sweep_countries)))
+        return
+
+    folders = []
+    if args.data_folder:
+        folders.append((os.path.abspath(args.data_folder), 'data'))
+    else:
+        for scale in args.scales:
+            folder = os.path.join(os.path.abspath(args.work_dir), f'x{scale:g}')
+            if not os.path.exists(os.path.join(folder, 'Models', 'saved_steps.pkl')):
+                subprocess.run([sys.executable, '-m', 'benchmarks.synthetic', '--scale', str(scale),
+                                '--output', folder], cwd=APP_DIR, check=True)
+            folders.append((folder, f'x{scale:g}'))
+
+    results = []
+    for folder, label in folders:
+        for result in run_folder(folder, label, args):
+            results.append(result)
+            scenario = result['section'] or ''
+            if 'inputs' in result:
+                scenario = ', '.join(str(value) for value in result['inputs'].values())
+            print(f"{label:<5} {result['page']:<22} {scenario[:40]:<40} "
+                  f"{result['first_run_seconds']:>7.3f} s  warm {result['warm_run_seconds'] or 0:>7.3f} s  "
+                  f"RSS {result['rss_after_mb'] or 0:>5.0f} MB  figures {result['figure_bytes'] / 1024:>7.0f} kB"
+                  + ('  EXCEPTION' if result['exceptions'] else ''))
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
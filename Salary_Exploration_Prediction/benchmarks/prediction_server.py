@@ -0,0 +1,166 @@
+"""
+Load test of the prediction server (utils/prediction_server.py).
+
+Starts the server on a synthetic data folder (see benchmarks/synthetic.py) or
+an existing one, unless --url points at a running server, then sends
+requests from several client processes, each with keep-alive connections, at
+every concurrency level for a fixed duration. For every level it reports the
+throughput and the p50/p99 latency. From the app folder:
+
+    python -m benchmarks.prediction_server --workers 4 --concurrency 1 8 32 --output server.json
+"""
+
+import argparse
+import http.client
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+import threading
+import time
+import urllib.parse
+import urllib.request
+
+import numpy as np
+
+from benchmarks.common import APP_DIR
+from benchmarks.pages import WORK_DIR
+ENDPOINTS = ['predict', 'projection']
+
+
+def wait_for(url, server=None, timeout=120):
+    """Return the /model description of the server once it answers."""
+    deadline = time.time() + timeout
+    while True:
+        try:
+            with urllib.request.urlopen(url + '/model', timeout=5) as response:
+                return json.load(response)
+        except OSError:
+            if server is not None and server.poll() is not None:
+                raise RuntimeError(f'The prediction server exited with code {server.returncode}')
+            if time.time() > deadline:
+                raise
+            time.sleep(0.2)
+
+
+def start_server(folder, port, workers, batch_wait_ms):
+    env = dict(os.environ, SALARY_APP_DATA_DIR=os.path.join(folder, 'Data'),
+               SALARY_APP_MODELS_DIR=os.path.join(folder, 'Models'))
+    return subprocess.Popen(
+        [sys.executable, '-m', 'utils.prediction_server', '--port', str(port), '--workers', str(workers),
+         '--batch-wait-ms', str(batch_wait_ms)], cwd=APP_DIR, env=env, stdout=subprocess.DEVNULL)
+
+
+def _client(url, endpoint, inputs, threads, duration, seed):
+    # Latencies (seconds) of the requests sent by `threads` keep-alive connections for `duration`
+    address = urllib.parse.urlparse(url)
+    latencies = []
+    errors = []
+    stop = time.perf_counter() + duration
+
+    def run(index):
+        rng = np.random.default_rng(seed * 1000 + index)
+        connection = http.client.HTTPConnection(address.hostname, address.port, timeout=30)
+        while time.perf_counter() < stop:
+            body = json.dumps(inputs[rng.integers(len(inputs))])
+            start = time.perf_counter()
+            connection.request('POST', '/' + endpoint, body, {'Content-Type': 'application/json'})
+            response = connection.getresponse()
+            response.read()
+            latencies.append(time.perf_counter() - start)
+            if response.status != 200:
+                errors.append(response.status)
+        connection.close()
+
+    workers = [threading.Thread(target=run, args=(index,)) for index in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return latencies, len(errors)
+
+
+def load_test(url, endpoint, inputs, concurrency, duration):
+    """Throughput and latency percentiles of `concurrency` simultaneous clients."""
+    processes = min(concurrency, os.cpu_count() or 1)
+    threads = [concurrency // processes + (index < concurrency % processes) for index in range(processes)]
+    with multiprocessing.Pool(processes) as pool:
+        start = time.perf_counter()
+        results = pool.starmap(_client, [(url, endpoint, inputs, count, duration, index)
+                                         for index, count in enumerate(threads)])
+        elapsed = time.perf_counter() - start
+    latencies = np.concatenate([latencies for latencies, _ in results]) * 1000
+    return {
+        'endpoint': endpoint,
+        'concurrency': concurrency,
+        'requests': len(latencies),
+        'errors': sum(errors for _, errors in results),
+        'throughput_rps': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(float(np.percentile(latencies, 50)), 3),
+        'p99_ms': round(float(np.percentile(latencies, 99)), 3),
+    }
+
+
+def sample_inputs(model, horizon, count=500, seed=0):
+    # Random valid requests over the countries and education levels of the model
+    rng = np.random.default_rng(seed)
+    return [{
+        'country': str(rng.choice(model['countries'])),
+        'education': str(rng.choice(model['education_levels'])),
+        'experience': int(rng.integers(0, 51)),
+        'horizon': horizon,
+    } for _ in range(count)]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Load-test the prediction server.')
+    parser.add_argument('--url', help='Test a running server instead of starting one')
+    parser.add_argument('--data-folder', help='Folder with Data/ and Models/ (default: synthetic data)')
+    parser.add_argument('--port', type=int, default=8611)
+    parser.add_argument('--workers', type=int, default=4, help='Worker processes of the started server')
+    parser.add_argument('--batch-wait-ms', type=float, default=0)
+    parser.add_argument('--concurrency', nargs='*', type=int, default=[1, 8, 32])
+    parser.add_argument('--endpoints', nargs='*', choices=ENDPOINTS, default=ENDPOINTS)
+    parser.add_argument('--horizon', type=int, default=10, help='Years of the projection requests')
+    parser.add_argument('--duration', type=float, default=5, help='Seconds of every level')
+    parser.add_argument('--output', help='Write the results to this JSON file')
+    args = parser.parse_args(argv)
+
+    server = None
+    url = args.url
+    if url is None:
+        folder = args.data_folder
+        if folder is None:
+            from benchmarks import synthetic
+
+            folder = os.path.join(WORK_DIR, 'x1')
+            if not os.path.exists(os.path.join(folder, 'Models', 'saved_steps.pkl')):
+                synthetic.build(folder, 1)
+        server = start_server(folder, args.port, args.workers, args.batch_wait_ms)
+        url = f'http://127.0.0.1:{args.port}'
+    try:
+        model = wait_for(url, server)
+        inputs = sample_inputs(model, args.horizon)
+        results = []
+        print(f'{model["model"]} served at {url}')
+        print(f'{"endpoint":<12}{"clients":>8}{"requests":>10}{"req/s":>10}{"p50 ms":>10}{"p99 ms":>10}{"errors":>8}')
+        for endpoint in args.endpoints:
+            for concurrency in args.concurrency:
+                result = load_test(url, endpoint, inputs, concurrency, args.duration)
+                results.append(result)
+                print(f'{endpoint:<12}{concurrency:>8}{result["requests"]:>10}{result["throughput_rps"]:>10}'
+                      f'{result["p50_ms"]:>10}{result["p99_ms"]:>10}{result["errors"]:>8}')
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump({'url': url, 'model': model['model'], 'workers': args.workers, 'results': results}, file,
+                      indent=2)
+
+
+if __name__ == '__main__':
+    main()
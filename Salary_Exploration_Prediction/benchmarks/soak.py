@@ -0,0 +1,151 @@
+"""
+Soak test of the Matplotlib pages: memory over thousands of reruns.
+
+Several sessions (threads, each with its own AppTest) rerun the Matplotlib
+sections of Overview and the prediction of Salary Prediction in a loop
+against a synthetic data folder (see benchmarks/synthetic.py) or an existing
+one. The figure cache is cleared before every rerun so that every rerun draws
+its figure. Every --sample-every reruns the resident memory of the process
+(after giving the freed heap back to the OS, so that the large pixel buffers
+of a figure being drawn at that moment do not hide the trend) and the number
+of live Matplotlib figures are recorded; a leak shows as memory growing with
+the reruns and figures piling up. The memory still moves with the figures
+being drawn by the other sessions, so the test compares its floor: it fails
+when the lowest sample of the last third of the run exceeds the lowest of the
+first third by more than --max-growth-mb (one leaked figure per rerun would
+add megabytes per rerun). From the app folder:
+
+    python -m benchmarks.soak --reruns 2000 --sessions 4 --output soak.json
+"""
+
+import argparse
+import ctypes
+import gc
+import json
+import os
+import sys
+import threading
+import time
+
+from benchmarks.common import PAGES, current_rss_mb, use_app_imports, use_data_dir
+
+OVERVIEW_SECTIONS = ['Country Data Distribution', 'Average Salary by Country',
+                     'Salary Progression Over Years of Experience', 'Salary Distribution by Education Level',
+                     'Heatmap of Salary by Country and Education Level']
+
+
+def live_figures():
+    """Matplotlib figures still referenced in the process, and those registered in pyplot."""
+    if 'matplotlib' not in sys.modules:
+        return 0, 0
+    from matplotlib.figure import Figure
+
+    gc.collect()
+    registered = len(sys.modules['matplotlib.pyplot'].get_fignums()) if 'matplotlib.pyplot' in sys.modules else 0
+    return sum(isinstance(item, Figure) for item in gc.get_objects()), registered
+
+
+def release_memory():
+    # Return the freed heap to the OS (glibc only), then measure
+    gc.collect()
+    try:
+        ctypes.CDLL('libc.so.6').malloc_trim(0)
+    except (OSError, AttributeError):
+        pass
+    return current_rss_mb()
+
+
+def session(index, reruns, counter, lock, errors, timeout):
+    # One session: its own AppTest per page, rerun round-robin over the sections
+    from streamlit.testing.v1 import AppTest
+    from utils import figure_cache
+
+    overview = AppTest.from_file(PAGES['Overview'], default_timeout=timeout).run()
+    prediction = AppTest.from_file(PAGES['Salary_Prediction'], default_timeout=timeout).run()
+    step = index
+    while True:
+        with lock:
+            if counter[0] >= reruns:
+                return
+            counter[0] += 1
+        figure_cache.clear()
+        section = step % (len(OVERVIEW_SECTIONS) + 1)
+        if section < len(OVERVIEW_SECTIONS):
+            overview.sidebar.radio[0].set_value(OVERVIEW_SECTIONS[section]).run()
+            at = overview
+        else:
+            prediction.sidebar.slider[0].set_value(step % 51)
+            prediction.button[0].click().run()
+            at = prediction
+        if at.exception:
+            errors.append(str(at.exception[0].value))
+        step += 1
+
+
+def soak(reruns=2000, sessions=4, sample_every=25, timeout=120, log=print):
+    """Run `reruns` reruns over `sessions` parallel sessions and sample the memory."""
+    counter = [0]
+    lock = threading.Lock()
+    errors = []
+    threads = [threading.Thread(target=session, args=(index, reruns, counter, lock, errors, timeout), daemon=True)
+               for index in range(sessions)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    samples = []
+    last = -1
+    while any(thread.is_alive() for thread in threads):
+        time.sleep(0.5)
+        done = counter[0]
+        if done // sample_every != last // sample_every or done >= reruns:
+            figures, registered = live_figures()
+            sample = {'reruns': done, 'seconds': round(time.perf_counter() - start, 1),
+                      'rss_mb': round(release_memory(), 1), 'figures': figures, 'pyplot_figures': registered}
+            samples.append(sample)
+            log(f'{done:>7} reruns  {sample["rss_mb"]:>8.1f} MB  {figures:>4} figures ({registered} in pyplot)')
+            last = done
+    for thread in threads:
+        thread.join()
+    return samples, errors
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Rerun the Matplotlib pages and check that memory stays flat.')
+    parser.add_argument('--data-folder', help='Folder with Data/ and Models/ (default: synthetic data)')
+    parser.add_argument('--reruns', type=int, default=2000)
+    parser.add_argument('--sessions', type=int, default=4, help='Sessions rerunning in parallel')
+    parser.add_argument('--sample-every', type=int, default=25, help='Reruns between memory samples')
+    parser.add_argument('--max-growth-mb', type=float, default=50, help='Largest accepted growth after warm-up')
+    parser.add_argument('--output', help='Write the samples to this JSON file')
+    args = parser.parse_args(argv)
+
+    folder = args.data_folder
+    if folder is None:
+        from benchmarks import synthetic
+        from benchmarks.pages import WORK_DIR
+
+        folder = os.path.join(WORK_DIR, 'x1')
+        if not os.path.exists(os.path.join(folder, 'Models', 'saved_steps.pkl')):
+            synthetic.build(folder, 1)
+    use_data_dir(folder)
+    use_app_imports()
+
+    samples, errors = soak(args.reruns, args.sessions, args.sample_every)
+    # The first sample is taken before anything is loaded
+    memory = [sample['rss_mb'] for sample in samples[1:]]
+    third = max(1, len(memory) // 3)
+    growth = min(memory[-third:]) - min(memory[:third])
+    print(f'Memory growth: {growth:+.1f} MB over {samples[-1]["reruns"]} reruns '
+          f'(lowest memory of the last third of the run minus the first), {len(errors)} errors')
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump({'sessions': args.sessions, 'growth_mb': growth, 'errors': errors[:10], 'samples': samples},
+                      file, indent=2)
+    if errors:
+        raise SystemExit(f'Reruns failed: {errors[0]}')
+    if growth > args.max_growth_mb:
+        raise SystemExit(f'Memory grew by {growth:.1f} MB (more than {args.max_growth_mb} MB)')
+
+
+if __name__ == '__main__':
+    main()
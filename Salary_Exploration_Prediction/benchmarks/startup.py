@@ -0,0 +1,73 @@
+"""
+Cold-start benchmark of the pages.
+
+Every page is run once in a fresh Python process (through Streamlit's
+headless AppTest runner), as a new worker would do, and the benchmark records
+how long the first run takes, the peak resident memory before and after it
+and which heavy plotting/ML libraries it imported. From the app folder:
+
+    python -m benchmarks.startup [--output startup.json]
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+import time
+
+from benchmarks.common import APP_DIR, PAGES, loaded_heavy_modules, peak_rss_mb, use_app_imports
+
+
+def measure_page(page):
+    # Runs in the child process
+    use_app_imports()
+    from streamlit.testing.v1 import AppTest
+
+    rss_before = peak_rss_mb()
+    start = time.perf_counter()
+    at = AppTest.from_file(PAGES[page], default_timeout=600)
+    at.run()
+    return {
+        'page': page,
+        'first_run_seconds': round(time.perf_counter() - start, 4),
+        'rss_before_mb': rss_before,
+        'peak_rss_mb': peak_rss_mb(),
+        'heavy_modules': loaded_heavy_modules(),
+        'exceptions': [exception.message for exception in at.exception],
+    }
+
+
+def run(pages=None):
+    """Measure every page in its own process and return the results."""
+    results = []
+    for page in pages or PAGES:
+        process = subprocess.run(
+            [sys.executable, '-m', 'benchmarks.startup', '--child', page],
+            cwd=APP_DIR, capture_output=True, text=True, check=True,
+        )
+        results.append(json.loads(process.stdout.strip().splitlines()[-1]))
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Measure the cold start of every page.')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    parser.add_argument('--pages', nargs='*', choices=list(PAGES), help='Pages to measure (all by default)')
+    parser.add_argument('--output', help='Write the results to this JSON file')
+    args = parser.parse_args(argv)
+
+    if args.child:
+        print(json.dumps(measure_page(args.child)))
+        return
+
+    results = run(args.pages)
+    for result in results:
+        print(f"{result['page']:<22} {result['first_run_seconds']:>8.3f} s  "
+              f"peak RSS {result['peak_rss_mb']:.0f} MB  heavy modules: {', '.join(result['heavy_modules']) or '-'}")
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
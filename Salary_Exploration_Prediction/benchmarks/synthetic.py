@@ -0,0 +1,136 @@
+"""
+Synthetic survey data for the benchmarks.
+
+Writes a survey_results_public.csv shaped like the Stack Overflow survey (the
+five columns the app reads plus some free-text filler columns) with
+`scale` times the rows of the 2023 survey, then runs the training pipeline on
+it so the folder holds everything the pages read: the cleaned datasets, their
+snapshots, the country summary and a (small) promoted model. From the app
+folder:
+
+    python -m benchmarks.synthetic --scale 10 --output /tmp/salary-bench/x10
+"""
+
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.common import use_app_imports, use_data_dir
+
+# Responses of the 2023 survey, the 1x size
+SURVEY_ROWS = 89184
+
+COUNTRIES = [
+    'United States of America', 'Germany', 'India', 'United Kingdom of Great Britain and Northern Ireland',
+    'Canada', 'France', 'Poland', 'Netherlands', 'Brazil', 'Australia', 'Spain', 'Italy', 'Sweden',
+    'Switzerland', 'Austria', 'Israel', 'Czech Republic', 'Denmark', 'Norway', 'Portugal', 'Belgium',
+    'Finland', 'Romania', 'Ukraine', 'Russian Federation', 'Turkey', 'Mexico', 'Argentina', 'Pakistan',
+    'South Africa', 'New Zealand', 'Greece', 'Hungary', 'Ireland', 'Japan', 'China', 'Nigeria', 'Iran',
+    'Bangladesh', 'Indonesia', 'Colombia', 'Chile', 'Egypt', 'Kenya', 'Viet Nam', 'Philippines',
+    'Iceland', 'Malta', 'Fiji', 'Luxembourg',
+]
+EDUCATION_LEVELS = [
+    'Bachelor’s degree (B.A., B.S., B.Eng., etc.)',
+    'Master’s degree (M.A., M.S., M.Eng., MBA, etc.)',
+    'Professional degree (JD, MD, Ph.D, Ed.D, etc.)',
+    'Some college/university study without earning a degree',
+    'Secondary school (e.g. American high school, German Realschule or Gymnasium, etc.)',
+    'Associate degree (A.A., A.S., etc.)',
+    'Primary/elementary school',
+    'Something else',
+]
+EDUCATION_WEIGHTS = [0.42, 0.23, 0.04, 0.12, 0.09, 0.03, 0.02, 0.05]
+EDUCATION_PREMIUM = [1.0, 1.15, 1.3, 0.9, 0.8, 0.9, 0.7, 0.85]
+EMPLOYMENT = [
+    'Employed, full-time',
+    'Independent contractor, freelancer, or self-employed',
+    'Employed, part-time',
+    'Student, full-time',
+]
+EMPLOYMENT_WEIGHTS = [0.7, 0.12, 0.05, 0.13]
+LANGUAGES = ['JavaScript', 'Python', 'SQL', 'TypeScript', 'Java', 'C#', 'C++', 'Go', 'Rust', 'PHP']
+
+# Free-text columns standing in for the rest of the survey
+EXTRA_COLUMNS = 10
+
+# Share of missing values in the columns the app reads
+MISSING_SHARE = {'Country': 0.01, 'EdLevel': 0.02, 'YearsCodePro': 0.2, 'ConvertedCompYearly': 0.45}
+
+# Small model, so that generating 100x does not take hours: only the random
+# forest engine (which the prediction intervals and the compact forest need),
+# with a single grid point
+ENGINES = ['random_forest']
+PARAM_GRID = {'max_depth': [10], 'n_estimators': [50]}
+
+
+def generate_survey(rows, extra_columns=EXTRA_COLUMNS, seed=0):
+    """Return a synthetic survey with `rows` responses."""
+    rng = np.random.default_rng(seed)
+    # Long-tailed country sizes, so that some countries fall under the cut-off
+    country_weights = 1 / np.arange(1, len(COUNTRIES) + 1) ** 1.3
+    country = rng.choice(len(COUNTRIES), rows, p=country_weights / country_weights.sum())
+    education = rng.choice(len(EDUCATION_LEVELS), rows, p=EDUCATION_WEIGHTS)
+    years = np.minimum(rng.gamma(2.0, 5.0, rows).astype(int), 51)
+
+    # Salary grows with the country level, the education and the experience
+    country_level = np.exp(rng.normal(11.0, 0.5, len(COUNTRIES)))
+    salary = (country_level[country] * np.asarray(EDUCATION_PREMIUM)[education]
+              * (1 + 0.05 * np.minimum(years, 25)) * rng.lognormal(0, 0.5, rows)).round()
+
+    years_text = np.array(['Less than 1 year'] + [str(value) for value in range(1, 51)] + ['More than 50 years'])
+    survey = pd.DataFrame({
+        'ResponseId': np.arange(1, rows + 1),
+        'Country': pd.Categorical.from_codes(country, COUNTRIES),
+        'EdLevel': pd.Categorical.from_codes(education, EDUCATION_LEVELS),
+        'YearsCodePro': pd.Categorical.from_codes(years, years_text),
+        'Employment': pd.Categorical.from_codes(
+            rng.choice(len(EMPLOYMENT), rows, p=EMPLOYMENT_WEIGHTS), EMPLOYMENT),
+        'ConvertedCompYearly': salary,
+    })
+    for column, share in MISSING_SHARE.items():
+        survey[column] = survey[column].mask(rng.random(rows) < share)
+
+    filler = np.unique([';'.join(rng.choice(LANGUAGES, 3, replace=False)) for _ in range(64)])
+    for index in range(extra_columns):
+        survey[f'Extra{index + 1}'] = pd.Categorical.from_codes(rng.integers(0, len(filler), rows), filler)
+    return survey
+
+
+def build(folder, scale=1, extra_columns=EXTRA_COLUMNS, param_grid=PARAM_GRID, engines=ENGINES, seed=0, log=print):
+    """Write the synthetic survey and everything derived from it to <folder>/Data and <folder>/Models."""
+    # utils.data reads the folders when it is first imported
+    use_data_dir(folder)
+    use_app_imports()
+    from utils import training
+    from utils.country_summary import build_country_summary
+    from utils.data import DATA_DIR, build_snapshots
+
+    start = time.perf_counter()
+    os.makedirs(DATA_DIR, exist_ok=True)
+    survey_path = os.path.join(DATA_DIR, 'survey_results_public.csv')
+    rows = int(SURVEY_ROWS * scale)
+    generate_survey(rows, extra_columns, seed).to_csv(survey_path, index=False)
+    log(f'Wrote {rows} synthetic responses to {survey_path}')
+
+    training.run(survey_path, param_grid=param_grid, cv=2, engines=engines, log=log)
+    build_snapshots(['survey'])
+    build_country_summary()
+    log(f'Synthetic data ready in {folder} ({time.perf_counter() - start:.1f} s)')
+    return folder
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Generate a synthetic survey and its derived data.')
+    parser.add_argument('--scale', type=float, default=1, help='Size as a multiple of the 2023 survey')
+    parser.add_argument('--output', required=True, help='Folder where Data/ and Models/ are written')
+    parser.add_argument('--extra-columns', type=int, default=EXTRA_COLUMNS, help='Filler columns of the survey')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+    build(args.output, args.scale, args.extra_columns, seed=args.seed)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,9 +1,11 @@
 import streamlit as st
-import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
-import os
-import plotly.express as px
+from utils import profiling
+from utils.aggregation import DEFAULT_MAX_POINTS, load_points
+from utils.country_summary import load_country_summary
+from utils.data import load_overview
+from utils.distributions import box_figure, box_statistics, histogram_bins
+from utils.filtering import load_filter_index
+from utils.rendering import render, render_plotly, submit_plotly
 
 st.set_page_config(
     page_title="Dynamic Visualization",
@@ -17,21 +19,12 @@ st.set_page_config(
     }
 )
 
-# Obtain the absolute path of this file
-script_dir = os.path.dirname(os.path.abspath(__file__))
+# Phase timings of this rerun, when profiling is on (see utils/profiling.py)
+profiling.start('Dynamic_Visualization')
 
-# Go back to the previous folder (parent directory)
-parent_dir = os.path.dirname(script_dir)
-
-# Change the location of the workspace to the parent directory
-os.chdir(parent_dir)
-
-# Load the datasets
-original_df = pd.read_csv("Data/survey_results_public.csv")
-original_df = original_df.rename(columns={'ConvertedCompYearly': 'Salary'})
-
-decoded_df = pd.read_csv("Data/dataset_overview.csv")
-countries = original_df["Country"].dropna()
+# Load the datasets (cached once per process, see utils/data.py)
+with profiling.phase('load'):
+    decoded_df = render(('load', 'overview'), load_overview, st.empty(), 'Loading the data')
 
 # Define sections
 sections = ['Maps', 'Interactive Salary Distribution Histogram', 'Boxplot of Salary Distribution by Country',
@@ -43,58 +36,69 @@ st.sidebar.title('Navigation')
 selected_section = st.sidebar.radio('Go to', sections)
 
 if selected_section == 'Maps':
-    original_df = pd.read_csv("Data/survey_results_public.csv")
-    original_df = original_df.rename(columns={'ConvertedCompYearly': 'Salary'})
-    original_df["Country"] = original_df["Country"].dropna()
-    original_df["Salary"] = original_df["Salary"].dropna()
-    original_df = original_df[original_df['Salary'] < 250000]
+    # Respondents and average salary (below 250k) per country, precomputed once per survey version
+    with profiling.phase('load'):
+        country_summary = render(('load', 'country_summary'), load_country_summary, st.empty(), 'Loading the data')
 
     st.title('Welcome to the Dynamic Visualization Dashboard')
     st.write('Please select a section from the sidebar to start exploring the data.')
-    
-    px.defaults.template = 'plotly_dark'
-    # Calculate the number of respondents by country
-    country_counts = original_df['Country'].value_counts().reset_index()
-    country_counts.columns = ['country', 'count']
+
+    def respondents_map():
+        # Plotly is only imported when a figure is not in the cache
+        import plotly.express as px
+        px.defaults.template = 'plotly_dark'
+        # Number of respondents by country
+        country_counts = country_summary.loc[country_summary['count'] > 0, ['Country', 'count']]
+        country_counts.columns = ['country', 'count']
+        return px.choropleth(
+            country_counts, 
+            locations='country', 
+            locationmode='country names', 
+            color='count',
+            hover_name='country',
+            color_continuous_scale='RdBu',
+            title='Respondents by Country',
+            width=1200, 
+            height=800 
+        )
+
+    def average_salary_map():
+        # Plotly is only imported when a figure is not in the cache
+        import plotly.express as px
+        px.defaults.template = 'plotly_dark'
+        # Average salary by country
+        average_salary_by_country = country_summary.loc[country_summary['count'] > 0, ['Country', 'average_salary']]
+        average_salary_by_country.columns = ['country', 'average_salary']
+        return px.choropleth(
+            average_salary_by_country, 
+            locations='country', 
+            locationmode='country names', 
+            color='average_salary',
+            hover_name='country',
+            color_continuous_scale='rdylbu', 
+            title='Average Salary by Country',
+            width=1200, 
+            height=800 
+        )
 
     # Create a choropleth map
     st.subheader('Global Distribution of Survey Respondents')
     st.write("This map shows the global distribution of survey respondents. The color intensity represents the number of respondents from each country.")
-
-    fig = px.choropleth(
-        country_counts, 
-        locations='country', 
-        locationmode='country names', 
-        color='count',
-        hover_name='country',
-        color_continuous_scale='RdBu',
-        title='Respondents by Country',
-        width=1200, 
-        height=800 
-    )
-    st.plotly_chart(fig)
-
-    # Calculate the average salary by country
-    average_salary_by_country = original_df.groupby('Country')['Salary'].mean().reset_index()
-    average_salary_by_country.columns = ['country', 'average_salary']
+    respondents_placeholder = st.empty()
 
     # Create a choropleth map for Average Salary by Country
     st.subheader('Global Average Salary of Survey Respondents')
     st.write("This map shows the global average salary of survey respondents. The color intensity represents the average salary in each country.")
+    average_salary_placeholder = st.empty()
 
-    fig = px.choropleth(
-        average_salary_by_country, 
-        locations='country', 
-        locationmode='country names', 
-        color='average_salary',
-        hover_name='country',
-        color_continuous_scale='rdylbu', 
-        title='Average Salary by Country',
-        width=1200, 
-        height=800 
-    )
-
-    st.plotly_chart(fig)
+    # Built once per dataset version and shared by all sessions (see utils/figure_cache.py),
+    # both at the same time in the background; each map is shown as soon as it is ready
+    respondents_task = submit_plotly('Respondents by Country', None, ['survey'], respondents_map)
+    average_salary_task = submit_plotly('Average Salary by Country', None, ['survey'], average_salary_map)
+    for task, placeholder in [(respondents_task, respondents_placeholder), (average_salary_task, average_salary_placeholder)]:
+        fig = task.wait(placeholder, 'Building the map')
+        with profiling.phase('serialize'):
+            placeholder.plotly_chart(fig)
 
 if selected_section == 'Interactive Salary Distribution Histogram':
     # Dropdown to select Country
@@ -111,23 +115,30 @@ if selected_section == 'Interactive Salary Distribution Histogram':
         default=decoded_df['EdLevel'].unique()
     )
 
-    # Filtering data based on selection
-    filtered_df = decoded_df[
-        (decoded_df['Country'].isin(country)) & 
-        (decoded_df['EdLevel'].isin(education_level))
-    ]
-    
     # Interactive Histogram for Salary Distribution
     st.subheader('Interactive Salary Distribution Histogram')
-    fig = px.histogram(
-        filtered_df, 
-        x='Salary', 
-        nbins=50, 
-        title='Salary Distribution',
-        color_discrete_sequence=['indianred'] # You can choose any color you like
-    )
-    fig.update_layout(bargap=0.1)
-    st.plotly_chart(fig)
+    def salary_histogram():
+        import plotly.graph_objects as go
+        # Filtering data based on selection, on the category codes (see utils/filtering.py)
+        with profiling.phase('filter'):
+            filtered_df = load_filter_index().select(['Salary'], Country=country, EdLevel=education_level)
+        # Only the bin counts are sent to the browser (see utils/distributions.py)
+        with profiling.phase('groupby'):
+            bins = histogram_bins(filtered_df['Salary'], nbins=50)
+        fig = go.Figure(go.Bar(
+            x=(bins['left'] + bins['right']) / 2,
+            y=bins['count'],
+            customdata=bins[['left', 'right']],
+            hovertemplate='Salary=%{customdata[0]:,.0f}-%{customdata[1]:,.0f}<br>count=%{y}<extra></extra>',
+            marker_color='indianred' # You can choose any color you like
+        ))
+        fig.update_layout(title='Salary Distribution', xaxis_title='Salary', yaxis_title='count', bargap=0.1)
+        return fig
+    filters = {'country': country, 'education_level': education_level}
+    placeholder = st.empty()
+    fig = render_plotly(selected_section, filters, ['overview'], salary_histogram, placeholder)
+    with profiling.phase('serialize'):
+        placeholder.plotly_chart(fig)
     st.write("""
         Explore the distribution of salaries within the tech industry. Use the sidebar to filter by country and education level.
         This histogram updates dynamically based on your selections, allowing for a deeper dive into the specific segments of the dataset.
@@ -138,94 +149,119 @@ if selected_section == 'Boxplot of Salary Distribution by Country':
     ## Interactive Box Plot for Salary Distribution by Country
     st.subheader("Boxplot of Salary Distribution by Country")
     selected_countries = st.multiselect('Select countries', decoded_df['Country'].unique(), default=decoded_df['Country'].unique()[:20])
-    filtered_df = decoded_df[decoded_df['Country'].isin(selected_countries)]
-    fig = px.box(
-        filtered_df, 
-        x='Country', 
-        y='Salary', 
-        color='Country',
-        title="Salary Distribution by Country",
-        labels={'Country': 'Country', 'Salary': 'Salary'},
-        notched=True,  # shows the confidence interval for the median
-        template='plotly_dark'
-    )
-    st.plotly_chart(fig, use_container_width=True)
+    def country_boxplot():
+        with profiling.phase('filter'):
+            filtered_df = load_filter_index().select(['Country', 'Salary'], Country=selected_countries)
+        # Quartiles, notches (confidence interval of the median), whiskers and a sample of the outliers per country
+        with profiling.phase('groupby'):
+            table, outliers = box_statistics(filtered_df['Country'], filtered_df['Salary'])
+        return box_figure(table, outliers, selected_countries, 'Country', "Salary Distribution by Country")
+    placeholder = st.empty()
+    fig = render_plotly(selected_section, {'countries': selected_countries}, ['overview'], country_boxplot, placeholder)
+    with profiling.phase('serialize'):
+        placeholder.plotly_chart(fig, use_container_width=True)
     st.write("This box plot shows the salary distribution for each selected country, allowing for a comparison of salary ranges and identification of outliers.")
 
 
 if selected_section == 'Boxplot of Salary Distribution by Education Level':
     ## Interactive Box Plot for Salary Distribution by Education Level
     st.subheader("Boxplot of Salary Distribution by Education Level")
-    fig = px.box(
-        decoded_df, 
-        x='EdLevel', 
-        y='Salary', 
-        color='EdLevel',
-        title="Salary Distribution by Education Level",
-        labels={'EdLevel': 'Education Level', 'Salary': 'Salary'},
-        notched=True,  # shows the confidence interval for the median
-        template='plotly_dark'
-    )
-    st.plotly_chart(fig, use_container_width=True)
+    def education_boxplot():
+        # Quartiles, notches (confidence interval of the median), whiskers and a sample of the outliers per level
+        with profiling.phase('groupby'):
+            table, outliers = box_statistics(decoded_df['EdLevel'], decoded_df['Salary'])
+        return box_figure(table, outliers, decoded_df['EdLevel'].unique(), 'Education Level',
+                          "Salary Distribution by Education Level")
+    placeholder = st.empty()
+    fig = render_plotly(selected_section, None, ['overview'], education_boxplot, placeholder)
+    with profiling.phase('serialize'):
+        placeholder.plotly_chart(fig, use_container_width=True)
     st.write("The box plot provides a visual summary of the central tendency, dispersion, and skewness of the salary distribution and highlights potential outliers.")
 
 
 if selected_section == 'Salary vs Years of Professional Experience':
     ## Interactive Scatter Plot for Salary vs Years of Experience
     st.subheader("Salary vs Years of Professional Experience")
-    color_discrete_sequence = px.colors.qualitative.Alphabet
-    fig = px.scatter(
-        decoded_df, 
-        x='YearsCodePro', 
-        y='Salary', 
-        color='Country', 
-        title='Salary vs. Professional Coding Experience',
-        color_discrete_sequence=color_discrete_sequence, 
-        hover_name='Country', 
-        size_max=10, 
-        template='plotly_dark', 
-        width=1200, 
-        height=800  
-    )
-    fig.update_layout(
-        xaxis_title="Years of Professional Coding",
-        yaxis_title="Salary",
-        legend_title="Country",
-        font=dict(
-            family="Courier New, monospace",
-            size=12,
-            color="White"
+    max_points = st.slider('Maximum points', 500, 20000, DEFAULT_MAX_POINTS, step=500)
+    webgl = st.checkbox('WebGL rendering', value=True)
+    def experience_scatter():
+        import plotly.express as px
+        # Respondents aggregated by years, salary bucket and country (see utils/aggregation.py)
+        with profiling.phase('groupby'):
+            points_df = load_points(max_points=max_points)
+        color_discrete_sequence = px.colors.qualitative.Alphabet
+        fig = px.scatter(
+            points_df, 
+            x='YearsCodePro', 
+            y='Salary', 
+            color='Country', 
+            title='Salary vs. Professional Coding Experience',
+            color_discrete_sequence=color_discrete_sequence, 
+            hover_name='Country', 
+            hover_data=['count'],
+            render_mode='webgl' if webgl else 'svg',
+            size_max=10, 
+            template='plotly_dark', 
+            width=1200, 
+            height=800  
         )
-    )
-    st.plotly_chart(fig)
+        fig.update_layout(
+            xaxis_title="Years of Professional Coding",
+            yaxis_title="Salary",
+            legend_title="Country",
+            font=dict(
+                family="Courier New, monospace",
+                size=12,
+                color="White"
+            )
+        )
+        return fig
+    filters = {'max_points': max_points, 'webgl': webgl}
+    placeholder = st.empty()
+    fig = render_plotly(selected_section, filters, ['overview'], experience_scatter, placeholder)
+    with profiling.phase('serialize'):
+        placeholder.plotly_chart(fig)
     st.write("This interactive scatter plot allows you to explore the relationship between years of professional coding experience and salary, with data points colored by country.")
 
 
 if selected_section == 'Interactive Bubble Chart: Salary and Experience by Country':
     ## Interactive Bubble Chart: Salary and Experience by Country
-    # Create a new column 'count' which is a count of respondents for each 'YearsCodePro' and 'Salary' by 'Country'
-    decoded_df['count'] = decoded_df.groupby(['YearsCodePro', 'Salary', 'Country'])['Country'].transform('count')
     st.subheader("Interactive Bubble Chart: Salary and Experience by Country")
-    color_discrete_sequence = px.colors.qualitative.Alphabet
-    fig = px.scatter(
-        decoded_df,
-        x="YearsCodePro",
-        y="Salary",
-        size="count",  
-        color="Country",
-        hover_name="Country",
-        log_x=False, 
-        size_max=60,
-        title="Relationship between Professional Coding Experience, Salary, and Country",
-        color_discrete_sequence=color_discrete_sequence, 
-        template='plotly_dark',
-        width=1200, 
-        height=800  
-    )
-    fig.update_layout(
-        xaxis_title="Years of Professional Coding",
-        yaxis_title="Salary",
-        legend_title="Country"
-    )
-    st.plotly_chart(fig)
+    max_points = st.slider('Maximum points', 500, 20000, DEFAULT_MAX_POINTS, step=500)
+    webgl = st.checkbox('WebGL rendering', value=True)
+    def bubble_chart():
+        import plotly.express as px
+        # Points with a 'count' of respondents for each 'YearsCodePro', salary bucket and 'Country' (see utils/aggregation.py)
+        with profiling.phase('groupby'):
+            points_df = load_points(max_points=max_points)
+        color_discrete_sequence = px.colors.qualitative.Alphabet
+        fig = px.scatter(
+            points_df,
+            x="YearsCodePro",
+            y="Salary",
+            size="count",  
+            color="Country",
+            hover_name="Country",
+            render_mode='webgl' if webgl else 'svg',
+            log_x=False, 
+            size_max=60,
+            title="Relationship between Professional Coding Experience, Salary, and Country",
+            color_discrete_sequence=color_discrete_sequence, 
+            template='plotly_dark',
+            width=1200, 
+            height=800  
+        )
+        fig.update_layout(
+            xaxis_title="Years of Professional Coding",
+            yaxis_title="Salary",
+            legend_title="Country"
+        )
+        return fig
+    filters = {'max_points': max_points, 'webgl': webgl}
+    placeholder = st.empty()
+    fig = render_plotly(selected_section, filters, ['overview'], bubble_chart, placeholder)
+    with profiling.phase('serialize'):
+        placeholder.plotly_chart(fig)
     st.write("This bubble chart allows you to interactively explore the relationship between professional coding experience, salary, and country. Larger bubbles represent a higher concentration of respondents.")
+
+profiling.finish()
@@ -1,9 +1,9 @@
 import streamlit as st
-import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
-import os
-import plotly.express as px
+from utils import profiling
+from utils.aggregates import load_aggregates
+from utils.data_browser import PAGE_SIZES, load_data_browser, load_summary, page_count
+from utils.plotting import new_figure
+from utils.rendering import render, render_pyplot
 
 st.set_page_config(
     page_title="Overview",
@@ -17,24 +17,14 @@ st.set_page_config(
     }
 )
 
-# Obtain the absolute path of this file
-script_dir = os.path.dirname(os.path.abspath(__file__))
+# Phase timings of this rerun, when profiling is on (see utils/profiling.py)
+profiling.start('Overview')
 
-# Go back to the previous folder (parent directory)
-parent_dir = os.path.dirname(script_dir)
-
-# Change the location of the workspace to the parent directory
-os.chdir(parent_dir)
-
-# Load the datasets
-original_df = pd.read_csv("Data/survey_results_public.csv")
-original_df = original_df.rename(columns={'ConvertedCompYearly': 'Salary'})
-
-decoded_df = pd.read_csv("Data/dataset_overview.csv")
-countries = original_df["Country"].dropna()
-
-# Set the aesthetic style of the plots
-plt.style.use('dark_background')
+def seaborn():
+    # Seaborn is only imported when a section draws a figure. The figures are
+    # drawn on their own axes with the dark background style (see utils/plotting.py)
+    import seaborn as sns
+    return sns
 
 # Sections of the menu
 sections = ['Data overview', 'Country Data Distribution' , 'Average Salary by Country', 
@@ -51,94 +41,171 @@ if selected_section == 'Data overview':
     st.write('Please select a section from the sidebar to start exploring the data.')
     st.header("Overview of the survey data")
     if st.checkbox("Show Data Summary"):
+        # Sorted and filtered on the server, one page at a time (see utils/data_browser.py)
+        with profiling.phase('load'):
+            browser = render(('load', 'data_browser'), load_data_browser, st.empty(), 'Loading the data')
         st.write("Here you can explore the dataset used for the model:")
-        st.dataframe(decoded_df, width=1500, height=600)
+        filter_columns = st.columns(len(browser.categorical_columns) + len(browser.numeric_columns))
+        categories = {}
+        for column, container in zip(browser.categorical_columns, filter_columns):
+            selected = container.multiselect(column, browser.options(column))
+            if selected:
+                categories[column] = selected
+        ranges = {}
+        for column, container in zip(browser.numeric_columns, filter_columns[len(browser.categorical_columns):]):
+            low, high = browser.bounds(column)
+            ranges[column] = container.slider(column, low, high, (low, high))
+        sort_column, order_column, size_column, page_column = st.columns(4)
+        sort_by = sort_column.selectbox('Sort by', [None] + list(browser.df.columns), format_func=lambda name: name or 'Row')
+        ascending = order_column.radio('Order', ['Ascending', 'Descending'], horizontal=True) == 'Ascending'
+        page_size = size_column.selectbox('Rows per page', PAGE_SIZES)
+        with profiling.phase('filter'):
+            total_rows = len(browser.order(sort_by, ascending, categories, ranges))
+        pages = page_count(total_rows, page_size)
+        page = page_column.number_input(f'Page (of {pages})', min_value=1, max_value=pages, value=1) - 1
+        with profiling.phase('filter'):
+            rows, total_rows = browser.page(page, page_size, sort_by, ascending, categories, ranges)
+        with profiling.phase('serialize'):
+            st.dataframe(rows, width=1500, height=600)
+        st.caption(f'Rows {min(page * page_size + 1, total_rows)}-{page * page_size + len(rows)} of {total_rows}')
         st.write("The numerical data has the following statistics:")
-        st.write(decoded_df.describe())
+        # Computed once per dataset version
+        with profiling.phase('groupby'):
+            summary = load_summary()
+        st.write(summary)
 
 if selected_section == 'Country Data Distribution':
     ## Circular Plot for 'Country' Data Percentages
     st.subheader("Country Data Distribution")
-    country_counts = decoded_df['Country'].value_counts()
-    plt.figure(figsize=(10, 10))
-    plt.pie(country_counts, labels=country_counts.index, autopct='%1.1f%%', textprops={'color': "grey"})
-    plt.title('Percentage of Data by Country')  
-    st.pyplot(plt)
+    def country_distribution():
+        with profiling.phase('groupby'):
+            # Salary statistics per (Country, EdLevel, YearsCodePro), loaded only when a
+            # figure is drawn, not for the Data overview or a cached figure (see utils/aggregates.py)
+            aggregates = load_aggregates()
+            country_counts = aggregates.rollup('Country')['count'].sort_values(ascending=False)
+        fig = new_figure(figsize=(10, 10))
+        ax = fig.subplots()
+        ax.pie(country_counts, labels=country_counts.index, autopct='%1.1f%%', textprops={'color': "grey"})
+        ax.set_title('Percentage of Data by Country')  
+        return fig
+    # Rendered once per dataset version and shared by all sessions (see utils/figure_cache.py),
+    # in the background while a placeholder is shown (see utils/rendering.py)
+    placeholder = st.empty()
+    png = render_pyplot(selected_section, None, ['overview'], country_distribution, placeholder)
+    with profiling.phase('serialize'):
+        placeholder.image(png)
     st.write("This pie chart represents the distribution of survey responses by country, providing insight into the geographical diversity of the data.")
 
 if selected_section == 'Average Salary by Country':
     ## Bar Plot for Mean 'Salary' by 'Country' including Global Average
     st.subheader("Average Salary by Country")
-    plt.figure(figsize=(12, 6))
-    mean_salary_by_country = decoded_df.groupby('Country')['Salary'].mean().sort_values(ascending=True)
-    global_average_salary = decoded_df['Salary'].mean()
-    palette = sns.color_palette("husl", len(mean_salary_by_country))
-    sns.barplot(x=mean_salary_by_country.values, y=mean_salary_by_country.index, 
-        hue=mean_salary_by_country.index, palette=palette, dodge=False)
-    plt.legend([],[], frameon=False) 
-    plt.axvline(global_average_salary, color='red', linewidth=2, linestyle='--')
-    plt.text(global_average_salary, plt.gca().get_ylim()[1], f'Global Average: {global_average_salary:.2f}', 
-            va='top', ha='left', color='red', fontsize=10)
-    max_value = mean_salary_by_country.max()
-    min_value = mean_salary_by_country.min()
-    max_country = mean_salary_by_country.idxmax()
-    min_country = mean_salary_by_country.idxmin()
-    plt.text(max_value, mean_salary_by_country.index.get_loc(max_country), 
-            f'Max: {max_value:.2f}', va='center', ha='right', color='white')
-    plt.text(min_value, mean_salary_by_country.index.get_loc(min_country), 
-            f'Min: {min_value:.2f}', va='center', ha='right', color='white')
-    plt.xlabel('Average Salary')
-    plt.ylabel('Country')
-    plt.title('Average Salary by Country')
-    st.pyplot(plt)
+    def average_salary_by_country():
+        sns = seaborn()
+        fig = new_figure(figsize=(12, 6))
+        ax = fig.subplots()
+        with profiling.phase('groupby'):
+            aggregates = load_aggregates()
+            mean_salary_by_country = aggregates.rollup('Country')['mean'].sort_values(ascending=True)
+        global_average_salary = aggregates.total()['mean']
+        palette = sns.color_palette("husl", len(mean_salary_by_country))
+        sns.barplot(x=mean_salary_by_country.values, y=mean_salary_by_country.index, 
+            hue=mean_salary_by_country.index, palette=palette, dodge=False, ax=ax)
+        ax.legend([],[], frameon=False) 
+        ax.axvline(global_average_salary, color='red', linewidth=2, linestyle='--')
+        ax.text(global_average_salary, ax.get_ylim()[1], f'Global Average: {global_average_salary:.2f}', 
+                va='top', ha='left', color='red', fontsize=10)
+        max_value = mean_salary_by_country.max()
+        min_value = mean_salary_by_country.min()
+        max_country = mean_salary_by_country.idxmax()
+        min_country = mean_salary_by_country.idxmin()
+        ax.text(max_value, mean_salary_by_country.index.get_loc(max_country), 
+                f'Max: {max_value:.2f}', va='center', ha='right', color='white')
+        ax.text(min_value, mean_salary_by_country.index.get_loc(min_country), 
+                f'Min: {min_value:.2f}', va='center', ha='right', color='white')
+        ax.set_xlabel('Average Salary')
+        ax.set_ylabel('Country')
+        ax.set_title('Average Salary by Country')
+        return fig
+    placeholder = st.empty()
+    png = render_pyplot(selected_section, None, ['overview'], average_salary_by_country, placeholder)
+    with profiling.phase('serialize'):
+        placeholder.image(png)
     st.write("The bar plot above illustrates the average salary in each country, highlighting regional differences in compensation. Countries are color-coded for better visual differentiation, with annotations indicating the maximum and minimum average salaries.")
 
 if selected_section == 'Salary Progression Over Years of Experience':
     ## Line Plot for Mean 'Salary' Based on 'YearsCodePro'
     st.subheader("Salary Progression Over Years of Experience")
-    plt.figure(figsize=(14, 7))
-    mean_salary_by_experience = decoded_df.groupby('YearsCodePro')['Salary'].mean().reset_index()
-    mean_salary_by_experience['YearsCodePro'] = mean_salary_by_experience['YearsCodePro'].astype(float)
-    max_value = mean_salary_by_experience['Salary'].max()
-    min_value = mean_salary_by_experience['Salary'].min()
-    sns.lineplot(data=mean_salary_by_experience, x='YearsCodePro', y='Salary', label='Average Salary')
-    sns.regplot(data=mean_salary_by_experience, x='YearsCodePro', y='Salary', scatter=False, color='red', label='Trend Line')
-    max_point = mean_salary_by_experience.loc[mean_salary_by_experience['Salary'].idxmax()]
-    plt.annotate(f'Max: ${max_point.Salary:.2f}', xy=(max_point.YearsCodePro, max_point.Salary), xytext=(5, 0), 
-                textcoords='offset points', ha='center', va='bottom', color='green')
-    min_point = mean_salary_by_experience.loc[mean_salary_by_experience['Salary'].idxmin()]
-    plt.annotate(f'Min: ${min_point.Salary:.2f}', xy=(min_point.YearsCodePro, min_point.Salary), xytext=(5, 0), 
-                textcoords='offset points', ha='center', va='top', color = 'red')
-    plt.xlabel('Years of Professional Coding')
-    plt.ylabel('Average Salary')
-    plt.title('Average Salary by Years of Professional Coding')
-    plt.legend()
-    plt.grid(True)
-    st.pyplot(plt)
+    def salary_progression():
+        sns = seaborn()
+        fig = new_figure(figsize=(14, 7))
+        ax = fig.subplots()
+        with profiling.phase('groupby'):
+            aggregates = load_aggregates()
+            mean_salary_by_experience = aggregates.rollup('YearsCodePro')['mean'].rename('Salary').reset_index()
+        max_value = mean_salary_by_experience['Salary'].max()
+        min_value = mean_salary_by_experience['Salary'].min()
+        sns.lineplot(data=mean_salary_by_experience, x='YearsCodePro', y='Salary', label='Average Salary', ax=ax)
+        sns.regplot(data=mean_salary_by_experience, x='YearsCodePro', y='Salary', scatter=False, color='red', label='Trend Line', ax=ax)
+        max_point = mean_salary_by_experience.loc[mean_salary_by_experience['Salary'].idxmax()]
+        ax.annotate(f'Max: ${max_point.Salary:.2f}', xy=(max_point.YearsCodePro, max_point.Salary), xytext=(5, 0), 
+                    textcoords='offset points', ha='center', va='bottom', color='green')
+        min_point = mean_salary_by_experience.loc[mean_salary_by_experience['Salary'].idxmin()]
+        ax.annotate(f'Min: ${min_point.Salary:.2f}', xy=(min_point.YearsCodePro, min_point.Salary), xytext=(5, 0), 
+                    textcoords='offset points', ha='center', va='top', color = 'red')
+        ax.set_xlabel('Years of Professional Coding')
+        ax.set_ylabel('Average Salary')
+        ax.set_title('Average Salary by Years of Professional Coding')
+        ax.legend()
+        ax.grid(True)
+        return fig
+    placeholder = st.empty()
+    png = render_pyplot(selected_section, None, ['overview'], salary_progression, placeholder)
+    with profiling.phase('serialize'):
+        placeholder.image(png)
     st.write("The line plot above depicts how the average salary changes with increasing years of professional coding experience.")
 
 if selected_section == 'Salary Distribution by Education Level':
     ## Average Salary by Education Level
     st.subheader("Salary Distribution by Education Level")
-    plt.figure(figsize=(10, 6))
-    mean_salary_by_edlevel = decoded_df.groupby('EdLevel')['Salary'].mean().sort_values()
-    palette = sns.color_palette("viridis", len(mean_salary_by_edlevel))
-    barplot = sns.barplot(x=mean_salary_by_edlevel.index, y=mean_salary_by_edlevel.values, palette=palette)
-    for index, value in enumerate(mean_salary_by_edlevel.values):
-        plt.text(index, value, f'${value:.2f}', color='white', ha='center', va='bottom')
-    plt.xticks(rotation=45)
-    plt.xlabel('Education Level')
-    plt.ylabel('Average Salary')
-    plt.title('Average Salary by Education Level')
-    st.pyplot(plt)
+    def salary_by_education():
+        sns = seaborn()
+        fig = new_figure(figsize=(10, 6))
+        ax = fig.subplots()
+        with profiling.phase('groupby'):
+            aggregates = load_aggregates()
+            mean_salary_by_edlevel = aggregates.rollup('EdLevel')['mean'].sort_values()
+        palette = sns.color_palette("viridis", len(mean_salary_by_edlevel))
+        sns.barplot(x=mean_salary_by_edlevel.index, y=mean_salary_by_edlevel.values, palette=palette, ax=ax)
+        for index, value in enumerate(mean_salary_by_edlevel.values):
+            ax.text(index, value, f'${value:.2f}', color='white', ha='center', va='bottom')
+        ax.tick_params(axis='x', labelrotation=45)
+        ax.set_xlabel('Education Level')
+        ax.set_ylabel('Average Salary')
+        ax.set_title('Average Salary by Education Level')
+        return fig
+    placeholder = st.empty()
+    png = render_pyplot(selected_section, None, ['overview'], salary_by_education, placeholder)
+    with profiling.phase('serialize'):
+        placeholder.image(png)
     st.write("Finally, this bar plot compares the average salary across different education levels, illustrating the influence of educational attainment on earnings.")
 
 if selected_section == 'Heatmap of Salary by Country and Education Level':
     ## Heatmap of Salary by Country and Education Level
     st.subheader("Heatmap of Salary by Country and Education Level")
-    pivot_table = decoded_df.pivot_table(index='Country', columns='EdLevel', values='Salary', aggfunc='mean')
-    plt.figure(figsize=(12, 10))
-    sns.heatmap(pivot_table, annot=True, fmt=".0f", cmap='coolwarm',linewidths=1,linecolor='black')
-    plt.title('Heatmap of Average Salary by Country and Education Level')
-    st.pyplot(plt)
-    st.write("The heatmap visualizes the average salary based on both country and education level, providing a two-dimensional view of these factors' impact on earnings.")
\ No newline at end of file
+    def salary_heatmap():
+        sns = seaborn()
+        with profiling.phase('groupby'):
+            aggregates = load_aggregates()
+            pivot_table = aggregates.rollup(['Country', 'EdLevel'])['mean'].unstack('EdLevel')
+        fig = new_figure(figsize=(12, 10))
+        ax = fig.subplots()
+        sns.heatmap(pivot_table, annot=True, fmt=".0f", cmap='coolwarm',linewidths=1,linecolor='black', ax=ax)
+        ax.set_title('Heatmap of Average Salary by Country and Education Level')
+        return fig
+    placeholder = st.empty()
+    png = render_pyplot(selected_section, None, ['overview'], salary_heatmap, placeholder)
+    with profiling.phase('serialize'):
+        placeholder.image(png)
+    st.write("The heatmap visualizes the average salary based on both country and education level, providing a two-dimensional view of these factors' impact on earnings.")
+
+profiling.finish()
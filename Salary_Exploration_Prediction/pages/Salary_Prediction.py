@@ -1,11 +1,13 @@
 import math
-from matplotlib import pyplot as plt
-import numpy as np
+import os
 import streamlit as st
 import pandas as pd
-import pickle
-import seaborn as sns
-import os
+from utils import profiling
+from utils.country_summary import load_country_summary
+from utils.plotting import drawing, new_figure, to_png
+from utils.prediction import DEFAULT_HORIZON, MAX_HORIZON, load_predictor
+from utils.scoring import ScoredRoster, is_parquet, score_file
+from utils.stats_index import load_stats_index
 
 st.set_page_config(
     page_title="Salary Prediction",
@@ -19,29 +21,21 @@ st.set_page_config(
     }
 )
 
-# Obtain the absolute path of this file
-script_dir = os.path.dirname(os.path.abspath(__file__))
-
-# Go back to the previous folder (parent directory)
-parent_dir = os.path.dirname(script_dir)
+# Phase timings of this rerun, when profiling is on (see utils/profiling.py)
+profiling.start('Salary_Prediction')
 
-# Change the location of the workspace to the parent directory
-os.chdir(parent_dir)
+with profiling.phase('load'):
+    # Load the model and label encoders (cached once per process), or use the
+    # prediction server when SALARY_APP_PREDICTION_URL is set (see utils/prediction.py)
+    predictor = load_predictor()
+    le_country, le_education = predictor.le_country, predictor.le_education
 
-# Load the model and label encoders
-with open('Models/saved_steps.pkl', 'rb') as file:
-    data = pickle.load(file)
-random_forest_reg = data["model"]
-le_country = data["le_country"]
-le_education = data["le_education"]
+    # Countries of the survey, precomputed once per survey version (see utils/country_summary.py)
+    countries = load_country_summary()['Country']
 
-# Load the datasets
-original_df = pd.read_csv("Data/survey_results_public.csv")
-original_df = original_df.rename(columns={'ConvertedCompYearly': 'Salary'})
+    # Salary statistics of the model dataset per (Country, EdLevel, YearsCodePro), see utils/stats_index.py
+    salary_stats = load_stats_index()
 
-model_df = pd.read_csv("Data/dataset_model.csv")
-
-countries = original_df["Country"].dropna()
 education_levels = le_education.classes_
 
 # Sidebar for user input
@@ -51,6 +45,9 @@ st.sidebar.title('User Input')
 country = st.sidebar.selectbox('Select a Country', countries.unique())
 experience = st.sidebar.slider('Years of Experience', 0, 50, 5)
 education = st.sidebar.selectbox("Education Level", education_levels)
+horizon = st.sidebar.slider('Projection Horizon (years)', 1, MAX_HORIZON, DEFAULT_HORIZON)
+# Prediction intervals need a random forest model (see utils/prediction.py)
+show_interval = predictor.has_intervals and st.sidebar.checkbox('Show prediction interval (P10-P90)')
 
 # Display the selected options
 st.sidebar.write('Selected Country:', country)
@@ -66,24 +63,32 @@ if country not in le_country.classes_:
 country_encoded = le_country.transform([country])
 education_encoded = le_education.transform([education])
 
-# Filter the dataset based on user input
-filtered_df = model_df[(model_df['Country'] == country_encoded[0]) & (model_df['YearsCodePro'] == experience) & (model_df['EdLevel'] == education_encoded[0])]
-n_results = filtered_df.shape[0]
+# Look up the salary statistics of the user input
+with profiling.phase('filter'):
+    stats = salary_stats.get(country_encoded[0], education_encoded[0], experience)
+n_results = stats['count']
 # Display salary statistics for the selected options
 st.subheader('Salary Exploration')
 st.write(f"Exploring salaries for **{education}** professionals in **{country}** with **{experience}** years of experience:")
 st.write(f'(**{n_results}** results)')
 
+if n_results == 0:
+    # Fall back to the same country and education level with any years of experience
+    with profiling.phase('filter'):
+        stats = salary_stats.get(country_encoded[0], education_encoded[0])
+    if stats['count'] > 0:
+        st.write(f"No exact matches, showing the **{stats['count']}** results with any years of experience:")
+
 # Check for NaN and display appropriate message for each statistic
-avg_salary = filtered_df['Salary'].mean()
+avg_salary = stats['mean']
 if pd.isna(avg_salary):
     st.write("Minimum Salary: **No available data**")
     st.write("Average Salary: **No available data**")
     st.write("Maximum Salary: **No available data**")
 else:
-    min_salary = filtered_df['Salary'].min()
-    max_salary = filtered_df['Salary'].max()
-    std_salary = filtered_df['Salary'].std()
+    min_salary = stats['min']
+    max_salary = stats['max']
+    std_salary = stats['std']
     st.write(f"Minimum Salary: **${min_salary}**")
     if std_salary is not None and not math.isnan(std_salary):
         st.write(f"Average Salary: **${round(avg_salary)} +- {round(std_salary)}**")
@@ -101,76 +106,120 @@ if st.button('Predict Salary'):
         country = 'Other'
         not_available = True
 
-    # Preprocess inputs
-    prediction = random_forest_reg.predict([[country_encoded[0], education_encoded[0], experience]])
+    # Predict the selection and the following years in a single call (with
+    # the quantiles of the tree predictions when the interval is shown)
+    with profiling.phase('predict'):
+        if show_interval:
+            salary_data = predictor.intervals(country, education, experience, horizon)
+        else:
+            salary_data = predictor.projection(country, education, experience, horizon)
+    prediction = salary_data['Predicted Salary'].iloc[0]
     
     # Display the prediction
-    st.write(f"The estimated salary of your selection is **${prediction[0]:.2f}**")
+    st.write(f"The estimated salary of your selection is **${prediction:.2f}**")
+    if show_interval:
+        st.write(f"80% of the trees of the model predict between **${salary_data['P10'].iloc[0]:.2f}** "
+                 f"and **${salary_data['P90'].iloc[0]:.2f}**")
     st.write("The following plot contains how would the salary vary through the years.")
    
-    # Set a dark background style for the plot
-    plt.style.use('dark_background')
-
-    # Generate predictions
-    experience_range = np.arange(experience, experience + 11)
-    predicted_salaries = [random_forest_reg.predict([[country_encoded[0], education_encoded[0], exp]])[0] for exp in experience_range]
-
-    # Create a DataFrame
-    salary_data = pd.DataFrame({
-        'Years of Experience': experience_range,
-        'Predicted Salary': predicted_salaries
-    })
-
-    # Set a dark background style for the plot
-    plt.style.use('dark_background')
-
-    # Generate predictions
-    experience_range = np.arange(experience, experience + 11)
-    predicted_salaries = [random_forest_reg.predict([[country_encoded[0], education_encoded[0], exp]])[0] for exp in experience_range]
-
-    # Create a DataFrame
-    salary_data = pd.DataFrame({
-        'Years of Experience': experience_range,
-        'Predicted Salary': predicted_salaries
-    })
-
-    # Calculate the corresponding years
-    salary_data['Year'] = 2023 + (salary_data['Years of Experience'] - experience)
-
-    # Identify min and max salaries
-    min_salary = salary_data['Predicted Salary'].min()
-    max_salary = salary_data['Predicted Salary'].max()
-    min_year = salary_data[salary_data['Predicted Salary'] == min_salary]['Years of Experience'].values[0]
-    max_year = salary_data[salary_data['Predicted Salary'] == max_salary]['Years of Experience'].values[0]
-
-    # Plot using Matplotlib and Seaborn
-    fig, ax1 = plt.subplots(figsize=(10, 6))
-
-    # Matplotlib line plot for predictions
-    ax1.plot(salary_data['Years of Experience'], salary_data['Predicted Salary'], color='cyan', marker='o', label='Predicted Salary')
-
-    # Seaborn regression plot for trend line
-    sns.regplot(x='Years of Experience', y='Predicted Salary', data=salary_data, scatter=False, color='yellow', label='Trend Line', ax=ax1)
-
-    # Highlighting min and max points
-    ax1.scatter([min_year, max_year], [min_salary, max_salary], color='yellow', zorder=5)
-
-    # Adding labels for min and max
-    ax1.text(min_year, min_salary, f' Min: ${min_salary:.2f}', color='yellow', ha='right')
-    ax1.text(max_year, max_salary, f' Max: ${max_salary:.2f}', color='yellow', ha='right')
-
-    ax1.set_title("Predicted Salary vs. Years of Experience", color='white')
-    ax1.set_xlabel("Years of Experience", color='white')
-    ax1.set_ylabel("Predicted Salary", color='white')
-    ax1.legend()
-    ax1.grid(True, color='gray')
-
-    # Create secondary x-axis for the year at the top
-    ax2 = ax1.twiny()
-    ax2.set_xlim(ax1.get_xlim())  # Ensure the second x-axis aligns with the first x-axis
-    ax2.set_xticks(salary_data['Years of Experience'])
-    ax2.set_xticklabels(salary_data['Year'].astype(int))
-    ax2.set_xlabel('Year', color='white')
+    # Drawn with the dark background style, one figure at a time (see utils/plotting.py)
+    with drawing():
+        with profiling.phase('figure'):
+            # Seaborn is only needed once a prediction is plotted
+            import seaborn as sns
+
+            # Calculate the corresponding years
+            salary_data['Year'] = 2023 + (salary_data['Years of Experience'] - experience)
+
+            # Identify min and max salaries
+            min_salary = salary_data['Predicted Salary'].min()
+            max_salary = salary_data['Predicted Salary'].max()
+            min_year = salary_data[salary_data['Predicted Salary'] == min_salary]['Years of Experience'].values[0]
+            max_year = salary_data[salary_data['Predicted Salary'] == max_salary]['Years of Experience'].values[0]
+
+            # Plot on a figure of its own using Matplotlib and Seaborn
+            fig = new_figure(figsize=(10, 6))
+            ax1 = fig.subplots()
+
+            # Shaded band between the 10th and 90th percentiles of the trees
+            if show_interval:
+                ax1.fill_between(salary_data['Years of Experience'], salary_data['P10'], salary_data['P90'],
+                                 color='cyan', alpha=0.2, label='P10-P90 Interval')
+
+            # Matplotlib line plot for predictions
+            ax1.plot(salary_data['Years of Experience'], salary_data['Predicted Salary'], color='cyan', marker='o', label='Predicted Salary')
+
+            # Seaborn regression plot for trend line
+            sns.regplot(x='Years of Experience', y='Predicted Salary', data=salary_data, scatter=False, color='yellow', label='Trend Line', ax=ax1)
+
+            # Highlighting min and max points
+            ax1.scatter([min_year, max_year], [min_salary, max_salary], color='yellow', zorder=5)
+
+            # Adding labels for min and max
+            ax1.text(min_year, min_salary, f' Min: ${min_salary:.2f}', color='yellow', ha='right')
+            ax1.text(max_year, max_salary, f' Max: ${max_salary:.2f}', color='yellow', ha='right')
+
+            ax1.set_title("Predicted Salary vs. Years of Experience", color='white')
+            ax1.set_xlabel("Years of Experience", color='white')
+            ax1.set_ylabel("Predicted Salary", color='white')
+            ax1.legend()
+            ax1.grid(True, color='gray')
+
+            # Create secondary x-axis for the year at the top
+            ax2 = ax1.twiny()
+            ax2.set_xlim(ax1.get_xlim())  # Ensure the second x-axis aligns with the first x-axis
+            ax2.set_xticks(salary_data['Years of Experience'])
+            ax2.set_xticklabels(salary_data['Year'].astype(int))
+            ax2.set_xlabel('Year', color='white')
+
+        with profiling.phase('serialize'):
+            png = to_png(fig)
 
     # Display the plot in Streamlit
-    st.pyplot(fig)
\ No newline at end of file
+    with profiling.phase('serialize'):
+        st.image(png)
+
+
+# Batch mode: score a whole roster of candidates (see utils/scoring.py)
+st.subheader('Batch Prediction')
+st.write("Upload a CSV or Parquet roster with a country, an education level and years of experience per candidate "
+         "(columns Country, EdLevel and YearsCodePro, or country, education and experience).")
+roster = st.file_uploader('Candidate roster', type=['csv', 'parquet'])
+
+if roster is not None and st.button('Score roster'):
+    # Scored into a temporary file owned by the session state: it is deleted when the
+    # roster is replaced or the session ends, and only read when it is downloaded
+    output = ScoredRoster(roster.name)
+    progress_bar = st.progress(0.0, text='Scoring the roster...')
+
+    def show_progress(rows, total):
+        fraction = min(rows / total, 1.0) if total else 0.0
+        progress_bar.progress(fraction, text=f'{rows:,} rows scored')
+
+    try:
+        with profiling.phase('predict'):
+            output.rows = score_file(roster, output.path, name=roster.name, progress=show_progress,
+                                     output_name=roster.name)
+    except (ValueError, RuntimeError) as error:
+        output.delete()
+        st.error(f'The roster could not be scored: {error}')
+    else:
+        progress_bar.progress(1.0, text=f'{output.rows:,} rows scored')
+        # Replaces the predictions of the previous roster of this session
+        previous = st.session_state.get('scored_roster')
+        if previous is not None:
+            previous.delete()
+        st.session_state['scored_roster'] = output
+
+scored_roster = st.session_state.get('scored_roster')
+if scored_roster:
+    parquet = is_parquet(scored_roster.name)
+    st.download_button(
+        f"Download the {scored_roster.rows:,} predictions",
+        # Read from the file only when the button is clicked
+        data=scored_roster.read,
+        file_name=os.path.splitext(scored_roster.name)[0] + ('_scored.parquet' if parquet else '_scored.csv'),
+        mime='application/vnd.apache.parquet' if parquet else 'text/csv',
+    )
+
+profiling.finish()
@@ -0,0 +1,31 @@
+"""
+Shared fixtures of the tests. The pages import the app modules as `utils.*`
+(`streamlit run Home.py` puts the app folder on sys.path); the tests do the
+same. Run them from the app folder:
+
+    python -m pytest tests
+"""
+
+import os
+import sys
+
+import numpy as np
+import pytest
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if APP_DIR not in sys.path:
+    sys.path.insert(0, APP_DIR)
+
+COUNTRIES = ['Germany', 'India', 'Other', 'United States of America']
+EDUCATION_LEVELS = ['Bachelor’s degree', 'Less than a Bachelors', 'Master’s degree', 'Post grad']
+
+
+@pytest.fixture
+def prediction_table():
+    """A PredictionTable whose prediction is country * 1e6 + education * 1e3 + years."""
+    from utils.lookup import PredictionTable
+
+    country, education, years = np.meshgrid(np.arange(len(COUNTRIES)), np.arange(len(EDUCATION_LEVELS)),
+                                             np.arange(91), indexing='ij')
+    return PredictionTable((country * 1e6 + education * 1e3 + years).astype(float),
+                           np.array(COUNTRIES), np.array(EDUCATION_LEVELS))
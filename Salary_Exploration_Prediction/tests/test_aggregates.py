@@ -0,0 +1,123 @@
+import math
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils import aggregates, data, snapshot, stats_index
+from utils.aggregates import SalaryAggregates, aggregate, encode_responses, merge
+from utils.stats_index import SalaryStatsIndex
+
+from conftest import COUNTRIES, EDUCATION_LEVELS
+
+
+@pytest.fixture
+def overview():
+    rng = np.random.default_rng(0)
+    rows = 5000
+    return pd.DataFrame({
+        'Country': rng.choice(COUNTRIES, rows),
+        'EdLevel': rng.choice(EDUCATION_LEVELS, rows),
+        'YearsCodePro': rng.integers(0, 30, rows).astype(float),
+        'Salary': rng.uniform(10000, 250000, rows).round(),
+    })
+
+
+def test_merged_batches_equal_the_whole(overview):
+    # Appending a batch gives the same statistics as aggregating everything at once
+    whole = aggregate(overview)
+    batches = SalaryAggregates.from_frame(overview.iloc[:3000]).append(overview.iloc[3000:])
+    pd.testing.assert_frame_equal(batches.table, whole, check_exact=False)
+    pd.testing.assert_frame_equal(merge(aggregate(overview.iloc[:10]), aggregate(overview.iloc[10:])), whole,
+                                  check_exact=False)
+
+
+@pytest.mark.parametrize('keys', ['Country', 'YearsCodePro', ['Country', 'EdLevel']])
+def test_rollup_matches_pandas(overview, keys):
+    rollup = SalaryAggregates.from_frame(overview).rollup(keys)
+    expected = overview.groupby(keys)['Salary'].agg(['count', 'mean', 'std', 'min', 'max'])
+    pd.testing.assert_frame_equal(rollup[expected.columns], expected, check_dtype=False)
+
+
+def test_total(overview):
+    total = SalaryAggregates.from_frame(overview).total()
+    assert total['count'] == len(overview)
+    assert total['mean'] == pytest.approx(overview['Salary'].mean())
+
+
+def test_stats_index_matches_pandas(overview):
+    codes = overview.assign(Country=overview['Country'].map(COUNTRIES.index),
+                            EdLevel=overview['EdLevel'].map(EDUCATION_LEVELS.index))
+    index = SalaryStatsIndex.from_frame(codes)
+    for key in [(1,), (1, 2), (1, 2, 5.0)]:
+        selected = codes[(codes[['Country', 'EdLevel', 'YearsCodePro'][:len(key)]] == key).all(axis=1)]['Salary']
+        stats = index.get(*key)
+        assert stats['count'] == len(selected)
+        for name in ['mean', 'std', 'min', 'max']:
+            assert stats[name] == pytest.approx(getattr(selected, name)())
+    # Groups without respondents, and a single respondent has no standard deviation
+    assert index.get(1, 2, 99.0)['count'] == 0 and math.isnan(index.get(1, 2, 99.0)['mean'])
+    one = SalaryStatsIndex.from_frame(codes.iloc[:1])
+    assert one.get(*codes.iloc[0][['Country', 'EdLevel', 'YearsCodePro']])['count'] == 1
+    assert math.isnan(one.get(*codes.iloc[0][['Country', 'EdLevel', 'YearsCodePro']])['std'])
+
+
+def test_encode_responses_uses_the_codes_of_the_model_dataset(overview):
+    encoded = encode_responses(overview.iloc[:100], COUNTRIES[::-1], EDUCATION_LEVELS)
+    assert (np.array(COUNTRIES)[encoded['Country']] == overview['Country'].iloc[:100]).all()
+    assert (np.array(EDUCATION_LEVELS)[encoded['EdLevel']] == overview['EdLevel'].iloc[:100]).all()
+    with pytest.raises(ValueError, match='New Country values'):
+        encode_responses(overview.iloc[:100], COUNTRIES[:2], EDUCATION_LEVELS)
+
+
+def test_append_reads_only_the_batch(overview, tmp_path, monkeypatch):
+    pytest.importorskip('pyarrow')
+    monkeypatch.setattr(data, 'DATA_DIR', str(tmp_path))
+    monkeypatch.setattr(aggregates, 'AGGREGATES_PATH', str(tmp_path / 'overview_aggregates.feather'))
+    monkeypatch.setattr(stats_index, 'STATISTICS_PATH', str(tmp_path / 'model_statistics.feather'))
+    overview.to_csv(data.dataset_paths('overview')[0], index=False)
+    codes = encode_responses(overview, COUNTRIES, EDUCATION_LEVELS)
+    codes.to_csv(data.dataset_paths('model')[0], index=False)
+    data.build_snapshots(['overview', 'model'])
+    aggregates.build_aggregates(aggregates.AGGREGATES_PATH)
+    stats_index.build_stats_index(stats_index.STATISTICS_PATH)
+
+    # Only the headers of the CSVs and the group statistics may be read
+    read_csv, read_snapshot = pd.read_csv, snapshot.read_snapshot
+    reads = []
+    monkeypatch.setattr(pd, 'read_csv', lambda path, **options: reads.append(options.get('nrows')) or
+                        read_csv(path, **options))
+    monkeypatch.setattr(snapshot, 'read_snapshot', lambda path, **options: reads.append(os.path.basename(path)) or
+                        read_snapshot(path, **options))
+    responses = pd.DataFrame({
+        'Country': ['Germany', 'Atlantis', 'India'],
+        'EdLevel': ['Master’s degree (M.A., M.S., M.Eng., MBA, etc.)'] * 3,
+        'YearsCodePro': ['5', 'Less than 1 year', '12'],
+        'Employment': ['Employed, full-time'] * 3,
+        'ConvertedCompYearly': [60000.0, 30000.0, 20000.0],
+    })
+    batch = aggregates.append_responses(responses)
+    monkeypatch.setattr(pd, 'read_csv', read_csv)
+    monkeypatch.setattr(snapshot, 'read_snapshot', read_snapshot)
+    assert len(batch) == 3
+    assert sorted(reads, key=str) == [0, 0, 'model_statistics.feather', 'overview_aggregates.feather']
+
+    # The snapshots with their deltas, the aggregates and the stats index hold the whole datasets
+    for name in ['overview', 'model']:
+        csv_path, snapshot_file = data.dataset_paths(name)
+        assert snapshot.is_fresh(snapshot_file, csv_path)
+        assert len(snapshot.delta_paths(snapshot_file)) == 1
+        expected = data.read_csv(name)
+        pd.testing.assert_frame_equal(snapshot.read_snapshot(snapshot_file), expected, check_categorical=False)
+    whole = data.read_csv('overview').astype({'Country': str, 'EdLevel': str})
+    pd.testing.assert_frame_equal(aggregates.read_aggregates(aggregates.AGGREGATES_PATH).table,
+                                  aggregate(whole), check_exact=False)
+    index = stats_index.read_statistics(stats_index.STATISTICS_PATH)
+    assert snapshot.is_fresh(stats_index.STATISTICS_PATH, data.dataset_paths('model')[0])
+    pd.testing.assert_frame_equal(index.groups, SalaryStatsIndex.from_frame(data.read_csv('model')).groups,
+                                  check_exact=False)
+
+    # A full rebuild folds the deltas into the snapshot
+    data.build_snapshots(['overview'])
+    assert snapshot.delta_paths(data.dataset_paths('overview')[1]) == []
@@ -0,0 +1,58 @@
+import threading
+
+from utils import cache
+
+
+def test_slow_load_does_not_block_other_keys(tmp_path):
+    cache.clear()
+    path = str(tmp_path / 'data.csv')
+    open(path, 'w').close()
+    loading, release = threading.Event(), threading.Event()
+
+    def slow():
+        loading.set()
+        release.wait(5)
+        return 'slow'
+
+    thread = threading.Thread(target=cache.load_cached, args=('slow', [path], slow))
+    thread.start()
+    loading.wait(5)
+    # Loaded while the other key is still loading
+    fast = threading.Thread(target=cache.load_cached, args=('fast', [path], lambda: 'fast'))
+    fast.start()
+    fast.join(2)
+    assert not fast.is_alive()
+    release.set()
+    thread.join()
+    assert cache.load_cached('slow', [path], lambda: 'again') == 'slow'
+    cache.clear()
+
+
+def test_concurrent_loads_of_a_key_load_once(tmp_path):
+    cache.clear()
+    path = str(tmp_path / 'data.csv')
+    open(path, 'w').close()
+    calls = []
+    barrier = threading.Barrier(8)
+
+    def loader():
+        calls.append(1)
+        return object()
+
+    def load():
+        barrier.wait()
+        results.append(cache.load_cached('key', [path], loader))
+
+    results = []
+    threads = [threading.Thread(target=load) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(calls) == 1 and len({id(result) for result in results}) == 1
+    # A changed file is loaded again
+    with open(path, 'w') as file:
+        file.write('changed')
+    cache.load_cached('key', [path], loader)
+    assert len(calls) == 2
+    cache.clear()
@@ -0,0 +1,81 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.cleaning import clean_education, clean_experience, clean_survey
+
+EDUCATION = [
+    'Bachelor’s degree (B.A., B.S., B.Eng., etc.)',
+    'Master’s degree (M.A., M.S., M.Eng., MBA, etc.)',
+    'Professional degree (JD, MD, Ph.D, Ed.D, etc.)',
+    'Other doctoral degree (Ph.D., Ed.D., etc.)',
+    'Some college/university study without earning a degree',
+    'Something else',
+]
+EXPERIENCE = ['Less than 1 year', 'More than 50 years', '1', '7', '23']
+EMPLOYMENT = ['Employed, full-time', 'Employed, part-time', 'Independent contractor, freelancer, or self-employed']
+
+
+def notebook_wrangling(df, cutoff):
+    # The cells of Salary_Exploration_Prediction.ipynb, row-wise as written there
+    df = df[['Country', 'EdLevel', 'YearsCodePro', 'Employment', 'ConvertedCompYearly']]
+    df = df.rename(columns={'ConvertedCompYearly': 'Salary'})
+    df = df.dropna()
+    df = df[df['Employment'] == 'Employed, full-time']
+    df = df.drop(columns=['Employment'])
+    country_counts = df['Country'].value_counts()
+    valid_countries = country_counts[country_counts >= cutoff].index.tolist()
+    df['Country'] = df['Country'].apply(lambda x: x if x in valid_countries else 'Other')
+    df = df[(df['Salary'] >= 10000) & (df['Salary'] <= 250000)]
+
+    def experience(x):
+        if x == 'More than 50 years':
+            return 50
+        if x == 'Less than 1 year':
+            return 0.5
+        return float(x)
+
+    def education(x):
+        if 'Bachelor’s degree' in x:
+            return 'Bachelor’s degree'
+        if 'Master’s degree' in x:
+            return 'Master’s degree'
+        if 'Professional degree' in x or 'Other doctoral' in x:
+            return 'Post grad'
+        return 'Less than a Bachelors'
+
+    df['YearsCodePro'] = df['YearsCodePro'].apply(experience)
+    df['EdLevel'] = df['EdLevel'].apply(education)
+    return df.reset_index(drop=True)
+
+
+@pytest.fixture
+def survey():
+    rng = np.random.default_rng(0)
+    rows = 20000
+    df = pd.DataFrame({
+        'ResponseId': np.arange(rows),
+        'Country': rng.choice(['United States of America', 'Germany', 'India', 'Fiji', 'Malta'], rows,
+                              p=[0.5, 0.3, 0.19, 0.005, 0.005]),
+        'EdLevel': rng.choice(EDUCATION, rows),
+        'YearsCodePro': rng.choice(EXPERIENCE, rows),
+        'Employment': rng.choice(EMPLOYMENT, rows, p=[0.7, 0.15, 0.15]),
+        'ConvertedCompYearly': rng.uniform(1000, 400000, rows).round(),
+    })
+    for column, share in [('Country', 0.01), ('EdLevel', 0.02), ('YearsCodePro', 0.2), ('ConvertedCompYearly', 0.4)]:
+        df.loc[rng.random(rows) < share, column] = None
+    return df
+
+
+def test_clean_survey_matches_the_notebook(survey):
+    expected = notebook_wrangling(survey, cutoff=250)
+    actual = clean_survey(survey, cutoff=250)
+    assert set(actual['Country']) == {'United States of America', 'Germany', 'India', 'Other'}
+    pd.testing.assert_frame_equal(actual, expected, check_dtype=False)
+
+
+def test_row_rules():
+    assert clean_experience(pd.Series(EXPERIENCE)).tolist() == [0.5, 50.0, 1.0, 7.0, 23.0]
+    assert clean_education(pd.Series(EDUCATION)).tolist() == [
+        'Bachelor’s degree', 'Master’s degree', 'Post grad', 'Post grad', 'Less than a Bachelors',
+        'Less than a Bachelors']
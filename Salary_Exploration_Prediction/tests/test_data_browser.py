@@ -0,0 +1,54 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.data_browser import DataBrowser, page_count
+from utils.filtering import FilterIndex
+
+from conftest import COUNTRIES, EDUCATION_LEVELS
+
+
+@pytest.fixture
+def frame():
+    rng = np.random.default_rng(0)
+    rows = 3000
+    df = pd.DataFrame({
+        'Country': pd.Categorical(rng.choice(COUNTRIES, rows)),
+        'EdLevel': pd.Categorical(rng.choice(EDUCATION_LEVELS, rows)),
+        # Few distinct values: many ties
+        'YearsCodePro': rng.integers(0, 10, rows).astype('float32'),
+        'Salary': rng.integers(1, 50, rows).astype('float32') * 5000,
+    })
+    df.loc[rng.random(rows) < 0.02, 'Salary'] = np.nan
+    df.loc[rng.random(rows) < 0.02, 'Country'] = np.nan
+    return df
+
+
+@pytest.mark.parametrize('sort_by', [None, 'Salary', 'Country', 'YearsCodePro'])
+@pytest.mark.parametrize('ascending', [True, False])
+@pytest.mark.parametrize('categories, ranges', [
+    (None, None),
+    ({'Country': ['India', 'Germany'], 'EdLevel': EDUCATION_LEVELS[:2]}, {'YearsCodePro': (2, 6)}),
+])
+def test_pages_match_sort_values(frame, sort_by, ascending, categories, ranges):
+    browser = DataBrowser(FilterIndex(frame))
+    expected = frame
+    for column, values in (categories or {}).items():
+        expected = expected[expected[column].isin(values)]
+    for column, (low, high) in (ranges or {}).items():
+        expected = expected[expected[column].between(low, high)]
+    if sort_by is None:
+        expected = expected if ascending else expected.iloc[::-1]
+    else:
+        expected = expected.sort_values(sort_by, ascending=ascending, kind='stable', na_position='last')
+
+    page_size = 100
+    pages = page_count(len(expected), page_size)
+    for page in [0, 1, pages - 1]:
+        rows, total = browser.page(page, page_size, sort_by, ascending, categories, ranges)
+        assert total == len(expected)
+        pd.testing.assert_frame_equal(rows, expected.iloc[page * page_size:(page + 1) * page_size])
+
+
+def test_page_count():
+    assert [page_count(rows, 50) for rows in (0, 1, 50, 51)] == [1, 1, 1, 2]
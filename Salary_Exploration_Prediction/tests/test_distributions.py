@@ -0,0 +1,48 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.distributions import box_statistics, histogram_bins
+
+
+@pytest.fixture
+def salaries():
+    rng = np.random.default_rng(0)
+    rows = 20000
+    groups = pd.Categorical(rng.choice(['a', 'b', 'c', 'd'], rows, p=[0.6, 0.3, 0.0999, 0.0001]),
+                            categories=['a', 'b', 'c', 'd', 'empty'])
+    # Heavy right tail, so that every group has outliers
+    salary = np.round(rng.lognormal(11, 0.6, rows))
+    salary[groups == 'b'] *= 1.5
+    return pd.Series(groups), salary
+
+
+def test_box_statistics_match_numpy(salaries):
+    groups, salary = salaries
+    table, outliers = box_statistics(groups, salary, max_outliers=50)
+    assert list(table.index) == ['a', 'b', 'c', 'd']
+    for name, row in table.iterrows():
+        values = np.sort(salary[groups == name])
+        q1, median, q3 = np.percentile(values, [25, 50, 75])
+        assert (row['count'], row['q1'], row['median'], row['q3']) == pytest.approx((len(values), q1, median, q3))
+        iqr = q3 - q1
+        inside = values[(values >= q1 - 1.5 * iqr) & (values <= q3 + 1.5 * iqr)]
+        assert (row['lowerfence'], row['upperfence']) == (inside.min(), inside.max())
+        assert row['notchspan'] == pytest.approx(1.57 * iqr / np.sqrt(len(values)))
+        beyond = values[(values < inside.min()) | (values > inside.max())]
+        assert len(outliers[name]) == min(len(beyond), 50)
+        if len(beyond):
+            # The extremes are always drawn
+            assert outliers[name].min() == beyond.min() and outliers[name].max() == beyond.max()
+
+
+def test_histogram_bins_count_every_salary(salaries):
+    _, salary = salaries
+    bins = histogram_bins(salary, nbins=50)
+    assert len(bins) <= 51 and bins['count'].sum() == len(salary)
+    expected = [((salary >= left) & (salary < right)).sum() for left, right in zip(bins['left'], bins['right'])]
+    assert bins['count'].tolist() == expected
+    # Edges are multiples of a 1, 2 or 5 x 10^k width
+    width = bins['right'][0] - bins['left'][0]
+    assert width / 10 ** np.floor(np.log10(width)) in (1, 2, 5)
+    assert (bins['left'] / width).round(6).eq((bins['left'] / width).round()).all()
@@ -0,0 +1,29 @@
+from utils.engines import select_engine, trade_offs
+
+
+def row(engine, rmse, single_row_ms=1.0, batch_ms=10.0, size_mb=1.0):
+    return {'engine': engine, 'rmse': rmse, 'single_row_ms': single_row_ms, 'batch_ms': batch_ms,
+            'size_mb': size_mb}
+
+
+TABLE = [
+    row('random_forest', 100.0, single_row_ms=80.0, size_mb=300.0),
+    row('random_forest_small', 120.0),
+    row('piecewise_linear', 110.0),
+]
+
+
+def test_lowest_rmse_within_the_budget():
+    assert select_engine(TABLE) == ('piecewise_linear', True)
+
+
+def test_lowest_rmse_overall_when_nothing_fits():
+    assert select_engine(TABLE, {'single_row_ms': 0.5, 'batch_ms': None, 'size_mb': None}) == \
+        ('random_forest', False)
+
+
+def test_unlimited_budget_keeps_the_most_accurate():
+    budget = {'single_row_ms': None, 'batch_ms': None, 'size_mb': None}
+    assert select_engine(TABLE, budget) == ('random_forest', True)
+    assert [engine['within_budget'] for engine in trade_offs(TABLE, 'piecewise_linear')['engines']] == \
+        [False, True, True]
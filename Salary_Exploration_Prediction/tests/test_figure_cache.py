@@ -0,0 +1,44 @@
+import numpy as np
+
+from utils import figure_cache
+from utils.figure_cache import FigureCache, figure_key
+
+
+class Figure:
+    def to_json(self):
+        return '{"data": []}'
+
+
+def test_plotly_hit_returns_the_cached_figure():
+    figure_cache.clear()
+    built = []
+
+    def build():
+        built.append(Figure())
+        return built[-1]
+
+    first = figure_cache.cached_plotly('section', {'countries': np.array(['India', 'Germany'])}, [], build)
+    # Same selection: no build and no parsing, the same object
+    again = figure_cache.cached_plotly('section', {'countries': ['India', 'Germany']}, [], build)
+    assert again is first and len(built) == 1
+    figure_cache.clear()
+
+
+def test_selection_order_is_part_of_the_key():
+    # The boxes are drawn in the order of the multiselect
+    assert figure_key('section', {'countries': ['India', 'Germany']}, []) != \
+        figure_key('section', {'countries': ['Germany', 'India']}, [])
+    assert figure_key('section', {'countries': {'India', 'Germany'}}, []) == \
+        figure_key('section', {'countries': {'Germany', 'India'}}, [])
+
+
+def test_least_recently_used_figures_are_evicted_by_size():
+    cache = FigureCache(max_bytes=100)
+    cache.put('a', object(), 40)
+    cache.put('b', b'x' * 40)
+    cache.get('a')
+    cache.put('c', object(), 40)
+    assert cache.get('b') is None and cache.get('a') is not None and cache.size == 80
+    # Larger than the whole cache: not kept
+    cache.put('d', object(), 101)
+    assert cache.get('d') is None and cache.size == 80
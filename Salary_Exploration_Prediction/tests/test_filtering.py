@@ -0,0 +1,47 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.filtering import FilterIndex
+
+from conftest import COUNTRIES, EDUCATION_LEVELS
+
+
+def frame(rows=5000, missing=False, seed=0):
+    rng = np.random.default_rng(seed)
+    # A rare country, so that some selections take the few-rows path
+    country = rng.choice(COUNTRIES + ['Fiji'], rows, p=[0.3, 0.3, 0.2, 0.19, 0.01])
+    df = pd.DataFrame({
+        'Country': pd.Categorical(country, categories=COUNTRIES + ['Fiji', 'Malta']),
+        'EdLevel': pd.Categorical(rng.choice(EDUCATION_LEVELS, rows)),
+        'Salary': rng.uniform(10000, 250000, rows),
+    })
+    if missing:
+        df.loc[rng.random(rows) < 0.05, ['Country', 'EdLevel']] = np.nan
+    return df
+
+
+@pytest.mark.parametrize('missing', [False, True])
+@pytest.mark.parametrize('countries, education', [
+    (COUNTRIES + ['Fiji', 'Malta'], EDUCATION_LEVELS),
+    (['Fiji'], EDUCATION_LEVELS),
+    (['Germany', 'India', 'Atlantis'], ['Post grad']),
+    (['Other', 'United States of America', 'Germany'], EDUCATION_LEVELS[:3]),
+    ([], EDUCATION_LEVELS),
+    (['Malta'], ['Post grad']),
+    # The last category with many rows: the lookup path
+    (COUNTRIES + ['Malta'], EDUCATION_LEVELS[1:]),
+])
+def test_select_matches_isin(missing, countries, education):
+    df = frame(missing=missing)
+    index = FilterIndex(df)
+    expected = df[df['Country'].isin(countries) & df['EdLevel'].isin(education)]
+    # Twice: the second time from the cached masks
+    for _ in range(2):
+        actual = index.select(['Salary', 'Country'], Country=countries, EdLevel=education)
+        pd.testing.assert_frame_equal(actual, expected[['Salary', 'Country']])
+
+
+def test_selecting_everything_returns_the_frame():
+    df = frame()
+    assert FilterIndex(df).select(Country=COUNTRIES + ['Fiji', 'Malta']) is df
@@ -0,0 +1,81 @@
+import warnings
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils import forest
+from utils.forest import CompactForest, export_forest, memmap_npz
+from utils.prediction import FEATURES
+
+from conftest import COUNTRIES, EDUCATION_LEVELS
+
+sklearn = pytest.importorskip('sklearn')
+
+
+@pytest.fixture(scope='module')
+def fitted():
+    from sklearn.ensemble import RandomForestRegressor
+    from sklearn.preprocessing import LabelEncoder
+
+    rng = np.random.default_rng(0)
+    rows = 3000
+    X = pd.DataFrame({'Country': rng.integers(0, len(COUNTRIES), rows),
+                      'EdLevel': rng.integers(0, len(EDUCATION_LEVELS), rows),
+                      'YearsCodePro': rng.choice(np.r_[0.5, np.arange(0, 51)], rows)}, columns=FEATURES)
+    y = 30000 + 20000 * X['Country'] + 5000 * X['EdLevel'] + 1500 * X['YearsCodePro'] + rng.normal(0, 5000, rows)
+    model = RandomForestRegressor(n_estimators=12, max_depth=9, random_state=0).fit(X, y)
+    return model, LabelEncoder().fit(COUNTRIES), LabelEncoder().fit(EDUCATION_LEVELS)
+
+
+@pytest.fixture
+def exported(fitted, tmp_path):
+    path = str(tmp_path / 'forest.npz')
+    export_forest(*fitted, path=path, model_sha256='abc')
+    return path
+
+
+def inputs(rows=500, seed=1):
+    rng = np.random.default_rng(seed)
+    return np.column_stack([rng.integers(0, len(COUNTRIES), rows), rng.integers(0, len(EDUCATION_LEVELS), rows),
+                            rng.choice(np.r_[0.5, 2.5, np.arange(0, 91)], rows)]).astype(float)
+
+
+def test_predictions_match_sklearn(fitted, exported, monkeypatch):
+    model = fitted[0]
+    compact = CompactForest(memmap_npz(exported))
+    X = inputs()
+    # Several chunks of rows
+    monkeypatch.setattr(forest, 'MAX_CHUNK_NODES', 12 * 64)
+    np.testing.assert_allclose(compact.predict(X), model.predict(pd.DataFrame(X, columns=FEATURES)), atol=1e-6)
+    with warnings.catch_warnings():
+        # The estimators were fitted without feature names
+        warnings.simplefilter('ignore', UserWarning)
+        trees = np.column_stack([estimator.predict(X) for estimator in model.estimators_])
+    np.testing.assert_allclose(compact.predict_trees(X), trees, atol=1e-6)
+    mean, quantiles = compact.predict_quantiles(X, [0.1, 0.9])
+    np.testing.assert_allclose(quantiles, np.quantile(trees, [0.1, 0.9], axis=1).T, atol=1e-6)
+    assert compact.le_country.classes_.tolist() == COUNTRIES
+
+
+def test_members_are_read_only_views_of_the_file(exported):
+    arrays = memmap_npz(exported)
+    with np.load(exported) as archive:
+        assert set(arrays) == set(archive.files)
+        for name, array in arrays.items():
+            assert isinstance(array, np.memmap) and not array.flags.writeable
+            np.testing.assert_array_equal(array, archive[name])
+
+
+def test_compressed_archive_is_refused(fitted, tmp_path):
+    path = str(tmp_path / 'forest.npz')
+    np.savez_compressed(path, **forest.flatten_forest(*fitted))
+    with pytest.raises(ValueError, match='compressed'):
+        memmap_npz(path)
+
+
+def test_forest_of_another_model_is_ignored(exported, tmp_path):
+    model_path = tmp_path / 'saved_steps.pkl'
+    model_path.write_bytes(b'another model')
+    assert forest._read_forest(exported, str(model_path)) is None
+    assert forest._read_forest(exported, str(tmp_path / 'missing.pkl')) is not None
@@ -0,0 +1,42 @@
+import os
+
+import pandas as pd
+import pytest
+
+from utils import ingestion
+
+
+@pytest.mark.parametrize('path, year', [
+    ('/home/user2019/Data/survey_2022.csv', 2022),
+    ('Data/2021/survey_results_public_2021.csv', 2021),
+])
+def test_survey_year_from_the_file_name(path, year):
+    assert ingestion.survey_year(path) == year
+
+
+def test_survey_year_needs_a_year_in_the_file_name():
+    with pytest.raises(ValueError, match='YEAR='):
+        ingestion.survey_year('Data/2022/survey_results_public.csv')
+
+
+def survey(path, rows):
+    pd.DataFrame({
+        'Country': ['Germany'] * rows,
+        'EdLevel': ['Master’s degree (M.A., M.S., M.Eng., MBA, etc.)'] * rows,
+        'YearsCodePro': ['5'] * rows,
+        'Employment': ['Employed, full-time'] * rows,
+        'ConvertedCompYearly': [60000.0] * rows,
+    }).to_csv(path, index=False)
+
+
+def test_ingesting_a_year_again_replaces_its_partition(tmp_path):
+    pytest.importorskip('pyarrow')
+    store = str(tmp_path / 'store')
+    path = str(tmp_path / 'survey.csv')
+    survey(path, 30)
+    ingestion.ingest(path, 2022, store, chunk_rows=10, log=lambda message: None)
+    survey(path, 5)
+    entry = ingestion.ingest(path, 2022, store, chunk_rows=10, log=lambda message: None)
+    assert entry['rows'] == 5
+    assert len(ingestion.load_store(store_dir=store)) == 5
+    assert sorted(os.listdir(store)) == ['manifest.json', 'year=2022']
@@ -0,0 +1,49 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.piecewise import PiecewiseLinearTable
+
+
+def salary(country, education, years):
+    # A curve per pair: base of the country and education, rising until 20 years
+    return 30000 + 20000 * country + 10000 * education + 2000 * np.minimum(years, 20)
+
+
+@pytest.fixture
+def fitted():
+    rng = np.random.default_rng(0)
+    rows = 100000
+    X = pd.DataFrame({'Country': rng.integers(0, 3, rows), 'EdLevel': rng.integers(0, 4, rows),
+                      'YearsCodePro': rng.integers(0, 40, rows).astype(float)})
+    # No answer of country 2 with education 3
+    X = X[~((X['Country'] == 2) & (X['EdLevel'] == 3))]
+    y = salary(X['Country'], X['EdLevel'], X['YearsCodePro']) + rng.normal(0, 1000, len(X))
+    return PiecewiseLinearTable().fit(X, y)
+
+
+def test_fit_follows_the_curves(fitted):
+    X = pd.DataFrame({'Country': [0, 1, 2, 1], 'EdLevel': [0, 2, 1, 3], 'YearsCodePro': [0.0, 7.5, 20, 35]})
+    expected = salary(X['Country'], X['EdLevel'], X['YearsCodePro']).to_numpy()
+    # Within the pull of the shrinkage towards the country curve
+    np.testing.assert_allclose(fitted.predict(X), expected, atol=2000)
+
+
+def test_pair_without_answers_takes_its_country_curve(fitted):
+    X = pd.DataFrame({'Country': [2], 'EdLevel': [3], 'YearsCodePro': [10.0]})
+    country_curve = np.interp(10.0, fitted.knots_, fitted.country_curves_[2])
+    assert fitted.predict(X)[0] == pytest.approx(country_curve, rel=0.02)
+
+
+def test_unknown_codes_fall_back_to_the_prior_curves(fitted):
+    X = np.array([[1, 9, 5.0], [7, 0, 5.0], [-1, 0, 5.0]])
+    predictions = fitted.predict(X)
+    assert predictions[0] == pytest.approx(np.interp(5.0, fitted.knots_, fitted.country_curves_[1]))
+    assert predictions[1] == pytest.approx(np.interp(5.0, fitted.knots_, fitted.overall_curve_))
+    assert predictions[2] == predictions[1]
+
+
+def test_unknown_codes_of_an_older_model_raise(fitted):
+    del fitted.overall_curve_, fitted.country_curves_
+    with pytest.raises(ValueError, match='outside the 3 x 4 codes'):
+        fitted.predict(np.array([[3, 0, 5.0]]))
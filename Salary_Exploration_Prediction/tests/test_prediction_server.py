@@ -0,0 +1,110 @@
+import threading
+from http.server import ThreadingHTTPServer
+
+import numpy as np
+import pytest
+
+from utils.lookup import PredictionTable, TableFirstRegressor
+from utils.prediction import feature_matrix
+from utils.prediction_server import PredictionClient, PredictionHandler, PredictionService
+
+
+@pytest.fixture
+def serve():
+    """Start a one-process server on a free port for a model, return its client."""
+    servers = []
+
+    def start(model, le_country, le_education, model_sha256=''):
+        server = ThreadingHTTPServer(('127.0.0.1', 0), PredictionHandler)
+        server.daemon_threads = True
+        server.service = PredictionService(model, le_country, le_education, model_sha256=model_sha256)
+        server.verbose = False
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return PredictionClient(f'http://127.0.0.1:{server.server_address[1]}')
+
+    start.servers = servers
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def test_table_predicts_float_codes(prediction_table):
+    # The server builds float feature matrices
+    X = feature_matrix(np.array([1.0, 3.0]), np.array([2.0, 0.0]), [5, 90])
+    assert prediction_table.predict(X).tolist() == [1002005.0, 3000090.0]
+
+
+def test_server_on_prediction_table(serve, prediction_table):
+    client = serve(prediction_table, prediction_table.le_country, prediction_table.le_education)
+    assert client.predict('India', 'Post grad', 4) == 1003004.0
+    # Unknown countries are predicted as 'Other'
+    assert client.predict('Atlantis', 'Post grad', 4) == 2003004.0
+    projection = client.projection('Germany', 'Master’s degree', 50, 40)
+    assert projection['Years of Experience'].tolist() == list(range(50, 91))
+    assert projection['Predicted Salary'].tolist() == [2000.0 + years for years in range(50, 91)]
+
+
+@pytest.mark.parametrize('experience, horizon, message', [
+    (2.5, None, 'whole numbers'),
+    (91, None, 'covers 0 to 90'),
+    (60, 40, 'covers 0 to 90'),
+])
+def test_server_rejects_years_outside_the_table(serve, prediction_table, experience, horizon, message):
+    client = serve(prediction_table, prediction_table.le_country, prediction_table.le_education)
+    with pytest.raises(ValueError, match=message):
+        if horizon is None:
+            client.predict('India', 'Post grad', experience)
+        else:
+            client.projection('India', 'Post grad', experience, horizon)
+
+
+def test_server_reports_model_failures(serve, prediction_table):
+    class Broken:
+        def predict(self, X):
+            raise RuntimeError('model failed')
+
+    client = serve(Broken(), prediction_table.le_country, prediction_table.le_education)
+    with pytest.raises(ValueError, match='error 500: RuntimeError: model failed'):
+        client.predict('India', 'Post grad', 4)
+    # The worker still answers afterwards
+    assert client._call('/health')['model'] == 'Broken'
+
+
+def test_server_answers_the_table_first(serve, prediction_table):
+    class Forest:
+        rows = []
+
+        def predict(self, X):
+            self.rows.extend(X['YearsCodePro'])
+            return -X['YearsCodePro'].to_numpy()
+
+    loads = []
+    regressor = TableFirstRegressor(prediction_table, lambda: loads.append(1) or Forest())
+    client = serve(regressor, regressor.le_country, regressor.le_education)
+    assert client.predict('India', 'Post grad', 4) == 1003004.0
+    assert client.projection('Germany', 'Post grad', 80, 10)['Predicted Salary'].tolist()[-1] == 3090.0
+    # The full model is only loaded for the years outside the table
+    assert loads == []
+    assert client.predict('India', 'Post grad', 2.5) == -2.5
+    projection = client.projection('Germany', 'Post grad', 88, 5)
+    assert projection['Predicted Salary'].tolist() == [3088.0, 3089.0, 3090.0, -91.0, -92.0, -93.0]
+    assert loads == [1]
+    assert Forest.rows == [2.5, 91, 92, 93]
+
+
+def test_client_reloads_the_classes_of_a_new_model(serve, prediction_table):
+    client = serve(prediction_table, prediction_table.le_country, prediction_table.le_education, 'old')
+    assert client.model_sha256 == 'old'
+    # The server is restarted with a model that knows one more education level
+    levels = list(prediction_table.le_education.classes_) + ['Professional degree']
+    table = np.zeros(prediction_table.table.shape[:1] + (len(levels),) + prediction_table.table.shape[2:])
+    table[:, 4] = 7.0
+    new_model = PredictionTable(table, prediction_table.le_country.classes_, levels)
+    serve.servers[0].service = PredictionService(new_model, new_model.le_country, new_model.le_education,
+                                                 model_sha256='new')
+    assert client.predict('India', 'Post grad', 4) == 0.0
+    assert client.model_sha256 == 'new'
+    assert 'Professional degree' in client.le_education.classes_
+    assert client.predict('India', 'Professional degree', 4) == 7.0
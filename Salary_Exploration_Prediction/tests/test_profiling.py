@@ -0,0 +1,60 @@
+import sys
+import threading
+
+import pytest
+
+from utils import profiling
+
+
+def profiler_enabled():
+    # cProfile hooks sys.monitoring from Python 3.12 on, sys.setprofile before
+    if hasattr(sys, 'monitoring'):
+        return sys.monitoring.get_tool(sys.monitoring.PROFILER_ID) is not None
+    return sys.getprofile() is not None
+
+
+@pytest.fixture
+def cprofiled(monkeypatch):
+    # Profile every rerun with cProfile
+    monkeypatch.setenv('SALARY_APP_PROFILE', '1')
+    monkeypatch.setattr(profiling, 'CPROFILE_SAMPLE', 1.0)
+    monkeypatch.setattr(profiling, 'METRICS_PORT', None)
+    yield
+    monkeypatch.setattr(profiling, 'CPROFILE_SAMPLE', 0.0)
+    profiling.start('cleanup')
+    profiling.finish()
+
+
+def test_finished_rerun_is_recorded(cprofiled):
+    profiling.start('Overview')
+    with profiling.phase('load'):
+        pass
+    assert profiler_enabled()
+    profiling.finish()
+    assert profiling.current() is None and not profiler_enabled()
+    assert ('Overview', 'load') in profiling._totals
+
+
+def test_interrupted_rerun_is_finished_by_the_next_one(cprofiled, monkeypatch):
+    # st.rerun() raised before finish(); Streamlit reruns the page on the same thread
+    interrupted = profiling.start('Interrupted')
+    assert interrupted.profiler is not None and profiler_enabled()
+    monkeypatch.setattr(profiling, 'CPROFILE_SAMPLE', 0.0)
+    profiling.start('Overview')
+    assert not profiler_enabled()
+    assert threading.current_thread() in profiling._running
+    assert ('Interrupted', 'total') not in profiling._totals
+    profiling.finish()
+    assert not profiling._running
+
+
+def test_rerun_of_an_ended_thread_is_finished(cprofiled, monkeypatch):
+    # st.stop() or an exception: the script thread ends without finish()
+    thread = threading.Thread(target=profiling.start, args=('Stopped',))
+    thread.start()
+    thread.join()
+    assert thread in profiling._running
+    monkeypatch.setattr(profiling, 'CPROFILE_SAMPLE', 0.0)
+    profiling.start('Overview')
+    assert thread not in profiling._running and not profiler_enabled()
+    profiling.finish()
@@ -0,0 +1,105 @@
+import io
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils import forest, lookup, prediction, scoring
+
+
+class FakeForest:
+    """Predicts minus the years, for the rows the prediction table does not cover."""
+
+    def predict(self, X):
+        return -X['YearsCodePro'].to_numpy()
+
+
+@pytest.fixture
+def scorer(monkeypatch, prediction_table):
+    # The forest answers the fractional years; the pickled model is never needed
+    monkeypatch.setattr(lookup, 'load_table_first', lambda: lookup.TableFirstRegressor(prediction_table))
+    monkeypatch.setattr(forest, 'load_forest', lambda: FakeForest())
+    monkeypatch.setattr(prediction, 'load_steps', lambda: pytest.fail('the pickled model was loaded'))
+    return scoring.RosterScorer()
+
+
+def roster(**columns):
+    return pd.DataFrame(columns, dtype=str)
+
+
+def test_encoding(scorer):
+    chunk = roster(
+        country=['India', 'Atlantis', ' Germany '],
+        education=['Post grad', 'Master’s degree (M.A., M.S., M.Eng., MBA, etc.)',
+                   'Secondary school (e.g. American high school, German Realschule or Gymnasium, etc.)'],
+        experience=['4', 'Less than 1 year', 'More than 50 years'],
+    )
+    country, education, experience = scorer.encode(chunk, scoring.roster_columns(chunk.columns))
+    # Unknown countries are 'Other'; survey answers are cleaned like the survey
+    assert country.tolist() == [1, 2, 0]
+    assert education.tolist() == [3, 2, 1]
+    assert experience.tolist() == [4.0, 0.5, 50.0]
+
+
+def test_unrecognized_education_is_not_scored(scorer):
+    chunk = roster(Country=['India'] * 4, EdLevel=['', 'PhD', 'nan', 'Bachelor’s degree'],
+                   YearsCodePro=['4'] * 4)
+    scored = scorer.score(chunk)
+    assert scored['Scored EdLevel'].isna().tolist() == [True, True, True, False]
+    assert scored['Scored EdLevel'][3] == 'Bachelor’s degree'
+    assert np.isnan(scored['Predicted Salary'][:3]).all()
+    assert scored['Predicted Salary'][3] == 1000004.0
+
+
+def test_invalid_experience_is_not_scored(scorer):
+    chunk = roster(Country=['India'] * 6, EdLevel=['Post grad'] * 6,
+                   YearsCodePro=['', 'ten', '-1', 'inf', 'nan', '90'])
+    predictions = scorer.score(chunk)['Predicted Salary']
+    assert np.isnan(predictions[:5]).all()
+    assert predictions[5] == 1003090.0
+
+
+def test_fractional_experience_uses_the_forest(scorer):
+    chunk = roster(Country=['India'] * 3, EdLevel=['Post grad'] * 3,
+                   YearsCodePro=['Less than 1 year', '4', '95'])
+    assert scorer.score(chunk)['Predicted Salary'].tolist() == [-0.5, 1003004.0, -95.0]
+
+
+@pytest.mark.parametrize('name', ['scored.csv', 'scored.parquet'])
+def test_score_file_in_memory(scorer, monkeypatch, name):
+    if name.endswith('.parquet'):
+        pytest.importorskip('pyarrow')
+    monkeypatch.setattr(scoring, 'RosterScorer', lambda: scorer)
+    source = io.BytesIO('country,education,experience\nIndia,Post grad,4\nGermany,PhD,3\n'.encode())
+    output = io.BytesIO()
+    assert scoring.score_file(source, output, name='roster.csv', output_name=name) == 2
+    data = io.BytesIO(output.getvalue())
+    scored = pd.read_parquet(data) if name.endswith('.parquet') else pd.read_csv(data)
+    assert scored['Predicted Salary'].tolist()[0] == 1003004.0
+    assert np.isnan(scored['Predicted Salary'].tolist()[1])
+
+
+def test_parquet_schema_does_not_depend_on_the_first_chunk(scorer, monkeypatch):
+    pytest.importorskip('pyarrow')
+    monkeypatch.setattr(scoring, 'RosterScorer', lambda: scorer)
+    # The first chunk has no known education level, so no Scored EdLevel and no prediction
+    source = io.BytesIO('country,education,experience\nIndia,PhD,4\nIndia,,2\nGermany,Post grad,3\n'.encode())
+    output = io.BytesIO()
+    assert scoring.score_file(source, output, name='roster.csv', chunk_rows=2, output_name='scored.parquet') == 3
+    scored = pd.read_parquet(io.BytesIO(output.getvalue()))
+    assert scored['Scored EdLevel'].isna().tolist() == [True, True, False]
+    assert scored['Scored EdLevel'][2] == 'Post grad'
+    assert scored['Predicted Salary'][2] == 3003.0
+
+
+def test_scored_roster_file_is_deleted_with_it(tmp_path, monkeypatch):
+    monkeypatch.setattr(scoring.tempfile, 'tempdir', str(tmp_path))
+    scored = scoring.ScoredRoster('roster.parquet')
+    assert scored.path.endswith('.parquet') and scored.read() == b''
+    path = scored.path
+    del scored
+    assert not os.path.exists(path)
+    replaced = scoring.ScoredRoster('roster.csv')
+    replaced.delete()
+    assert list(tmp_path.iterdir()) == []
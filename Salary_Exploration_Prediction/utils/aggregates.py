@@ -0,0 +1,202 @@
+"""
+Materialized salary aggregates of the overview dataset.
+
+The Overview page only shows counts and average salaries per Country,
+EdLevel, YearsCodePro and Country x EdLevel. Instead of grouping the whole
+dataset on every rerun, the aggregates keep count, sum, sum of squares, min
+and max of the salaries for every (Country, EdLevel, YearsCodePro) group (the
+group statistics of utils/stats_index.py, here on the decoded names) and roll
+them up to the coarser groupings on demand, which costs the number of groups
+(a few thousand), not the number of rows.
+
+The aggregates are persisted next to the data as
+Data/overview_aggregates.feather, tagged like the snapshots with the
+signature of dataset_overview.csv. A batch of new survey responses is added
+with `append_responses()`, or from the app folder with
+
+    python -m utils.aggregates append new_responses.csv
+
+which cleans the batch, appends its rows to dataset_overview.csv and, label
+encoded, to dataset_model.csv, adds them as deltas to the snapshots of both
+datasets (see utils/snapshot.py) and merges their statistics into the stored
+aggregates and into those of the stats index: the cost depends on the batch
+and the number of groups, the datasets are never read. The structures that
+index every row (filter index, data browser, cached figures) are keyed on
+the signatures of the files and are rebuilt from the snapshots on their next
+use. The country of the new rows is kept when it already has
+its own group and becomes 'Other' otherwise; the cut-off itself is only
+re-evaluated by a full rebuild (`python -m utils.aggregates rebuild` or the
+training pipeline), and so are countries or education levels that the
+datasets do not have yet, which the label codes of the model cannot hold.
+"""
+
+import argparse
+import math
+import os
+
+import pandas as pd
+
+from utils import snapshot, stats_index
+from utils.cache import file_signature, load_cached
+from utils.cleaning import clean_rows, select_full_time
+from utils.data import DATASETS, build_snapshots, data_path, dataset_paths, load_overview, read_csv
+from utils.stats_index import KEYS, combine, group_statistics, with_moments
+
+AGGREGATES_PATH = data_path('overview_aggregates.feather')
+
+
+def aggregate(df):
+    """Statistics of the salaries of `df` per (Country, EdLevel, YearsCodePro)."""
+    return group_statistics(df.astype({'Country': str, 'EdLevel': str, 'YearsCodePro': 'float64'}))
+
+
+def merge(*tables):
+    """Combine the statistics of several aggregate tables."""
+    return combine(pd.concat(tables), KEYS)
+
+
+class SalaryAggregates:
+    """Salary statistics per (Country, EdLevel, YearsCodePro), rolled up on demand."""
+
+    def __init__(self, table):
+        self.table = table
+
+    @classmethod
+    def from_frame(cls, df):
+        return cls(aggregate(df))
+
+    def append(self, df):
+        # Cost proportional to the batch and the number of groups
+        self.table = merge(self.table, aggregate(df))
+        return self
+
+    def rollup(self, keys):
+        """count, sum, sum_sq, min, max, mean and std (ddof=1) of the salaries per `keys`."""
+        return with_moments(combine(self.table, keys))
+
+    def total(self):
+        """Statistics of all the salaries."""
+        count, total = self.table['count'].sum(), self.table['sum'].sum()
+        return {'count': int(count), 'mean': total / count if count else math.nan,
+                'min': self.table['min'].min(), 'max': self.table['max'].max()}
+
+    def countries(self):
+        return self.table.index.get_level_values('Country').unique()
+
+    def education_levels(self):
+        return self.table.index.get_level_values('EdLevel').unique()
+
+
+def write_aggregates(aggregates, path=AGGREGATES_PATH):
+    snapshot.write_snapshot(aggregates.table.reset_index(), path, dataset_paths('overview')[0])
+
+
+def read_aggregates(path=AGGREGATES_PATH):
+    return SalaryAggregates(snapshot.read_snapshot(path).set_index(KEYS))
+
+
+def build_aggregates(path=AGGREGATES_PATH):
+    """Aggregate the whole overview dataset and persist the result next to the data."""
+    aggregates = SalaryAggregates.from_frame(read_csv('overview'))
+    if snapshot.available():
+        write_aggregates(aggregates, path)
+    return aggregates
+
+
+def _read():
+    if snapshot.is_fresh(AGGREGATES_PATH, dataset_paths('overview')[0]):
+        return read_aggregates(AGGREGATES_PATH)
+    try:
+        return build_aggregates(AGGREGATES_PATH)
+    except OSError:
+        # Read-only data folder: keep the aggregates in memory only
+        return SalaryAggregates.from_frame(load_overview())
+
+
+def load_aggregates():
+    """Return the aggregates of the current overview dataset."""
+    return load_cached(('overview_aggregates',), list(dataset_paths('overview')) + [AGGREGATES_PATH], _read)
+
+
+def clean_responses(responses, countries):
+    """Clean a batch of raw survey responses like the overview dataset, grouping unknown countries into 'Other'."""
+    df = clean_rows(select_full_time(responses))
+    df = df.assign(Country=df['Country'].where(df['Country'].isin(countries), 'Other'))
+    return df[['Country', 'EdLevel', 'YearsCodePro', 'Salary']].reset_index(drop=True)
+
+
+def encode_responses(batch, countries, education_levels):
+    """Label-encode a cleaned batch like dataset_model.csv, whose codes index the sorted names."""
+    encoded = {}
+    for column, names in (('Country', countries), ('EdLevel', education_levels)):
+        classes = pd.Index(sorted(names))
+        unknown = set(batch[column]) - set(classes)
+        if unknown:
+            raise ValueError(f'New {column} values {sorted(unknown)} are not in the datasets; '
+                             'rebuild them with python -m utils.training')
+        encoded[column] = classes.get_indexer(batch[column])
+    return batch.assign(**encoded)
+
+
+def _append_rows(name, rows):
+    # Append `rows` to the CSV of the dataset `name` and to its snapshot: as a delta when
+    # the snapshot was fresh, else (it was ignored anyway) by rebuilding it
+    csv_path, snapshot_file = dataset_paths(name)
+    fresh = snapshot.is_fresh(snapshot_file, csv_path)
+    previous = file_signature(csv_path)
+    # Same column order as the file
+    rows = rows[list(pd.read_csv(csv_path, nrows=0).columns)]
+    rows.to_csv(csv_path, mode='a', header=False, index=False)
+    if fresh:
+        # The columns of the snapshot, with its dtypes
+        dtype = DATASETS[name]['dtype']
+        snapshot.append_snapshot(rows[list(dtype)].astype(dtype), snapshot_file, csv_path, previous)
+    elif snapshot.available():
+        build_snapshots([name])
+
+
+def append_responses(responses):
+    """Add a batch of raw survey responses to the overview and model datasets and to the aggregates."""
+    csv_path = dataset_paths('overview')[0]
+    model_path = dataset_paths('model')[0]
+    if snapshot.is_fresh(AGGREGATES_PATH, csv_path):
+        aggregates = read_aggregates(AGGREGATES_PATH)
+    else:
+        aggregates = build_aggregates(AGGREGATES_PATH)
+    batch = clean_responses(responses, aggregates.countries())
+    # Encoded before anything is written, so that a batch that cannot be encoded changes nothing
+    encoded = encode_responses(batch, aggregates.countries(), aggregates.education_levels())
+
+    _append_rows('overview', batch)
+    if snapshot.available():
+        write_aggregates(aggregates.append(batch), AGGREGATES_PATH)
+    if os.path.exists(model_path):
+        # Statistics that are already stale are left to be rebuilt on their next use
+        statistics_path = stats_index.STATISTICS_PATH
+        merge_statistics = snapshot.is_fresh(statistics_path, model_path)
+        _append_rows('model', encoded)
+        if merge_statistics:
+            # With the dtypes of the model dataset, like the statistics
+            index = stats_index.read_statistics(statistics_path).append(encoded.astype(DATASETS['model']['dtype']))
+            stats_index.write_statistics(index, statistics_path)
+    return batch
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Maintain the aggregates of the overview dataset.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    append = commands.add_parser('append', help='Add a CSV of new survey responses')
+    append.add_argument('responses', help='CSV with the columns of survey_results_public.csv')
+    commands.add_parser('rebuild', help='Aggregate the whole overview dataset again')
+    args = parser.parse_args(argv)
+
+    if args.command == 'append':
+        batch = append_responses(pd.read_csv(args.responses))
+        print(f'{len(batch)} rows added to {dataset_paths("overview")[0]}')
+    else:
+        aggregates = build_aggregates()
+        print(f'{len(aggregates.table)} groups written to {AGGREGATES_PATH}')
+
+
+if __name__ == '__main__':
+    main()
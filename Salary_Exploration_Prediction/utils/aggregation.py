@@ -0,0 +1,47 @@
+"""
+Aggregated points for the scatter and bubble charts of the Dynamic Visualization page.
+
+Plotting every respondent ships one marker per row to the browser. Instead,
+the respondents are binned by (YearsCodePro, salary bucket, Country) and each
+bin becomes a single point at the mean salary of the bin, with the number of
+respondents it holds. When the bins still exceed the maximum-points budget the
+salary buckets are widened, and as a last resort only the most populated bins
+are kept. The points are computed once per dataset version and budget.
+"""
+
+from utils.cache import load_cached
+from utils.data import dataset_paths, load_overview
+
+# Width of the salary buckets (dollars) and maximum number of points sent to the browser
+DEFAULT_SALARY_BUCKET = 5000
+DEFAULT_MAX_POINTS = 5000
+
+
+def bin_points(df, salary_bucket):
+    # One point per (YearsCodePro, salary bucket, Country) with its mean salary and size
+    bucket = (df['Salary'] // salary_bucket).rename('bucket')
+    points = df.groupby(['YearsCodePro', bucket, 'Country'], observed=True)['Salary'].agg(['mean', 'size'])
+    points = points.reset_index().drop(columns='bucket')
+    return points.rename(columns={'mean': 'Salary', 'size': 'count'})[['YearsCodePro', 'Salary', 'Country', 'count']]
+
+
+def aggregate_points(df, salary_bucket=DEFAULT_SALARY_BUCKET, max_points=DEFAULT_MAX_POINTS):
+    """Return at most `max_points` aggregated points of `df`."""
+    salary_range = df['Salary'].max() - df['Salary'].min()
+    points = bin_points(df, salary_bucket)
+    # Widen the buckets until the points fit in the budget
+    while len(points) > max_points and salary_bucket < salary_range:
+        salary_bucket *= 2
+        points = bin_points(df, salary_bucket)
+    if len(points) > max_points:
+        points = points.nlargest(max_points, 'count')
+    return points.reset_index(drop=True)
+
+
+def load_points(salary_bucket=DEFAULT_SALARY_BUCKET, max_points=DEFAULT_MAX_POINTS):
+    """Return the aggregated points of the overview dataset, cached per dataset version and budget."""
+    return load_cached(
+        ('points', salary_bucket, max_points),
+        dataset_paths('overview'),
+        lambda: aggregate_points(load_overview(), salary_bucket, max_points),
+    )
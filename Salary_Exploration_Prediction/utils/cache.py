@@ -0,0 +1,62 @@
+"""
+Process-wide cache of objects loaded from files.
+
+Every entry remembers the modification time and size of the files it was
+built from and is rebuilt on the next access after any of them changes (or
+appears or disappears). The cache is shared by all the sessions served by
+the process. An entry is loaded once however many sessions ask for it at the
+same time, and loading one entry does not hold up the others.
+"""
+
+import hashlib
+import os
+import threading
+
+# Cache: key -> (file signatures, value), and the lock held while loading each key.
+# _lock only guards the dicts. Loaders may load other keys (a derived structure
+# loads its dataset), always in the same direction, so the key locks cannot deadlock
+_entries = {}
+_key_locks = {}
+_lock = threading.Lock()
+
+
+def file_signature(path):
+    # Modification time and size identify a version of a file (None if missing)
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def load_cached(key, paths, loader):
+    """Return the value cached under `key`, calling `loader()` if any of `paths` changed."""
+    signatures = tuple(file_signature(path) for path in paths)
+    with _lock:
+        entry = _entries.get(key)
+        key_lock = _key_locks.setdefault(key, threading.RLock())
+    if entry is not None and entry[0] == signatures:
+        return entry[1]
+    with key_lock:
+        # Loaded by another session while this one waited?
+        with _lock:
+            entry = _entries.get(key)
+        if entry is None or entry[0] != signatures:
+            entry = (signatures, loader())
+            with _lock:
+                _entries[key] = entry
+    return entry[1]
+
+
+def clear():
+    with _lock:
+        _entries.clear()
+
+
+def file_hash(path):
+    # SHA-256 of a file, read in blocks
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
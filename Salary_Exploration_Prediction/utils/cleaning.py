@@ -0,0 +1,82 @@
+"""
+Cleaning rules of the survey, as in Salary_Exploration_Prediction.ipynb.
+
+Column selection, null removal, full-time filter, the country cut-off, the
+salary range filter and the experience and education cleaning, vectorized
+instead of the notebook's row-wise `.apply` calls. All of them work row by
+row except the country cut-off, which needs the number of registers of every
+country in the whole survey: utils/ingestion.py applies the row rules to
+every chunk of a file and the cut-off once the counts of all chunks are known.
+"""
+
+import numpy as np
+import pandas as pd
+
+# Columns of the survey used by the model
+SELECTED_COLUMNS = ['Country', 'EdLevel', 'YearsCodePro', 'Employment', 'ConvertedCompYearly']
+
+# Defaults of the notebook
+COUNTRY_CUTOFF = 250
+SALARY_RANGE = (10000, 250000)
+
+# Beginnings of the answers of the survey to the education question
+EDUCATION_ANSWERS = ('Bachelor’s degree', 'Master’s degree', 'Professional degree', 'Other doctoral degree',
+                     'Some college/university study', 'Secondary school', 'Associate degree',
+                     'Primary/elementary school', 'Something else')
+
+
+def clean_experience(years):
+    # Vectorized version of the notebook's clean_experience
+    years = years.astype(str).replace({'More than 50 years': '50', 'Less than 1 year': '0.5'})
+    return years.astype(float)
+
+
+def clean_education(levels):
+    # Vectorized version of the notebook's clean_education
+    levels = levels.astype(str)
+    conditions = [
+        levels.str.contains('Bachelor’s degree', regex=False),
+        levels.str.contains('Master’s degree', regex=False),
+        levels.str.contains('Professional degree', regex=False) | levels.str.contains('Other doctoral', regex=False),
+    ]
+    choices = ['Bachelor’s degree', 'Master’s degree', 'Post grad']
+    return pd.Series(np.select(conditions, choices, default='Less than a Bachelors'), index=levels.index)
+
+
+def is_education_answer(levels):
+    # Whether every level is an answer of the survey, which clean_education knows how to map
+    return levels.astype(str).str.startswith(EDUCATION_ANSWERS)
+
+
+def valid_countries(country_counts, cutoff=COUNTRY_CUTOFF):
+    # Countries with at least `cutoff` registers keep their name
+    return country_counts[country_counts >= cutoff].index
+
+
+def group_countries(countries, cutoff=COUNTRY_CUTOFF):
+    # Countries with less than `cutoff` registers are moved to 'Other'
+    return countries.where(countries.isin(valid_countries(countries.value_counts(), cutoff)), 'Other')
+
+
+def select_full_time(df):
+    """Selected columns of the full-time respondents without nulls, with 'ConvertedCompYearly' as 'Salary'."""
+    df = df[SELECTED_COLUMNS].rename(columns={'ConvertedCompYearly': 'Salary'})
+    df = df.dropna()
+    df = df[df['Employment'] == 'Employed, full-time'].drop(columns=['Employment'])
+    return df.assign(Country=df['Country'].astype(str))
+
+
+def clean_rows(df, salary_range=SALARY_RANGE):
+    """Salary range filter and experience and education cleaning of the output of select_full_time()."""
+    df = df[(df['Salary'] >= salary_range[0]) & (df['Salary'] <= salary_range[1])]
+    return df.assign(
+        YearsCodePro=clean_experience(df['YearsCodePro']),
+        EdLevel=clean_education(df['EdLevel']),
+    )
+
+
+def clean_survey(df, cutoff=COUNTRY_CUTOFF, salary_range=SALARY_RANGE):
+    """Apply the notebook's data wrangling and return the dataset with decoded categories."""
+    df = select_full_time(df)
+    df = df.assign(Country=group_countries(df['Country'], cutoff))
+    return clean_rows(df, salary_range).reset_index(drop=True)
@@ -0,0 +1,55 @@
+"""
+Per-country summary of the raw survey.
+
+The Maps section only needs, for every country, the number of respondents
+with a salary below 250k and their average salary, and the prediction page
+only needs the list of countries. The summary is computed from the survey
+once per version of it and persisted next to the data as
+Data/country_summary.feather (tagged like the snapshots with the signature of
+survey_results_public.csv), so the pages never read the raw survey at request
+time.
+"""
+
+from utils import snapshot
+from utils.cache import load_cached
+from utils.data import dataset_paths, data_path, load_survey
+
+SUMMARY_PATH = data_path('country_summary.feather')
+
+# Salaries from this value on are left out of the averages of the maps
+MAX_SALARY = 250000
+
+
+def summarize_countries(survey):
+    """Return Country, respondents, count (salary below MAX_SALARY) and average_salary per country."""
+    survey = survey.dropna(subset=['Country'])
+    in_range = survey[survey['Salary'] < MAX_SALARY].groupby('Country', observed=True)['Salary']
+    # Countries in order of first appearance in the survey
+    summary = survey.groupby('Country', observed=True, sort=False).size().to_frame('respondents')
+    summary['count'] = in_range.size().reindex(summary.index, fill_value=0)
+    summary['average_salary'] = in_range.mean().astype('float64').reindex(summary.index)
+    summary.index = summary.index.astype(str)
+    return summary.rename_axis('Country').reset_index()
+
+
+def build_country_summary():
+    """Compute the summary from the survey and persist it next to the data."""
+    summary = summarize_countries(load_survey())
+    if snapshot.available():
+        snapshot.write_snapshot(summary, SUMMARY_PATH, dataset_paths('survey')[0])
+    return summary
+
+
+def _read_summary():
+    if snapshot.is_fresh(SUMMARY_PATH, dataset_paths('survey')[0]):
+        return snapshot.read_snapshot(SUMMARY_PATH)
+    try:
+        return build_country_summary()
+    except OSError:
+        # Read-only data folder: keep the summary in memory only
+        return summarize_countries(load_survey())
+
+
+def load_country_summary():
+    """Return the country summary of the current survey, computed at most once per version."""
+    return load_cached(('country_summary',), list(dataset_paths('survey')) + [SUMMARY_PATH], _read_summary)
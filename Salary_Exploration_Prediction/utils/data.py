@@ -0,0 +1,123 @@
+"""
+Shared data access for all the pages of the app.
+
+Streamlit reruns every page script on each widget interaction, so reading the
+CSV files at the top of the pages re-parses them on every click and for every
+session. The loaders below read each dataset once per process, keep only the
+columns the pages use (with compact, explicit dtypes) and reload a file only
+when its modification time changes. When a fresh columnar snapshot of a
+dataset exists (see utils/snapshot.py) it is memory-mapped instead of parsing
+the CSV. Pages receive shallow copies of the cached frames, so adding or
+replacing columns in a page never touches the shared data.
+
+The data and model folders can be moved with the SALARY_APP_DATA_DIR and
+SALARY_APP_MODELS_DIR environment variables (the benchmarks use them to run
+the pages against synthetic data); they are read once, at import time.
+"""
+
+import os
+
+import pandas as pd
+
+from utils import cache, snapshot
+
+# Folder of the app (parent of this package) and its data and model folders
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = os.path.abspath(os.environ.get('SALARY_APP_DATA_DIR') or os.path.join(APP_DIR, 'Data'))
+MODELS_DIR = os.path.abspath(os.environ.get('SALARY_APP_MODELS_DIR') or os.path.join(APP_DIR, 'Models'))
+
+# For each dataset: the columns stored in its snapshot with their dtypes, the
+# subset of them the pages load and the renames applied after loading
+DATASETS = {
+    'survey': {
+        'file': 'survey_results_public.csv',
+        'dtype': {
+            'Country': 'category',
+            'EdLevel': 'category',
+            'YearsCodePro': 'category',
+            'Employment': 'category',
+            'ConvertedCompYearly': 'float32',
+        },
+        'load': ['Country', 'ConvertedCompYearly'],
+        'rename': {'ConvertedCompYearly': 'Salary'},
+    },
+    'overview': {
+        'file': 'dataset_overview.csv',
+        'dtype': {'Country': 'category', 'EdLevel': 'category', 'YearsCodePro': 'float32', 'Salary': 'float32'},
+        'load': ['Country', 'EdLevel', 'YearsCodePro', 'Salary'],
+        'rename': {},
+    },
+    'model': {
+        'file': 'dataset_model.csv',
+        'dtype': {'Country': 'int16', 'EdLevel': 'int16', 'YearsCodePro': 'float32', 'Salary': 'float32'},
+        'load': ['Country', 'EdLevel', 'YearsCodePro', 'Salary'],
+        'rename': {},
+    },
+}
+
+def data_path(filename):
+    return os.path.join(DATA_DIR, filename)
+
+
+def dataset_paths(name):
+    # CSV file of the dataset and its snapshot
+    csv_path = data_path(DATASETS[name]['file'])
+    return csv_path, snapshot.snapshot_path(csv_path)
+
+
+def read_csv(name, columns=None):
+    """Parse the CSV of the dataset `name` with its explicit dtypes."""
+    spec = DATASETS[name]
+    columns = columns or list(spec['dtype'])
+    dtype = {column: spec['dtype'][column] for column in columns}
+    return pd.read_csv(dataset_paths(name)[0], usecols=columns, dtype=dtype)[columns]
+
+
+def _read(name):
+    spec = DATASETS[name]
+    csv_path, snapshot_file = dataset_paths(name)
+    if snapshot.is_fresh(snapshot_file, csv_path):
+        df = snapshot.read_snapshot(snapshot_file, columns=spec['load'])
+    else:
+        df = read_csv(name, spec['load'])
+    return df.rename(columns=spec['rename'])
+
+
+def load_dataset(name):
+    """Return a read-only view of the dataset `name`, loading it only if its CSV or snapshot changed."""
+    df = cache.load_cached(('dataset', name), dataset_paths(name), lambda: _read(name))
+    # A shallow copy: with pandas' Copy-on-Write (always on from pandas 3), an
+    # in-place change made by a page copies the data instead of reaching the cache
+    return df.copy(deep=False)
+
+
+def dataset_version(name):
+    """Return the signatures of the files of the dataset `name`, which change with its content."""
+    return tuple(cache.file_signature(path) for path in dataset_paths(name))
+
+
+def load_survey():
+    # Raw survey with 'ConvertedCompYearly' renamed to 'Salary'
+    return load_dataset('survey')
+
+
+def load_overview():
+    # Cleaned dataset with decoded Country and EdLevel
+    return load_dataset('overview')
+
+
+def load_model_data():
+    # Cleaned dataset with label-encoded Country and EdLevel
+    return load_dataset('model')
+
+
+def build_snapshots(names=None):
+    """Write the columnar snapshot of each dataset from its CSV and return their paths."""
+    written = []
+    for name in names or DATASETS:
+        csv_path, snapshot_file = dataset_paths(name)
+        if not os.path.exists(csv_path):
+            continue
+        snapshot.write_snapshot(read_csv(name), snapshot_file, csv_path)
+        written.append(snapshot_file)
+    return written
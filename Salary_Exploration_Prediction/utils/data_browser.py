@@ -0,0 +1,144 @@
+"""
+Paginated browsing of the overview dataset for the 'Data overview' section.
+
+st.dataframe(decoded_df) sends the whole dataset to the browser, which with
+several years of survey is the largest message of the app and holds up the
+websocket for the other widgets. The browser instead answers one page at a
+time: the rows are filtered (categorical columns through their category codes,
+see utils/filtering.py, numeric columns by range) and ordered on the server,
+and only the rows of the requested page are sent.
+
+Ordering uses the sort index of each column and direction (the row positions
+in sorted order, like sort_values: ties in row order, missing values last),
+computed once per dataset version the first time the column is sorted. Filtering keeps the rows of a sort index whose mask is set, which
+preserves their order, so sorting a selection costs a gather instead of a
+sort. The ordered rows of the last selections are kept, so paging through a
+selection only slices them.
+
+describe() of the dataset is also computed once per dataset version.
+"""
+
+import math
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from utils.cache import load_cached
+from utils.data import dataset_paths, load_overview
+from utils.filtering import load_filter_index
+
+PAGE_SIZES = [50, 100, 500, 1000]
+
+# Ordered rows of recent selections kept per browser
+MAX_CACHED_ORDERS = 16
+
+
+class DataBrowser:
+    """Sorted, filtered pages of a frame with categorical and numeric columns."""
+
+    def __init__(self, filter_index):
+        self.filter_index = filter_index
+        self.df = filter_index.df
+        self._bounds = {name: (float(self.df[name].min()), float(self.df[name].max())) for name in self.numeric_columns}
+        self._sort_indexes = {}
+        self._orders = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def categorical_columns(self):
+        return list(self.filter_index.indexes)
+
+    @property
+    def numeric_columns(self):
+        return [name for name in self.df.columns if pd.api.types.is_numeric_dtype(self.df[name])]
+
+    def options(self, column):
+        """Values a categorical column can be filtered on."""
+        return self.df[column].cat.categories.tolist()
+
+    def bounds(self, column):
+        """Smallest and largest value of a numeric column."""
+        return self._bounds[column]
+
+    def sort_index(self, column, ascending=True):
+        """Row positions in the order of `column` (ties in row order, missing values last)."""
+        with self._lock:
+            index = self._sort_indexes.get((column, ascending))
+        if index is None:
+            values = self.df[column]
+            if isinstance(values.dtype, pd.CategoricalDtype):
+                # The categories are sorted, so their codes sort like the values
+                codes = values.cat.codes.to_numpy()
+                values, missing = codes.astype('int64'), codes < 0
+            else:
+                values, missing = values.to_numpy(dtype='float64'), values.isna().to_numpy()
+            positions = np.flatnonzero(~missing)
+            values = values[positions]
+            # Descending: the stable order of the negated values keeps the ties in row order
+            index = positions[np.argsort(values if ascending else -values, kind='stable')]
+            index = np.concatenate([index, np.flatnonzero(missing)])
+            with self._lock:
+                self._sort_indexes[(column, ascending)] = index
+        return index
+
+    def mask(self, categories=None, ranges=None):
+        """Rows matching `categories` ({column: values}) and `ranges` ({column: (low, high)}), or None for all."""
+        mask = self.filter_index.mask(**(categories or {}))
+        for column, (low, high) in (ranges or {}).items():
+            values = self.df[column].to_numpy()
+            low_limit, high_limit = self.bounds(column)
+            if low <= low_limit and high >= high_limit:
+                continue
+            in_range = (values >= low) & (values <= high)
+            mask = in_range if mask is None else mask & in_range
+        return mask
+
+    def order(self, sort_by=None, ascending=True, categories=None, ranges=None):
+        """Positions of the selected rows in display order."""
+        key = (
+            sort_by,
+            ascending,
+            tuple(sorted((column, tuple(sorted(values))) for column, values in (categories or {}).items())),
+            tuple(sorted((column, tuple(limits)) for column, limits in (ranges or {}).items())),
+        )
+        with self._lock:
+            order = self._orders.get(key)
+            if order is not None:
+                self._orders.move_to_end(key)
+                return order
+        mask = self.mask(categories, ranges)
+        if sort_by is None:
+            order = np.arange(len(self.df)) if mask is None else np.flatnonzero(mask)
+            if not ascending:
+                order = order[::-1]
+        else:
+            order = self.sort_index(sort_by, ascending)
+            if mask is not None:
+                order = order[mask[order]]
+        with self._lock:
+            self._orders[key] = order
+            while len(self._orders) > MAX_CACHED_ORDERS:
+                self._orders.popitem(last=False)
+        return order
+
+    def page(self, page=0, page_size=PAGE_SIZES[0], sort_by=None, ascending=True, categories=None, ranges=None):
+        """Rows of page `page` (from 0) of the selection and the number of selected rows."""
+        order = self.order(sort_by, ascending, categories, ranges)
+        rows = order[page * page_size:(page + 1) * page_size]
+        return self.df.take(rows), len(order)
+
+
+def page_count(rows, page_size):
+    return max(1, math.ceil(rows / page_size))
+
+
+def load_data_browser():
+    """Return the browser of the overview dataset, built once per version of it."""
+    return load_cached(('data_browser',), dataset_paths('overview'), lambda: DataBrowser(load_filter_index()))
+
+
+def load_summary():
+    """Return describe() of the overview dataset, computed once per version of it."""
+    return load_cached(('overview_summary',), dataset_paths('overview'), lambda: load_overview().describe())
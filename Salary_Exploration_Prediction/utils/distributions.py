@@ -0,0 +1,140 @@
+"""
+Histogram bins and box-plot statistics of the salaries, computed on the server.
+
+px.histogram and px.box embed every salary of the selection in the figure
+JSON and leave the binning and the quantiles to the browser, so the payload
+grows with the number of respondents (megabytes for the box plots). Here the
+bins and the box statistics are computed with NumPy and the figures are drawn
+from them, which costs a few kilobytes whatever the size of the dataset.
+
+The box statistics of all the groups of a categorical column are computed at
+once: the salaries are sorted by (category code, salary), so every group is a
+sorted slice of one array and its quartiles, notches and whiskers are read at
+computed positions for all the groups together. Like Plotly, the whiskers end
+at the most extreme salaries within 1.5 IQR of the quartiles and the notches
+span 1.57 IQR / sqrt(n) around the median; of the salaries beyond the
+whiskers, at most MAX_OUTLIERS evenly spaced ones (always including the
+extremes) are drawn per group.
+
+The summaries are computed when a figure is built, that is once per filter
+state and dataset version (see utils/figure_cache.py).
+"""
+
+import math
+
+import numpy as np
+import pandas as pd
+
+# Outliers drawn per group
+MAX_OUTLIERS = 200
+
+WHISKER_IQR = 1.5
+NOTCH_IQR = 1.57
+
+
+def bin_width(span, nbins):
+    # Smallest width of the form 1, 2 or 5 x 10^k giving at most `nbins` bins over `span`, like Plotly's
+    if span <= 0:
+        return 1.0
+    magnitude = 10 ** math.floor(math.log10(span / nbins))
+    for step in (1, 2, 5, 10):
+        if step * magnitude >= span / nbins:
+            return float(step * magnitude)
+
+
+def histogram_bins(salary, nbins=50):
+    """Left edge, right edge and count of about `nbins` bins of the salaries, aligned on the bin width."""
+    salary = np.asarray(salary, dtype='float64')
+    if not len(salary):
+        return pd.DataFrame({'left': [], 'right': [], 'count': []})
+    low, high = salary.min(), salary.max()
+    width = bin_width(high - low, nbins)
+    first = math.floor(low / width)
+    counts = np.bincount((np.floor(salary / width) - first).astype('int64'))
+    left = (first + np.arange(len(counts))) * width
+    return pd.DataFrame({'left': left, 'right': left + width, 'count': counts})
+
+
+def box_statistics(groups, salary, max_outliers=MAX_OUTLIERS):
+    """
+    Box statistics of the salaries per category of `groups` (a categorical Series).
+
+    Returns a frame indexed by the categories with respondents, with count,
+    q1, median, q3, lowerfence, upperfence and notchspan, and a dictionary of
+    the outliers drawn for every category.
+    """
+    codes = groups.cat.codes.to_numpy(dtype='int64')
+    salary = np.asarray(salary, dtype='float64')
+    order = np.lexsort((salary, codes))
+    codes, salary = codes[order], salary[order]
+
+    # Group g is salary[start[g]:end[g]], sorted
+    bounds = np.searchsorted(codes, np.arange(len(groups.cat.categories) + 1))
+    present = np.flatnonzero(np.diff(bounds))
+    start, end = bounds[present], bounds[present + 1]
+    count = end - start
+
+    def quantile(q):
+        # Linear interpolation between the closest ranks, like pandas and numpy
+        position = start + q * (count - 1)
+        below = np.floor(position).astype('int64')
+        above = np.minimum(below + 1, end - 1)
+        return salary[below] + (salary[above] - salary[below]) * (position - below)
+
+    q1, median, q3 = quantile(0.25), quantile(0.5), quantile(0.75)
+    iqr = q3 - q1
+
+    # Search the fences in all the groups at once: keys are increasing over the
+    # whole array because every group is shifted above the previous one
+    if len(salary):
+        low, span = salary.min(), salary.max() - salary.min() + 1
+        keys = codes * span + (salary - low)
+        lower = np.searchsorted(keys, present * span + (q1 - WHISKER_IQR * iqr - low), side='left')
+        upper = np.searchsorted(keys, present * span + (q3 + WHISKER_IQR * iqr - low), side='right') - 1
+        lower, upper = np.clip(lower, start, end - 1), np.clip(upper, start, end - 1)
+    else:
+        lower = upper = start
+
+    categories = groups.cat.categories[present]
+    table = pd.DataFrame({
+        'count': count,
+        'q1': q1,
+        'median': median,
+        'q3': q3,
+        'lowerfence': salary[lower] if len(salary) else q1,
+        'upperfence': salary[upper] if len(salary) else q3,
+        'notchspan': NOTCH_IQR * iqr / np.sqrt(count),
+    }, index=categories)
+
+    outliers = {}
+    for category, first, last, below, above in zip(categories, start, end, lower, upper):
+        positions = np.concatenate([np.arange(first, below), np.arange(above + 1, last)])
+        if len(positions) > max_outliers:
+            positions = positions[np.linspace(0, len(positions) - 1, max_outliers).round().astype('int64')]
+        outliers[category] = salary[positions]
+    return table, outliers
+
+
+def box_figure(table, outliers, names, x_label, title, template='plotly_dark'):
+    """Notched box plot of the statistics of box_statistics() for the categories `names`, one color each."""
+    import plotly.graph_objects as go
+    import plotly.io as pio
+
+    colors = pio.templates[template].layout.colorway
+    fig = go.Figure()
+    for i, name in enumerate(name for name in names if name in table.index):
+        row = table.loc[name]
+        color = colors[i % len(colors)]
+        fig.add_trace(go.Box(
+            x=[name], q1=[row['q1']], median=[row['median']], q3=[row['q3']],
+            lowerfence=[row['lowerfence']], upperfence=[row['upperfence']], notchspan=[row['notchspan']],
+            notched=True, name=name, legendgroup=name, marker_color=color,
+        ))
+        if len(outliers[name]):
+            fig.add_trace(go.Scatter(
+                x=[name] * len(outliers[name]), y=outliers[name], mode='markers',
+                name=name, legendgroup=name, showlegend=False, marker_color=color,
+            ))
+    fig.update_layout(title=title, xaxis_title=x_label, yaxis_title='Salary', legend_title_text=x_label,
+                      boxmode='overlay', template=template)
+    return fig
@@ -0,0 +1,176 @@
+"""
+Benchmark of the candidate model engines and latency-aware model selection.
+
+The notebook compares a linear regression with a random forest on the test
+MSE and keeps the GridSearchCV winner, whatever its size and prediction cost.
+Here every engine of ENGINES is trained on the notebook's split (see
+utils/training.py) and measured on what the app pays for it too:
+
+- rmse and r2 on the test set;
+- fit_seconds;
+- size_mb: size of its pickle, which the app and every server worker load;
+- load_ms: time to unpickle it;
+- single_row_ms: median latency of predicting one row, like one click of the
+  page or one request of the prediction server;
+- batch_ms: median latency of predicting BATCH_ROWS rows, like a chunk of a
+  roster (see utils/scoring.py).
+
+select_engine() then picks the engine with the lowest RMSE among those
+within the budget (BUDGET, the largest accepted single_row_ms, batch_ms and
+size_mb). If none fits the budget, it picks the engine with the lowest
+RMSE overall and marks the selection as over budget. The training step
+(utils/training.py) runs this selection and writes the whole trade-off
+table next to the model it exports (engines.json). To only compare the
+engines on the cleaned dataset of the app, from the app folder:
+
+    python -m utils.engines --output engines.json
+"""
+
+import argparse
+import json
+import pickle
+import time
+
+import numpy as np
+import pandas as pd
+
+from utils.training import FEATURES, PARAM_GRID, RANDOM_STATE, evaluate, fit_model, split
+
+ENGINES = {
+    'random_forest': 'RandomForestRegressor, GridSearchCV winner over PARAM_GRID (the notebook model)',
+    'random_forest_small': 'RandomForestRegressor, 50 trees of depth 8',
+    'random_forest_leaf': 'RandomForestRegressor, 100 unlimited trees with 20 answers per leaf',
+    'hist_gradient_boosting': 'HistGradientBoostingRegressor, categorical country and education',
+    'piecewise_linear': 'PiecewiseLinearTable, one experience curve per country and education (utils/piecewise.py)',
+}
+
+# Largest accepted prediction latencies (ms) and pickle size (MB)
+BUDGET = {'single_row_ms': 50.0, 'batch_ms': 1000.0, 'size_mb': 100.0}
+
+# Rows of the batch latency and number of timed predictions
+BATCH_ROWS = 10000
+SINGLE_ROW_REPEAT = 50
+BATCH_REPEAT = 5
+
+TABLE_FILE = 'engines.json'
+
+
+def fit_engine(name, X_train, y_train, param_grid=PARAM_GRID, cv=5, n_jobs=-1):
+    """Train the engine `name` and return it with its parameters."""
+    from sklearn.ensemble import HistGradientBoostingRegressor, RandomForestRegressor
+
+    from utils.piecewise import PiecewiseLinearTable
+
+    if name == 'random_forest':
+        gs = fit_model(X_train, y_train, param_grid, cv, n_jobs)
+        return gs.best_estimator_, gs.best_params_
+    if name == 'random_forest_small':
+        model = RandomForestRegressor(n_estimators=50, max_depth=8, random_state=RANDOM_STATE, n_jobs=n_jobs)
+        params = {'n_estimators': 50, 'max_depth': 8}
+    elif name == 'random_forest_leaf':
+        model = RandomForestRegressor(n_estimators=100, min_samples_leaf=20, random_state=RANDOM_STATE,
+                                      n_jobs=n_jobs)
+        params = {'n_estimators': 100, 'min_samples_leaf': 20}
+    elif name == 'hist_gradient_boosting':
+        model = HistGradientBoostingRegressor(categorical_features=[True, True, False], random_state=RANDOM_STATE)
+        params = {'categorical_features': ['Country', 'EdLevel']}
+    elif name == 'piecewise_linear':
+        model = PiecewiseLinearTable()
+        params = {'knots': model.knots, 'smoothing': model.smoothing, 'shrinkage': model.shrinkage}
+    else:
+        raise ValueError(f'Unknown engine {name!r} (one of {", ".join(ENGINES)})')
+    model.fit(X_train, y_train)
+    # The fitted forests predict on a single thread, like in the app
+    if hasattr(model, 'n_jobs'):
+        model.n_jobs = None
+    return model, params
+
+
+def _median_ms(call, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        call()
+        times.append(time.perf_counter() - start)
+    return float(np.median(times)) * 1000
+
+
+def measure(model, X_test, y_test, seed=0):
+    """Test metrics, pickle size and load and prediction latencies of a fitted model."""
+    rng = np.random.default_rng(seed)
+    single = X_test.iloc[[0]]
+    batch = X_test.iloc[rng.integers(0, len(X_test), BATCH_ROWS)]
+    payload = pickle.dumps(model)
+    return {
+        **evaluate(model, X_test, y_test),
+        'size_mb': len(payload) / 2 ** 20,
+        'load_ms': _median_ms(lambda: pickle.loads(payload), 3),
+        'single_row_ms': _median_ms(lambda: model.predict(single), SINGLE_ROW_REPEAT),
+        'batch_ms': _median_ms(lambda: model.predict(batch), BATCH_REPEAT),
+    }
+
+
+def benchmark(X_train, X_test, y_train, y_test, engines=None, param_grid=PARAM_GRID, cv=5, n_jobs=-1, log=print):
+    """Train and measure every engine; return the fitted models and the trade-off table (one dict per engine)."""
+    models = {}
+    table = []
+    for name in engines or ENGINES:
+        start = time.perf_counter()
+        model, params = fit_engine(name, X_train, y_train, param_grid, cv, n_jobs)
+        fit_seconds = time.perf_counter() - start
+        row = {'engine': name, 'params': params, 'fit_seconds': fit_seconds, **measure(model, X_test, y_test)}
+        models[name] = model
+        table.append(row)
+        log(f'{name:<24} RMSE ${row["rmse"]:>10,.2f}  {row["size_mb"]:>8.2f} MB  '
+            f'{row["single_row_ms"]:>7.2f} ms/row  {row["batch_ms"]:>8.1f} ms/{BATCH_ROWS} rows')
+    return models, table
+
+
+def within_budget(row, budget=BUDGET):
+    return all(row[measure_name] <= limit for measure_name, limit in budget.items() if limit is not None)
+
+
+def select_engine(table, budget=BUDGET):
+    """Name of the engine with the lowest RMSE within `budget` (or overall) and whether it is within budget."""
+    candidates = [row for row in table if within_budget(row, budget)]
+    best = min(candidates or table, key=lambda row: row['rmse'])
+    return best['engine'], bool(candidates)
+
+
+def trade_offs(table, selected, budget=BUDGET):
+    """The trade-off table as written next to the exported model."""
+    return {
+        'selected': selected,
+        'budget': budget,
+        'batch_rows': BATCH_ROWS,
+        'engines': [{**row, 'within_budget': within_budget(row, budget)} for row in table],
+    }
+
+
+def main(argv=None):
+    from utils.data import data_path
+
+    parser = argparse.ArgumentParser(description='Train and compare the candidate model engines.')
+    parser.add_argument('--dataset', default=data_path('dataset_model.csv'), help='Cleaned, label-encoded dataset')
+    parser.add_argument('--engines', nargs='*', choices=list(ENGINES), help='Engines to compare (all by default)')
+    parser.add_argument('--max-single-row-ms', type=float, default=BUDGET['single_row_ms'])
+    parser.add_argument('--max-batch-ms', type=float, default=BUDGET['batch_ms'],
+                        help=f'Largest accepted latency of a {BATCH_ROWS}-row batch')
+    parser.add_argument('--max-size-mb', type=float, default=BUDGET['size_mb'])
+    parser.add_argument('--cv', type=int, default=5, help='Cross-validation folds of the random forest grid search')
+    parser.add_argument('--n-jobs', type=int, default=-1, help='Parallel jobs of the training')
+    parser.add_argument('--output', help='Write the trade-off table to this JSON file')
+    args = parser.parse_args(argv)
+
+    model_df = pd.read_csv(args.dataset, usecols=FEATURES + ['Salary'])
+    budget = {'single_row_ms': args.max_single_row_ms, 'batch_ms': args.max_batch_ms, 'size_mb': args.max_size_mb}
+    _, table = benchmark(*split(model_df), engines=args.engines, cv=args.cv, n_jobs=args.n_jobs)
+    selected, fits = select_engine(table, budget)
+    print(f'Selected: {selected}' + ('' if fits else ' (no engine within the budget)'))
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(trade_offs(table, selected, budget), file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+"""
+Cache of rendered figures shared by all the sessions of the process.
+
+Most sections of the pages draw the same figure for everyone, so building it
+again on every rerun is wasted work. Figures are cached under a key made of
+the section, the normalized filter selection and the version of the datasets
+they are drawn from: Plotly figures as the figure objects themselves
+(st.plotly_chart only reads them, so a hit costs no parsing) and Matplotlib
+figures as PNG bytes. The cache is bounded by its total size in bytes (the
+size of the JSON of a Plotly figure) and evicts the least recently used
+figures first.
+"""
+
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from utils import plotting
+from utils.data import dataset_version
+from utils.profiling import phase
+
+# Total size of the cached figures
+MAX_CACHE_BYTES = 128 * 1024 * 1024
+
+
+class FigureCache:
+    """Size-bounded LRU mapping of keys to figures (with their size in bytes)."""
+
+    def __init__(self, max_bytes=MAX_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def put(self, key, value, size=None):
+        # `size` defaults to the length of `value` (str or bytes)
+        size = len(value) if size is None else size
+        with self._lock:
+            if key in self._entries:
+                self.size -= self._entries.pop(key)[1]
+            if size > self.max_bytes:
+                return
+            self._entries[key] = (value, size)
+            self.size += size
+            while self.size > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self.size -= evicted
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+
+_figures = FigureCache()
+
+
+def _normalize(value):
+    # Selections are compared regardless of numpy/pandas types. Sequences keep
+    # their order, which the figures follow (e.g. the boxes of the selected
+    # countries); only sets are sorted
+    if isinstance(value, dict):
+        return tuple(sorted((key, _normalize(item)) for key, item in value.items()))
+    if isinstance(value, (set, frozenset)):
+        return tuple(sorted(_normalize(item) for item in value))
+    if isinstance(value, (list, tuple, np.ndarray)) or hasattr(value, 'tolist'):
+        items = value.tolist() if hasattr(value, 'tolist') else list(value)
+        if isinstance(items, list):
+            return tuple(_normalize(item) for item in items)
+        return items
+    return value
+
+
+def figure_key(section, filters, datasets):
+    """Key of a figure: section, normalized filters and version of the datasets it uses."""
+    return section, _normalize(filters or {}), tuple(dataset_version(name) for name in datasets)
+
+
+def cached_plotly(section, filters, datasets, build):
+    """Return the figure built by `build()`, cached; callers must not modify it."""
+    key = ('plotly',) + figure_key(section, filters, datasets)
+    fig = _figures.get(key)
+    if fig is None:
+        with phase('figure'):
+            fig = build()
+        with phase('serialize'):
+            size = len(fig.to_json())
+        _figures.put(key, fig, size)
+    return fig
+
+
+def cached_pyplot(section, filters, datasets, build):
+    """Return the PNG bytes of the Matplotlib figure built by `build()` (see utils/plotting.py), cached."""
+    key = ('pyplot',) + figure_key(section, filters, datasets)
+    png = _figures.get(key)
+    if png is None:
+        with plotting.drawing():
+            with phase('figure'):
+                fig = build()
+            with phase('serialize'):
+                png = plotting.to_png(fig)
+        _figures.put(key, png)
+    return png
+
+
+def clear():
+    _figures.clear()
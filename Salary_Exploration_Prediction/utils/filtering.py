@@ -0,0 +1,114 @@
+"""
+Filtering of the overview dataset by the multiselect widgets.
+
+Country and EdLevel are categoricals, so a selection is translated once into
+the category codes it contains and the rows are matched on the integer codes
+(a lookup table indexed by code) instead of comparing strings row by row.
+Each row is also indexed by category: the rows of every category are
+contiguous in a precomputed ordering, so a selection covering few rows is
+gathered from those ranges without scanning the whole column. The masks of
+several columns are combined with `&`, and the masks of recent selections are
+kept so that changing one widget only recomputes its own column.
+
+Selecting every category (the default of the widgets) filters nothing: the
+dataset itself is returned, without building a mask or copying any rows.
+Other selections copy only the requested columns of the matching rows.
+"""
+
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from utils.cache import load_cached
+from utils.data import dataset_paths, load_overview
+
+# Masks of recent selections kept per index
+MAX_CACHED_MASKS = 32
+
+
+class CategoryIndex:
+    """Row positions of every category of a categorical column."""
+
+    def __init__(self, column):
+        self.categories = column.cat.categories
+        self.codes = column.cat.codes.to_numpy()
+        # Rows sorted by category: the rows of category i are order[bounds[i]:bounds[i + 1]]
+        self.order = np.argsort(self.codes, kind='stable')
+        self.bounds = np.searchsorted(self.codes[self.order], np.arange(len(self.categories) + 1))
+        self.present = np.flatnonzero(np.diff(self.bounds))
+        # Missing values (code -1) match no selection
+        self.has_missing = self.bounds[0] > 0
+
+    def codes_of(self, values):
+        codes = self.categories.get_indexer(list(values))
+        return np.unique(codes[codes >= 0])
+
+    def mask(self, codes):
+        """Boolean mask of the rows whose category is in `codes`."""
+        selected_rows = int((self.bounds[codes + 1] - self.bounds[codes]).sum())
+        mask = np.zeros(len(self.codes), dtype=bool)
+        if selected_rows * 8 < len(self.codes):
+            # Few rows: set them from their ranges of the ordering
+            for code in codes:
+                mask[self.order[self.bounds[code]:self.bounds[code + 1]]] = True
+        else:
+            # One more entry, for the code -1 of the missing values
+            lookup = np.zeros(len(self.categories) + 1, dtype=bool)
+            lookup[codes] = True
+            mask = lookup[self.codes]
+        return mask
+
+
+class FilterIndex:
+    """Category indexes of the categorical columns of a frame."""
+
+    def __init__(self, df):
+        self.df = df
+        self.indexes = {
+            name: CategoryIndex(column) for name, column in df.items() if isinstance(column.dtype, pd.CategoricalDtype)
+        }
+        self._masks = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _column_mask(self, name, values):
+        # None when the selection keeps every row
+        index = self.indexes[name]
+        codes = index.codes_of(values)
+        if not index.has_missing and np.isin(index.present, codes).all():
+            return None
+        key = (name, codes.tobytes())
+        with self._lock:
+            mask = self._masks.get(key)
+            if mask is not None:
+                self._masks.move_to_end(key)
+                return mask
+        mask = index.mask(codes)
+        with self._lock:
+            self._masks[key] = mask
+            while len(self._masks) > MAX_CACHED_MASKS:
+                self._masks.popitem(last=False)
+        return mask
+
+    def mask(self, **selections):
+        """Combined mask of the selections (column=values), or None if they keep every row."""
+        combined = None
+        for name, values in selections.items():
+            mask = self._column_mask(name, values)
+            if mask is not None:
+                combined = mask.copy() if combined is None else np.logical_and(combined, mask, out=combined)
+        return combined
+
+    def select(self, columns=None, **selections):
+        """Rows of the frame matching the selections, limited to `columns`."""
+        df = self.df if columns is None else self.df[columns]
+        mask = self.mask(**selections)
+        if mask is None:
+            return df
+        return df.take(np.flatnonzero(mask))
+
+
+def load_filter_index():
+    """Return the filter index of the overview dataset, built once per version of it."""
+    return load_cached(('filter_index',), dataset_paths('overview'), lambda: FilterIndex(load_overview()))
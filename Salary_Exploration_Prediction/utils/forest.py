@@ -0,0 +1,205 @@
+"""
+Compact, memory-mappable export of the random forest.
+
+saved_steps.pkl holds the whole fitted RandomForestRegressor, which has to be
+unpickled by every worker process. The export flattens all the trees into a
+few contiguous arrays (feature, threshold, left and right child and value of
+every node, with node indices global to the forest) and stores them with the
+label classes in an uncompressed Models/forest.npz. The members of an
+uncompressed .npz are plain .npy files, so they are memory-mapped straight
+from the archive and the OS shares the pages between worker processes.
+
+CompactForest predicts all rows through all trees at once with NumPy and
+reproduces sklearn's predictions up to float rounding. The same pass gives
+the prediction of every tree, from which the prediction intervals of the
+Salary Prediction page are taken (see utils/prediction.py). From the app folder:
+
+    python -m utils.forest export    # write Models/forest.npz
+    python -m utils.forest verify    # compare it with the pickled model
+"""
+
+import argparse
+import os
+import struct
+import zipfile
+
+import numpy as np
+import pandas as pd
+
+from utils.cache import load_cached
+from utils.prediction import FEATURES, MODEL_PATH, LabelCodes, load_steps, model_hash
+
+FOREST_PATH = os.path.join(os.path.dirname(MODEL_PATH), 'forest.npz')
+
+# Upper bound of (rows x trees) node indices held in memory while predicting
+MAX_CHUNK_NODES = 1 << 22
+
+# Largest difference with sklearn accepted by verify (in dollars)
+TOLERANCE = 1e-3
+
+
+class CompactForest:
+    """Random forest regressor evaluated from flattened node arrays."""
+
+    def __init__(self, arrays):
+        self.feature = arrays['feature']
+        self.threshold = arrays['threshold']
+        self.left = arrays['left']
+        self.right = arrays['right']
+        self.value = arrays['value']
+        self.roots = arrays['roots']
+        self.max_depth = int(arrays['max_depth'][0])
+        self.le_country = LabelCodes(arrays['countries'])
+        self.le_education = LabelCodes(arrays['education_levels'])
+
+    @property
+    def n_estimators(self):
+        return len(self.roots)
+
+    def _leaves(self, X):
+        # Leaf reached by every row in every tree, shape (rows, trees). Leaves
+        # point to themselves, so extra iterations leave the result unchanged.
+        nodes = np.broadcast_to(self.roots, (len(X), len(self.roots))).copy()
+        rows = np.arange(len(X))[:, None]
+        for _ in range(self.max_depth):
+            go_left = X[rows, self.feature[nodes]] <= self.threshold[nodes]
+            nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+        return nodes
+
+    def predict_trees(self, X):
+        """Return the prediction of every tree, shape (rows, trees)."""
+        X = self._validate(X)
+        chunk = max(1, MAX_CHUNK_NODES // len(self.roots))
+        chunks = [self.value[self._leaves(X[start:start + chunk])] for start in range(0, len(X), chunk)]
+        return np.concatenate(chunks) if chunks else np.empty((0, self.n_estimators))
+
+    def predict(self, X):
+        # Same interface as the regressor: the average of the trees
+        return self.predict_trees(X).mean(axis=1)
+
+    def predict_quantiles(self, X, quantiles):
+        """Return the mean and the `quantiles` of the tree predictions, shapes (rows,) and (rows, quantiles)."""
+        trees = self.predict_trees(X)
+        return trees.mean(axis=1), np.quantile(trees, quantiles, axis=1).T
+
+    def _validate(self, X):
+        # sklearn evaluates the trees on float32 features
+        if hasattr(X, 'columns'):
+            X = X[FEATURES].to_numpy()
+        return np.asarray(X, dtype=np.float32).reshape(-1, len(FEATURES))
+
+
+def flatten_forest(model, le_country, le_education):
+    """The node arrays of the trees of a fitted RandomForestRegressor, with the label classes."""
+    trees = [estimator.tree_ for estimator in model.estimators_]
+    offsets = np.cumsum([0] + [tree.node_count for tree in trees[:-1]])
+    feature, threshold, left, right, value = [], [], [], [], []
+    for tree, offset in zip(trees, offsets):
+        nodes = np.arange(tree.node_count) + offset
+        leaf = tree.children_left == -1
+        # Leaves point to themselves and test feature 0 against +inf
+        feature.append(np.where(leaf, 0, tree.feature))
+        threshold.append(np.where(leaf, np.inf, tree.threshold))
+        left.append(np.where(leaf, nodes, tree.children_left + offset))
+        right.append(np.where(leaf, nodes, tree.children_right + offset))
+        value.append(tree.value[:, 0, 0])
+
+    return dict(
+        feature=np.concatenate(feature).astype(np.int32),
+        threshold=np.concatenate(threshold),
+        left=np.concatenate(left).astype(np.int64),
+        right=np.concatenate(right).astype(np.int64),
+        value=np.concatenate(value),
+        roots=offsets.astype(np.int64),
+        max_depth=np.array([max(tree.max_depth for tree in trees)]),
+        countries=np.asarray(le_country.classes_).astype(str),
+        education_levels=np.asarray(le_education.classes_).astype(str),
+    )
+
+
+def export_forest(model, le_country, le_education, path=FOREST_PATH, model_sha256=''):
+    """Flatten the trees of a fitted RandomForestRegressor into `path`."""
+    np.savez(path, model_sha256=np.array([model_sha256]), **flatten_forest(model, le_country, le_education))
+    return path
+
+
+def memmap_npz(path):
+    """Memory-map every member of an uncompressed .npz archive."""
+    arrays = {}
+    with zipfile.ZipFile(path) as archive, open(path, 'rb') as file:
+        for info in archive.infolist():
+            if info.compress_type != zipfile.ZIP_STORED:
+                raise ValueError(f'{path} is compressed and cannot be memory-mapped')
+            # The data follows the local file header, its name and extra field
+            file.seek(info.header_offset + 26)
+            name_length, extra_length = struct.unpack('<HH', file.read(4))
+            file.seek(info.header_offset + 30 + name_length + extra_length)
+            version = np.lib.format.read_magic(file)
+            if version == (1, 0):
+                shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(file)
+            else:
+                shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(file)
+            arrays[os.path.splitext(info.filename)[0]] = np.memmap(
+                path, dtype=dtype, mode='r', offset=file.tell(), shape=shape,
+                order='F' if fortran_order else 'C')
+    return arrays
+
+
+def _read_forest(forest_path, model_path):
+    arrays = memmap_npz(forest_path)
+    # A forest exported from another model is ignored (the model file is optional)
+    if os.path.exists(model_path) and str(arrays['model_sha256'][0]) != model_hash(model_path):
+        return None
+    return CompactForest(arrays)
+
+
+def load_forest(forest_path=FOREST_PATH, model_path=MODEL_PATH):
+    """Return the CompactForest of the current model, or None if it is missing or stale."""
+    if not os.path.exists(forest_path):
+        return None
+    return load_cached(('forest', forest_path), [forest_path, model_path], lambda: _read_forest(forest_path, model_path))
+
+
+def export_saved_model(model_path=MODEL_PATH, forest_path=FOREST_PATH):
+    """Export the pickled model at `model_path` to `forest_path`."""
+    steps = load_steps(model_path)
+    return export_forest(steps['model'], steps['le_country'], steps['le_education'], forest_path,
+                         model_hash(model_path))
+
+
+def verify(model_path=MODEL_PATH, forest_path=FOREST_PATH, n_rows=100000, seed=0):
+    """Return the largest difference between the compact forest and the pickled model on random inputs."""
+    steps = load_steps(model_path)
+    forest = _read_forest(forest_path, model_path)
+    if forest is None:
+        raise ValueError(f'{forest_path} was not exported from {model_path}')
+    rng = np.random.default_rng(seed)
+    X = np.column_stack([
+        rng.integers(0, len(steps['le_country'].classes_), n_rows),
+        rng.integers(0, len(steps['le_education'].classes_), n_rows),
+        rng.choice(np.r_[0.5, np.arange(0, 91)], n_rows),
+    ])
+    expected = steps['model'].predict(pd.DataFrame(X, columns=FEATURES))
+    actual = forest.predict(X)
+    return float(np.max(np.abs(actual - expected)))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Export or verify the compact random forest.')
+    parser.add_argument('command', choices=['export', 'verify'])
+    parser.add_argument('--model', default=MODEL_PATH, help='Pickled model (saved_steps.pkl)')
+    parser.add_argument('--forest', default=FOREST_PATH, help='Compact forest (.npz)')
+    parser.add_argument('--rows', type=int, default=100000, help='Random rows compared by verify')
+    args = parser.parse_args(argv)
+
+    if args.command == 'export':
+        print(f'Compact forest written: {export_saved_model(args.model, args.forest)}')
+    else:
+        max_error = verify(args.model, args.forest, args.rows)
+        print(f'Maximum absolute difference over {args.rows} rows: {max_error:.6g}')
+        if max_error > TOLERANCE:
+            raise SystemExit('The compact forest does not reproduce the model predictions')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,214 @@
+"""
+Chunked ingestion of several years of the survey into a partitioned store.
+
+Each survey file is read `CHUNK_ROWS` rows at a time and only for the five
+columns the model uses. Every chunk goes through the row cleaning rules of
+utils/cleaning.py, is tagged with the survey year and appended to the store
+as one uncompressed Feather (Arrow IPC) file:
+
+    Data/survey_store/year=2023/part-00000.feather
+    Data/survey_store/manifest.json
+
+so the memory used by an ingestion depends on the chunk size, not on the size
+or the number of the files. The country cut-off needs the registers of every
+country over the whole data, so it is not applied while ingesting: the
+manifest keeps the count of full-time registers per country of every year and
+load_store() applies the cut-off over the years it reads. Ingesting a year
+again replaces its partition; an unchanged file is skipped. The year is
+given as YEAR=PATH or taken from the file name (e.g. survey_2022.csv). From
+the app folder:
+
+    python -m utils.ingestion 2023=Data/survey_results_public.csv Data/survey_2022.csv
+"""
+
+import argparse
+import json
+import os
+import re
+import shutil
+import time
+
+import pandas as pd
+
+from utils import snapshot
+from utils.cache import file_signature
+from utils.cleaning import COUNTRY_CUTOFF, SALARY_RANGE, SELECTED_COLUMNS, clean_rows, select_full_time, valid_countries
+from utils.data import DATA_DIR
+
+STORE_DIR = os.path.join(DATA_DIR, 'survey_store')
+MANIFEST = 'manifest.json'
+CHUNK_ROWS = 100000
+
+# Names and values used by older editions of the survey
+COLUMN_ALIASES = {'ConvertedComp': 'ConvertedCompYearly'}
+EMPLOYMENT_ALIASES = {'Employed full-time': 'Employed, full-time'}
+
+# Columns of the store
+STORE_DTYPES = {'Country': str, 'EdLevel': str, 'YearsCodePro': 'float32', 'Salary': 'float32', 'Year': 'int16'}
+
+
+def survey_year(path):
+    """Year of a survey file from its file name (e.g. survey_results_2022.csv)."""
+    # Only the name: the folders may hold any number (a user id, a date, ...)
+    years = re.findall(r'(?<!\d)(?:19|20)\d{2}(?!\d)', os.path.basename(path))
+    if not years:
+        raise ValueError(f'Cannot tell the survey year of {path}, pass it as YEAR={path}')
+    return int(years[-1])
+
+
+def read_chunks(path, chunk_rows=CHUNK_ROWS):
+    """Yield the selected columns of the survey at `path`, `chunk_rows` rows at a time."""
+    header = pd.read_csv(path, nrows=0).columns
+    columns = {alias: name for alias, name in COLUMN_ALIASES.items() if alias in header and name not in header}
+    missing = [name for name in SELECTED_COLUMNS if name not in header and name not in columns.values()]
+    if missing:
+        raise ValueError(f'{path} has no {", ".join(missing)} column')
+    usecols = [name for name in header if name in SELECTED_COLUMNS or name in columns]
+    dtype = {name: str for name in usecols}
+    dtype[next(name for name in usecols if columns.get(name, name) == 'ConvertedCompYearly')] = 'float64'
+    for chunk in pd.read_csv(path, usecols=usecols, dtype=dtype, chunksize=chunk_rows):
+        chunk = chunk.rename(columns=columns)
+        yield chunk.assign(Employment=chunk['Employment'].replace(EMPLOYMENT_ALIASES))
+
+
+def clean_chunk(chunk, year, salary_range=SALARY_RANGE):
+    """Clean a chunk of the survey; return the rows for the store and the full-time registers per country."""
+    df = select_full_time(chunk)
+    country_counts = df['Country'].value_counts()
+    df = clean_rows(df, salary_range).assign(Year=year)
+    return df[list(STORE_DTYPES)].astype(STORE_DTYPES).reset_index(drop=True), country_counts
+
+
+def read_manifest(store_dir=STORE_DIR):
+    try:
+        with open(os.path.join(store_dir, MANIFEST)) as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return {'years': {}}
+
+
+def _write_manifest(manifest, store_dir):
+    path = os.path.join(store_dir, MANIFEST)
+    with open(path + '.tmp', 'w') as file:
+        json.dump(manifest, file, indent=2)
+    os.replace(path + '.tmp', path)
+
+
+def partition_dir(year, store_dir=STORE_DIR):
+    return os.path.join(store_dir, f'year={year}')
+
+
+def ingest(path, year=None, store_dir=STORE_DIR, chunk_rows=CHUNK_ROWS, force=False, log=print):
+    """Append the survey at `path` to the store as the partition of `year`; return its manifest entry."""
+    if not snapshot.available():
+        raise RuntimeError('The survey store needs pyarrow')
+    year = year or survey_year(path)
+    manifest = read_manifest(store_dir)
+    source = '{}:{}'.format(*file_signature(path))
+    entry = manifest['years'].get(str(year))
+    if entry and entry['source_signature'] == source and not force:
+        log(f'{year}: {path} already ingested')
+        return entry
+
+    start = time.perf_counter()
+    # Written next to the partition and swapped in once complete
+    partial_dir = partition_dir(year, store_dir) + '.partial'
+    shutil.rmtree(partial_dir, ignore_errors=True)
+    os.makedirs(partial_dir)
+    rows_read = rows_kept = 0
+    country_counts = pd.Series(dtype='int64')
+    for index, chunk in enumerate(read_chunks(path, chunk_rows)):
+        rows, counts = clean_chunk(chunk, year)
+        rows_read += len(chunk)
+        rows_kept += len(rows)
+        country_counts = country_counts.add(counts, fill_value=0)
+        table = snapshot.pa.Table.from_pandas(rows, preserve_index=False)
+        snapshot.feather.write_feather(table, os.path.join(partial_dir, f'part-{index:05d}.feather'),
+                                       compression='uncompressed')
+
+    # The previous partition is renamed aside, replaced, then deleted: the year
+    # is never left half deleted, and a failed swap puts it back
+    final_dir = partition_dir(year, store_dir)
+    old_dir = final_dir + '.old'
+    shutil.rmtree(old_dir, ignore_errors=True)
+    if os.path.exists(final_dir):
+        os.replace(final_dir, old_dir)
+    try:
+        os.replace(partial_dir, final_dir)
+    except OSError:
+        if os.path.exists(old_dir):
+            os.replace(old_dir, final_dir)
+        raise
+    shutil.rmtree(old_dir, ignore_errors=True)
+    entry = {
+        'source': os.path.abspath(path),
+        'source_signature': source,
+        'rows_read': rows_read,
+        'rows': rows_kept,
+        'country_counts': {country: int(count) for country, count in country_counts.items()},
+        'ingested': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+    manifest['years'][str(year)] = entry
+    _write_manifest(manifest, store_dir)
+    log(f'{year}: {rows_kept} of {rows_read} rows of {path} ingested in {time.perf_counter() - start:.1f} s')
+    return entry
+
+
+def store_years(store_dir=STORE_DIR):
+    return sorted(int(year) for year in read_manifest(store_dir)['years'])
+
+
+def iter_store(years=None, columns=None, store_dir=STORE_DIR):
+    """Yield the parts of the store (countries before the cut-off), one Feather file at a time."""
+    for year in years or store_years(store_dir):
+        folder = partition_dir(year, store_dir)
+        for name in sorted(os.listdir(folder)):
+            if name.endswith('.feather'):
+                yield snapshot.read_snapshot(os.path.join(folder, name), columns=columns)
+
+
+def country_counts(years=None, store_dir=STORE_DIR):
+    """Full-time registers per country over `years`, the counts the cut-off is applied to."""
+    entries = read_manifest(store_dir)['years']
+    counts = pd.Series(dtype='int64')
+    for year in years or store_years(store_dir):
+        counts = counts.add(pd.Series(entries[str(year)]['country_counts'], dtype='int64'), fill_value=0)
+    return counts.astype('int64')
+
+
+def load_store(years=None, cutoff=COUNTRY_CUTOFF, store_dir=STORE_DIR):
+    """Return the cleaned rows of `years` with the country cut-off applied over them."""
+    parts = list(iter_store(years, store_dir=store_dir))
+    if not parts:
+        return pd.DataFrame({column: pd.Series(dtype=dtype) for column, dtype in STORE_DTYPES.items()})
+    df = pd.concat(parts, ignore_index=True)
+    countries = valid_countries(country_counts(years, store_dir), cutoff)
+    return df.assign(
+        Country=df['Country'].where(df['Country'].isin(countries), 'Other').astype('category'),
+        EdLevel=df['EdLevel'].astype('category'),
+    )
+
+
+def _survey_argument(text):
+    # YEAR=PATH or PATH (year taken from the file name)
+    year, separator, path = text.partition('=')
+    if separator and year.isdigit():
+        return int(year), path
+    return None, text
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Ingest survey files into the partitioned survey store.')
+    parser.add_argument('surveys', nargs='+', type=_survey_argument, metavar='[YEAR=]PATH',
+                        help='Survey CSV files (the year is taken from the file name when not given)')
+    parser.add_argument('--store', default=STORE_DIR, help='Folder of the store')
+    parser.add_argument('--chunk-rows', type=int, default=CHUNK_ROWS, help='Rows read at a time')
+    parser.add_argument('--force', action='store_true', help='Ingest files again even if unchanged')
+    args = parser.parse_args(argv)
+    for year, path in args.surveys:
+        ingest(path, year, args.store, args.chunk_rows, args.force)
+    print(f'Store {args.store}: years {", ".join(map(str, store_years(args.store)))}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+"""
+Precomputed prediction table for the whole input space of the model.
+
+The model only takes a country and an education level (label codes) and a
+whole number of years of experience, so every possible prediction fits in a
+small array indexed by (country_code, edlevel_code, years). The table is
+stored in Models/prediction_lookup.npz together with the label classes and the
+hash of the saved_steps.pkl it was computed from. When it matches the current
+model, the Salary Prediction page answers predictions and projections with
+array lookups and never unpickles the forest.
+
+Build it from the app folder after training:
+
+    python -m utils.lookup
+"""
+
+import os
+
+import numpy as np
+
+from utils.cache import load_cached
+from utils.prediction import (MAX_HORIZON, MODEL_PATH, LabelCodes, feature_matrix, load_full_model, load_steps,
+                              model_hash)
+
+LOOKUP_PATH = os.path.join(os.path.dirname(MODEL_PATH), 'prediction_lookup.npz')
+
+# Range of the experience slider; the table also covers the projection horizon
+MAX_EXPERIENCE = 50
+MAX_YEARS = MAX_EXPERIENCE + MAX_HORIZON
+
+
+class PredictionTable:
+    """Salary predictions for every (country, education, years) combination."""
+
+    def __init__(self, table, countries, education_levels):
+        self.table = table
+        self.le_country = LabelCodes(countries)
+        self.le_education = LabelCodes(education_levels)
+
+    def predict(self, X):
+        # Same interface as the regressor, for feature matrices with whole years
+        years = np.asarray(X['YearsCodePro'], dtype=float)
+        if np.any(years % 1 != 0) or np.any(years < 0) or np.any(years >= self.table.shape[2]):
+            raise ValueError(f'Years of experience must be whole numbers between 0 and {self.table.shape[2] - 1}')
+        # The feature matrices of the server hold float codes
+        country = np.asarray(X['Country']).astype(np.intp)
+        education = np.asarray(X['EdLevel']).astype(np.intp)
+        return self.table[country, education, years.astype(np.intp)]
+
+
+class TableFirstRegressor:
+    """The rows covered by a PredictionTable read from it, the other rows predicted by the full model."""
+
+    def __init__(self, lookup, load_model=load_full_model):
+        self.lookup = lookup
+        self.le_country = lookup.le_country
+        self.le_education = lookup.le_education
+        # Loaded with the first row the table cannot answer
+        self._load_model = load_model
+        self._model = None
+
+    def covered(self, years):
+        return (years % 1 == 0) & (years >= 0) & (years < self.lookup.table.shape[2])
+
+    def predict(self, X):
+        years = np.asarray(X['YearsCodePro'], dtype=float)
+        covered = self.covered(years)
+        predictions = np.empty(len(years))
+        predictions[covered] = self.lookup.predict(X[covered])
+        if not covered.all():
+            if self._model is None:
+                self._model = self._load_model()
+            predictions[~covered] = self._model.predict(X[~covered])
+        return predictions
+
+
+def build_lookup(model_path=MODEL_PATH, lookup_path=LOOKUP_PATH, max_years=MAX_YEARS):
+    """Predict the whole input grid of the model in one call and save it next to the model."""
+    steps = load_steps(model_path)
+    countries = steps['le_country'].classes_
+    education_levels = steps['le_education'].classes_
+    years = np.arange(max_years + 1)
+
+    # Cartesian grid in (country, education, years) order
+    country_codes, education_codes, grid_years = np.meshgrid(
+        np.arange(len(countries)), np.arange(len(education_levels)), years, indexing='ij')
+    X = feature_matrix(country_codes.ravel(), education_codes.ravel(), grid_years.ravel())
+    table = steps['model'].predict(X).reshape(len(countries), len(education_levels), len(years))
+
+    np.savez(
+        lookup_path,
+        table=table,
+        countries=countries.astype(str),
+        education_levels=education_levels.astype(str),
+        model_sha256=np.array(model_hash(model_path)),
+    )
+    return lookup_path
+
+
+def _read_lookup(lookup_path, model_path):
+    with np.load(lookup_path) as saved:
+        # A table built from another model is ignored (the model file is optional)
+        if os.path.exists(model_path) and str(saved['model_sha256']) != model_hash(model_path):
+            return None
+        return PredictionTable(saved['table'], saved['countries'], saved['education_levels'])
+
+
+def load_lookup(lookup_path=LOOKUP_PATH, model_path=MODEL_PATH):
+    """Return the PredictionTable of the current model, or None if it is missing or stale."""
+    if not os.path.exists(lookup_path):
+        return None
+    return load_cached(('lookup', lookup_path), [lookup_path, model_path], lambda: _read_lookup(lookup_path, model_path))
+
+
+def load_table_first(lookup_path=LOOKUP_PATH, model_path=MODEL_PATH):
+    """Return a TableFirstRegressor on the current prediction table, or None without one."""
+    lookup = load_lookup(lookup_path, model_path)
+    return None if lookup is None else TableFirstRegressor(lookup)
+
+
+def main():
+    print(f'Prediction table written: {build_lookup()}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+"""
+Piecewise-linear salary table model.
+
+One salary curve over the years of experience per (country, education level)
+pair: a piecewise-linear function with its knots at KNOTS years (flat before
+the first and after the last). Fitting is least squares on the linear
+interpolation weights of every row, with a penalty on the curvature of the
+curve and a shrinkage of the curves of the pairs with few answers towards
+the curve of their country, itself shrunk towards the curve of all the
+answers. Every curve is found with a single batched solve of the normal
+equations of all the groups, so fitting takes a few vectorized passes over
+the data.
+
+The fitted model is the array of the salaries at the knots, shape
+(countries, education levels, knots): a prediction is two lookups and an
+interpolation. Codes the model was not fitted on fall back to the prior
+curves of the fit: an unknown education level to the curve of its country,
+an unknown country to the curve of all the answers, and the pickle is a few kilobytes. It only needs NumPy, so the
+app can load it without scikit-learn. utils/engines.py benchmarks it against
+the random forest.
+"""
+
+import numpy as np
+
+from utils.prediction import FEATURES
+
+# Years of experience of the knots of the curves
+KNOTS = [0, 1, 2, 3, 5, 7, 10, 15, 20, 25, 30, 40, 50]
+
+# Weight of the curvature penalty and of the prior curve, in answers per knot
+SMOOTHING = 5.0
+SHRINKAGE = 20.0
+
+
+def _segments(knots, years):
+    # Knot starting the segment of every row and the weight of the next knot
+    years = np.clip(years, knots[0], knots[-1])
+    start = np.clip(np.searchsorted(knots, years, side='right') - 1, 0, len(knots) - 2)
+    weight = (years - knots[start]) / (knots[start + 1] - knots[start])
+    return start, weight
+
+
+def _fit_curves(groups, n_groups, start, weight, y, prior, shrinkage, smoothing):
+    """Knot values of the curve of every group, shape (n_groups, knots), shrunk towards `prior`."""
+    n_knots = prior.shape[1]
+    # Normal equations of all the groups at once: every row touches two knots
+    gram = np.zeros(n_groups * n_knots * n_knots)
+    rhs = np.zeros(n_groups * n_knots)
+    weights = (1 - weight, weight)
+    for i in range(2):
+        rhs += np.bincount(groups * n_knots + start + i, weights=weights[i] * y, minlength=len(rhs))
+        for j in range(2):
+            index = (groups * n_knots + start + i) * n_knots + start + j
+            gram += np.bincount(index, weights=weights[i] * weights[j], minlength=len(gram))
+    gram = gram.reshape(n_groups, n_knots, n_knots)
+    rhs = rhs.reshape(n_groups, n_knots)
+
+    # Second differences of the knot values (curvature of the curve)
+    second = np.diff(np.eye(n_knots), n=2, axis=0)
+    gram += smoothing * second.T @ second + shrinkage * np.eye(n_knots)
+    rhs += shrinkage * prior
+    return np.linalg.solve(gram, rhs[..., None])[..., 0]
+
+
+class PiecewiseLinearTable:
+    """Regressor with a piecewise-linear experience curve per (country, education level)."""
+
+    def __init__(self, knots=KNOTS, smoothing=SMOOTHING, shrinkage=SHRINKAGE):
+        self.knots = knots
+        self.smoothing = smoothing
+        self.shrinkage = shrinkage
+
+    def fit(self, X, y):
+        country, education, years = self._features(X)
+        y = np.asarray(y, dtype=float)
+        knots = np.asarray(self.knots, dtype=float)
+        n_countries, n_education = country.max() + 1, education.max() + 1
+        start, weight = _segments(knots, years)
+
+        # All the answers, then every country, then every (country, education) pair
+        flat = np.full((1, len(knots)), y.mean())
+        overall = _fit_curves(np.zeros(len(y), dtype=np.int64), 1, start, weight, y, flat, 1e-6, self.smoothing)
+        by_country = _fit_curves(country, n_countries, start, weight, y, np.repeat(overall, n_countries, axis=0),
+                                 self.shrinkage, self.smoothing)
+        pairs = _fit_curves(country * n_education + education, n_countries * n_education, start, weight, y,
+                            np.repeat(by_country, n_education, axis=0), self.shrinkage, self.smoothing)
+        self.table_ = pairs.reshape(n_countries, n_education, len(knots))
+        self.country_curves_ = by_country
+        self.overall_curve_ = overall[0]
+        self.knots_ = knots
+        return self
+
+    def predict(self, X):
+        country, education, years = self._features(X)
+        start, weight = _segments(self.knots_, years)
+        curves = self._curves(country, education)
+        rows = np.arange(len(years))
+        return (1 - weight) * curves[rows, start] + weight * curves[rows, start + 1]
+
+    def _curves(self, country, education):
+        # Curve of every row: its pair's, else its country's, else the one of all the answers
+        n_countries, n_education = self.table_.shape[:2]
+        known_country = (country >= 0) & (country < n_countries)
+        known_pair = known_country & (education >= 0) & (education < n_education)
+        if known_pair.all():
+            return self.table_[country, education]
+        if not hasattr(self, 'overall_curve_'):
+            raise ValueError(f'Country or education codes outside the {n_countries} x {n_education} codes the '
+                             'model was fitted on (refit it to predict them from the prior curves)')
+        curves = np.repeat(self.overall_curve_[None], len(country), axis=0)
+        curves[known_country] = self.country_curves_[country[known_country]]
+        curves[known_pair] = self.table_[country[known_pair], education[known_pair]]
+        return curves
+
+    @staticmethod
+    def _features(X):
+        if hasattr(X, 'columns'):
+            X = X[FEATURES].to_numpy()
+        X = np.asarray(X, dtype=float).reshape(-1, len(FEATURES))
+        return X[:, 0].astype(np.int64), X[:, 1].astype(np.int64), X[:, 2]
@@ -0,0 +1,62 @@
+"""
+Matplotlib rendering without the pyplot state machine.
+
+pyplot keeps every figure it creates in a process-wide registry until it is
+closed, and draws on an implicit "current figure" shared by all the threads
+of the process, so the Streamlit sessions leaked a Figure on every rerun and
+could draw on each other's figures. The figures of the pages are instead
+plain matplotlib.figure.Figure objects with their own Agg canvas, which
+nothing else references: they are drawn through their axes (seaborn gets
+`ax=`), rendered to PNG bytes and cleared right away.
+
+plt.style.use() changed the style of the whole process; styles are applied
+with a style context while a figure is drawn. Styles and rcParams are still
+global, so the drawings run one at a time under a lock.
+"""
+
+import io
+import threading
+from contextlib import contextmanager
+
+# Resolution of the PNG images (the one st.pyplot uses)
+PNG_DPI = 200
+STYLE = 'dark_background'
+
+_lock = threading.RLock()
+_backend_set = False
+
+
+@contextmanager
+def drawing(style=STYLE):
+    """Draw with `style` on the Agg backend, one drawing at a time."""
+    global _backend_set
+    import matplotlib
+    import matplotlib.style
+
+    with _lock:
+        if not _backend_set:
+            # No GUI backend: seaborn imports pyplot, which would pick one
+            matplotlib.use('Agg')
+            _backend_set = True
+        with matplotlib.style.context(style):
+            yield
+
+
+def new_figure(figsize):
+    """A Figure with its own Agg canvas, not registered in pyplot."""
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize=figsize)
+    FigureCanvasAgg(fig)
+    return fig
+
+
+def to_png(fig, dpi=PNG_DPI):
+    """Render `fig` to PNG bytes and release what it holds."""
+    buffer = io.BytesIO()
+    try:
+        fig.savefig(buffer, format='png', dpi=dpi, bbox_inches='tight')
+    finally:
+        fig.clear()
+    return buffer.getvalue()
@@ -0,0 +1,164 @@
+"""
+Prediction service used by the Salary Prediction page.
+
+The model and label encoders are loaded once per process (and again only
+when Models/saved_steps.pkl changes), from the cheapest artifact available. Projections over several years of
+experience are answered with a single vectorized `predict` call on a feature
+matrix holding one row per year, instead of one call per year.
+
+Prediction intervals are the quantiles (QUANTILES) of the predictions of the
+individual trees of the exported forest (Models/forest.npz, only written for
+random forest models). They are computed from a single pass of the whole
+projection through all the trees (CompactForest.predict_trees), so they
+show how much the trees disagree, not the spread of the observed salaries.
+
+When SALARY_APP_PREDICTION_URL is set, the page does not load the model at
+all and asks the prediction server at that URL (utils/prediction_server.py).
+"""
+
+import os
+import pickle
+
+import numpy as np
+import pandas as pd
+
+from utils.cache import file_hash, load_cached
+from utils.data import MODELS_DIR
+
+MODEL_PATH = os.path.join(MODELS_DIR, 'saved_steps.pkl')
+PREDICTION_URL = os.environ.get('SALARY_APP_PREDICTION_URL')
+FEATURES = ['Country', 'EdLevel', 'YearsCodePro']
+
+# Default and maximum number of years shown in the salary projection
+DEFAULT_HORIZON = 10
+MAX_HORIZON = 40
+
+# Quantiles of the tree predictions drawn as the prediction interval, and their column names
+QUANTILES = [0.1, 0.5, 0.9]
+QUANTILE_COLUMNS = ['P10', 'P50', 'P90']
+
+
+class LabelCodes:
+    """Minimal stand-in for a fitted LabelEncoder, built from its sorted classes."""
+
+    def __init__(self, classes):
+        self.classes_ = np.asarray(classes)
+
+    def transform(self, values):
+        values = np.asarray(values)
+        if not np.isin(values, self.classes_).all():
+            raise ValueError(f'y contains previously unseen labels: {values}')
+        return np.searchsorted(self.classes_, values)
+
+
+def load_steps(path=MODEL_PATH):
+    """Return the dict with 'model', 'le_country' and 'le_education', unpickling it only if the file changed."""
+    def unpickle():
+        with open(path, 'rb') as file:
+            return pickle.load(file)
+
+    return load_cached(('steps', path), [path], unpickle)
+
+
+def model_hash(model_path=MODEL_PATH):
+    # Hashed once per version of the model file
+    return load_cached(('model_hash', model_path), [model_path], lambda: file_hash(model_path))
+
+
+def load_regressor():
+    """
+    Return the regressor and the country and education encoders, using the
+    cheapest artifact that matches the saved model: the prediction table
+    (utils/lookup.py), the compact forest (utils/forest.py) or the pickle.
+    """
+    from utils.forest import load_forest
+    from utils.lookup import load_lookup
+
+    for load in (load_lookup, load_forest):
+        regressor = load()
+        if regressor is not None:
+            return regressor, regressor.le_country, regressor.le_education
+    steps = load_steps()
+    return steps['model'], steps['le_country'], steps['le_education']
+
+
+def load_full_model():
+    """Return a regressor of any input (also fractional years): the compact forest, else the pickled model."""
+    from utils.forest import load_forest
+
+    forest = load_forest()
+    return forest if forest is not None else load_steps()['model']
+
+
+def feature_matrix(country_code, education_code, years):
+    # One row per value of `years` with the same country and education
+    years = np.asarray(years, dtype=float)
+    return pd.DataFrame({
+        'Country': np.full(len(years), country_code),
+        'EdLevel': np.full(len(years), education_code),
+        'YearsCodePro': years,
+    }, columns=FEATURES)
+
+
+def project_salaries(model, country_code, education_code, experience, horizon=DEFAULT_HORIZON):
+    """Predict the salary from `experience` to `experience + horizon` years in a single call."""
+    experience_range = np.arange(experience, experience + horizon + 1)
+    predicted_salaries = model.predict(feature_matrix(country_code, education_code, experience_range))
+    return pd.DataFrame({
+        'Years of Experience': experience_range,
+        'Predicted Salary': predicted_salaries
+    })
+
+
+def project_intervals(forest, country_code, education_code, experience, horizon=DEFAULT_HORIZON):
+    """Like project_salaries, with the QUANTILES of the tree predictions of every year (a CompactForest)."""
+    experience_range = np.arange(experience, experience + horizon + 1)
+    mean, quantiles = forest.predict_quantiles(
+        feature_matrix(country_code, education_code, experience_range), QUANTILES)
+    salary_data = pd.DataFrame({
+        'Years of Experience': experience_range,
+        'Predicted Salary': mean
+    })
+    salary_data[QUANTILE_COLUMNS] = quantiles
+    return salary_data
+
+
+class LocalPredictor:
+    """Predictions of the model loaded in this process, by country and education level names."""
+
+    def __init__(self, model, le_country, le_education):
+        self.model = model
+        self.le_country = le_country
+        self.le_education = le_education
+
+    def projection(self, country, education, experience, horizon=DEFAULT_HORIZON):
+        country_code = self.le_country.transform([country])[0]
+        education_code = self.le_education.transform([education])[0]
+        return project_salaries(self.model, country_code, education_code, experience, horizon)
+
+    @property
+    def has_intervals(self):
+        # The trees come from the exported forest (memory-mapped, the pickle is never loaded);
+        # only random forest models have one
+        from utils.forest import load_forest
+
+        return load_forest() is not None
+
+    def intervals(self, country, education, experience, horizon=DEFAULT_HORIZON):
+        from utils.forest import load_forest
+
+        forest = load_forest()
+        if forest is None:
+            raise ValueError('Prediction intervals need the compact forest of a random forest model')
+        country_code = self.le_country.transform([country])[0]
+        education_code = self.le_education.transform([education])[0]
+        return project_intervals(forest, country_code, education_code, experience, horizon)
+
+
+def load_predictor():
+    """Return the client of the prediction server if SALARY_APP_PREDICTION_URL is set, else the local model."""
+    if PREDICTION_URL:
+        from utils.prediction_server import load_client
+
+        return load_client(PREDICTION_URL)
+    return LocalPredictor(*load_regressor())
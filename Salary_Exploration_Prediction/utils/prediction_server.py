@@ -0,0 +1,410 @@
+"""
+Local HTTP/JSON prediction server.
+
+Serves the salary model to the Salary Prediction page and to any other tool
+through a small JSON API:
+
+    GET  /model       countries and education levels the model knows
+    POST /predict     {"country": ..., "education": ..., "experience": ...}
+                      or {"inputs": [{...}, ...]}  ->  {"salary": ...} / {"salaries": [...]}
+    POST /projection  {"country": ..., "education": ..., "experience": ..., "horizon": ...}
+                      ->  {"years": [...], "salaries": [...]}
+    POST /intervals   same body as /projection
+                      ->  {"years": [...], "salaries": [...], "quantiles": {"P10": [...], ...}}
+
+Countries unknown to the model are predicted as 'Other', like on the page.
+/model also returns the hash of the model file; clients send it back with
+every request and the server answers 409 when it serves another model, so
+that they reload the countries and education levels.
+
+The server runs WORKERS processes accepting connections on one shared
+listening socket. Every worker answers /predict and /projection from the
+prediction table (utils/lookup.py) when it matches the model, and the years
+the table does not cover (fractional or beyond it) from the compact forest
+(utils/forest.py), which is memory-mapped, so the OS keeps a single copy of
+the model for all of them. Inside a worker, the predictions and projections handled at the same
+time by its threads are micro-batched: a batcher thread takes every request
+waiting in its queue and answers all of them with a single predict call. The
+requests arriving while a batch is predicted make the next one, so under load
+the batches grow without delaying a lone request; --batch-wait-ms makes every
+batch also wait for more requests. /intervals needs the prediction of every
+tree and is answered by its own single pass through the forest. From the app
+folder:
+
+    python -m utils.prediction_server --port 8600 --workers 4
+
+and point the page at it with SALARY_APP_PREDICTION_URL=http://127.0.0.1:8600.
+benchmarks/prediction_server.py load-tests it.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import queue
+import signal
+import socket
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pandas as pd
+
+from utils.cache import load_cached
+from utils.prediction import (DEFAULT_HORIZON, FEATURES, MAX_HORIZON, MODEL_PATH, QUANTILE_COLUMNS, LabelCodes,
+                              load_regressor, model_hash, project_intervals)
+
+DEFAULT_PORT = 8600
+WORKERS = min(4, os.cpu_count() or 1)
+
+# Largest number of rows predicted in one call and time waited for more requests before it
+MAX_BATCH_ROWS = 4096
+BATCH_WAIT_SECONDS = 0
+
+# Largest years of experience accepted when the model is not the prediction table
+MAX_YEARS = 100
+
+
+def load_model():
+    """
+    Return the model and its encoders: the prediction table backed by the
+    full model, else the memory-mapped forest shared by the workers, else the
+    pickled model.
+    """
+    from utils.forest import load_forest
+    from utils.lookup import load_table_first
+
+    for load in (load_table_first, load_forest):
+        model = load()
+        if model is not None:
+            return model, model.le_country, model.le_education
+    return load_regressor()
+
+
+class Batcher:
+    """Predicts the rows of concurrent requests together, in a single call per batch."""
+
+    def __init__(self, model, max_rows=MAX_BATCH_ROWS, wait=BATCH_WAIT_SECONDS):
+        self.model = model
+        self.max_rows = max_rows
+        self.wait = wait
+        self.batches = 0
+        self.rows = 0
+        self._queue = queue.Queue()
+        threading.Thread(target=self._run, name='batcher', daemon=True).start()
+
+    def predict(self, X):
+        """Predictions of the rows of X, shape (rows, 3), computed with the rows of other requests."""
+        result = Future()
+        self._queue.put((X, result))
+        return result.result()
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        rows = len(batch[0][0])
+        deadline = time.perf_counter() + self.wait
+        while rows < self.max_rows:
+            try:
+                # Whatever is already waiting, then more until the deadline
+                if self.wait:
+                    item = self._queue.get(timeout=max(deadline - time.perf_counter(), 0))
+                else:
+                    item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            batch.append(item)
+            rows += len(item[0])
+        return batch
+
+    def _predict(self, X):
+        return np.asarray(self.model.predict(pd.DataFrame(X, columns=FEATURES)), dtype=float)
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            X = np.concatenate([X for X, _ in batch])
+            try:
+                predictions = self._predict(X)
+            except Exception:
+                # One invalid request fails alone, not with the whole batch
+                for X, result in batch:
+                    try:
+                        result.set_result(self._predict(X))
+                    except Exception as error:
+                        result.set_exception(error)
+                continue
+            self.batches += 1
+            self.rows += len(X)
+            offsets = np.cumsum([0] + [len(X) for X, _ in batch])
+            for (_, result), start, end in zip(batch, offsets[:-1], offsets[1:]):
+                result.set_result(predictions[start:end])
+
+
+class PredictionService:
+    """Validation and encoding of the inputs of the API, predicted through a Batcher."""
+
+    def __init__(self, model, le_country, le_education, batch_wait=BATCH_WAIT_SECONDS, model_sha256=''):
+        self.model_name = type(model).__name__
+        self.model_sha256 = model_sha256
+        self.le_country = le_country
+        self.le_education = le_education
+        # The prediction table (utils/lookup.py) only covers whole years up to its size
+        self.whole_years = hasattr(model, 'table')
+        self.max_years = model.table.shape[2] - 1 if self.whole_years else MAX_YEARS
+        self.batcher = Batcher(model, wait=batch_wait)
+
+    def describe(self):
+        from utils.forest import load_forest
+
+        return {
+            'model': self.model_name,
+            'model_sha256': self.model_sha256,
+            'intervals': load_forest() is not None,
+            'countries': self.le_country.classes_.tolist(),
+            'education_levels': self.le_education.classes_.tolist(),
+            'pid': os.getpid(),
+            'batches': self.batcher.batches,
+            'rows': self.batcher.rows,
+        }
+
+    def encode(self, country, education, experience):
+        # Feature row of one input; unknown countries become 'Other' like on the page
+        if country not in self.le_country.classes_:
+            country = 'Other'
+        if education not in self.le_education.classes_:
+            raise ValueError(f'Unknown education level: {education!r}')
+        experience = float(experience)
+        self.check_years(experience)
+        return [self.le_country.transform([country])[0], self.le_education.transform([education])[0], experience]
+
+    def check_years(self, first, last=None):
+        # Years of experience from `first` to `last` must be covered by the model
+        last = first if last is None else last
+        if not 0 <= first <= last <= self.max_years:
+            raise ValueError(f'Years of experience out of range: {first:g} to {last:g} '
+                             f'(the model covers 0 to {self.max_years})')
+        if self.whole_years and first % 1 != 0:
+            raise ValueError(f'Years of experience must be whole numbers with this model: {first:g}')
+
+    def predict(self, inputs):
+        X = np.array([self.encode(item['country'], item['education'], item['experience']) for item in inputs],
+                     dtype=float).reshape(-1, len(FEATURES))
+        return self.batcher.predict(X).tolist()
+
+    def _horizon(self, experience, horizon):
+        horizon = int(horizon)
+        if not 1 <= horizon <= MAX_HORIZON:
+            raise ValueError(f'Horizon out of range: {horizon}')
+        self.check_years(experience, experience + horizon)
+        return horizon
+
+    def projection(self, country, education, experience, horizon=DEFAULT_HORIZON):
+        row = self.encode(country, education, experience)
+        horizon = self._horizon(row[2], horizon)
+        X = np.tile(np.array(row, dtype=float), (horizon + 1, 1))
+        years = X[:, 2] + np.arange(horizon + 1)
+        X[:, 2] = years
+        return {'years': years.tolist(), 'salaries': self.batcher.predict(X).tolist()}
+
+    def intervals(self, country, education, experience, horizon=DEFAULT_HORIZON):
+        from utils.forest import load_forest
+
+        forest = load_forest()
+        if forest is None:
+            raise ValueError('Prediction intervals need the compact forest of a random forest model')
+        country_code, education_code, experience = self.encode(country, education, experience)
+        salary_data = project_intervals(forest, country_code, education_code, experience,
+                                        self._horizon(experience, horizon))
+        return {
+            'years': salary_data['Years of Experience'].tolist(),
+            'salaries': salary_data['Predicted Salary'].tolist(),
+            'quantiles': {column: salary_data[column].tolist() for column in QUANTILE_COLUMNS},
+        }
+
+
+class PredictionHandler(BaseHTTPRequestHandler):
+    # Keep-alive connections; headers and body are written apart, so Nagle's algorithm would delay the body
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        if self.path.split('?')[0] in ('/model', '/health'):
+            self._reply(200, self.server.service.describe())
+        else:
+            self._reply(404, {'error': f'Unknown path {self.path}'})
+
+    def do_POST(self):
+        service = self.server.service
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+            path = self.path.split('?')[0]
+            # The client encoded its inputs for another model
+            if body.get('model_sha256', service.model_sha256) != service.model_sha256:
+                self._reply(409, {'error': 'The server serves another model', 'model_sha256': service.model_sha256})
+                return
+            if path == '/predict':
+                if 'inputs' in body:
+                    result = {'salaries': service.predict(body['inputs'])}
+                else:
+                    result = {'salary': service.predict([body])[0]}
+            elif path in ('/projection', '/intervals'):
+                answer = service.projection if path == '/projection' else service.intervals
+                result = answer(body['country'], body['education'], body['experience'],
+                                body.get('horizon', DEFAULT_HORIZON))
+            else:
+                self._reply(404, {'error': f'Unknown path {self.path}'})
+                return
+        except KeyError as error:
+            self._reply(400, {'error': f'Missing field {error}'})
+        except (ValueError, TypeError) as error:
+            self._reply(400, {'error': str(error)})
+        except Exception as error:
+            # Any other failure is still answered, so that the client does not see a dropped connection
+            self._reply(500, {'error': f'{type(error).__name__}: {error}'})
+        else:
+            self._reply(200, result)
+
+    def _reply(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        if self.server.verbose:
+            super().log_message(*args)
+
+
+def _serve_socket(listener, batch_wait, verbose):
+    # One worker: a threaded HTTP server on the shared listening socket
+    model, le_country, le_education = load_model()
+    model_sha256 = model_hash() if os.path.exists(MODEL_PATH) else ''
+    server = ThreadingHTTPServer(listener.getsockname()[:2], PredictionHandler, bind_and_activate=False)
+    server.socket.close()
+    server.socket = listener
+    server.daemon_threads = True
+    server.service = PredictionService(model, le_country, le_education, batch_wait, model_sha256)
+    server.verbose = verbose
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+def _interrupt(signum, frame):
+    raise KeyboardInterrupt
+
+
+def serve(host='127.0.0.1', port=DEFAULT_PORT, workers=WORKERS, batch_wait=BATCH_WAIT_SECONDS, verbose=False):
+    """Serve the API on host:port from `workers` processes until interrupted."""
+    listener = socket.create_server((host, port), backlog=1024)
+    # Stopped with SIGTERM like with Ctrl+C, so that the workers are stopped too
+    signal.signal(signal.SIGTERM, _interrupt)
+    if workers <= 1:
+        _serve_socket(listener, batch_wait, verbose)
+        return
+    processes = [multiprocessing.Process(target=_serve_socket, args=(listener, batch_wait, verbose), daemon=True)
+                 for _ in range(workers)]
+    for process in processes:
+        process.start()
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for process in processes:
+            process.terminate()
+        listener.close()
+
+
+class ModelChanged(ValueError):
+    """The server answered for another model than the one the client encoded for."""
+
+
+class PredictionClient:
+    """Client of the prediction server with the interface of utils.prediction.LocalPredictor."""
+
+    def __init__(self, url, timeout=10):
+        self.url = url.rstrip('/')
+        self.timeout = timeout
+        self.refresh()
+
+    def refresh(self):
+        """Load the hash, countries and education levels of the model the server serves."""
+        model = self._call('/model')
+        self.model_sha256 = model.get('model_sha256', '')
+        self.le_country = LabelCodes(model['countries'])
+        self.le_education = LabelCodes(model['education_levels'])
+        self.has_intervals = model.get('intervals', False)
+
+    def _call(self, path, payload=None):
+        if payload is None:
+            return self._request(path)
+        try:
+            return self._request(path, {**payload, 'model_sha256': self.model_sha256})
+        except ModelChanged:
+            # The model was replaced since the classes were loaded: reload them and ask again
+            self.refresh()
+            return self._request(path, {**payload, 'model_sha256': self.model_sha256})
+
+    def _request(self, path, payload=None):
+        data = None if payload is None else json.dumps(payload).encode()
+        request = urllib.request.Request(self.url + path, data=data, headers={'Content-Type': 'application/json'})
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return json.load(response)
+        except urllib.error.HTTPError as error:
+            # Errors of the API carry their message in a JSON body
+            try:
+                message = json.load(error)['error']
+            except (ValueError, KeyError):
+                message = str(error)
+            if error.code == 409:
+                raise ModelChanged(message) from None
+            raise ValueError(f'Prediction server error {error.code}: {message}') from None
+
+    def predict(self, country, education, experience):
+        return self._call('/predict', {'country': country, 'education': education, 'experience': experience})['salary']
+
+    def projection(self, country, education, experience, horizon=DEFAULT_HORIZON):
+        result = self._call('/projection', {'country': country, 'education': education,
+                                            'experience': experience, 'horizon': horizon})
+        return pd.DataFrame({'Years of Experience': result['years'], 'Predicted Salary': result['salaries']})
+
+    def intervals(self, country, education, experience, horizon=DEFAULT_HORIZON):
+        result = self._call('/intervals', {'country': country, 'education': education,
+                                           'experience': experience, 'horizon': horizon})
+        return pd.DataFrame({'Years of Experience': result['years'], 'Predicted Salary': result['salaries'],
+                             **result['quantiles']})
+
+
+def load_client(url):
+    """
+    Return the client of the server at `url`, created once per process; it
+    reloads the classes of the model by itself when the server's model changes.
+    """
+    return load_cached(('prediction_client', url), [], lambda: PredictionClient(url))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Serve the salary model over HTTP/JSON.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--workers', type=int, default=WORKERS, help='Worker processes')
+    parser.add_argument('--batch-wait-ms', type=float, default=BATCH_WAIT_SECONDS * 1000,
+                        help='Time a batch waits for more concurrent requests')
+    parser.add_argument('--verbose', action='store_true', help='Log every request')
+    args = parser.parse_args(argv)
+    print(f'Serving predictions on http://{args.host}:{args.port} with {args.workers} workers')
+    serve(args.host, args.port, args.workers, args.batch_wait_ms / 1000, args.verbose)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,294 @@
+"""
+Opt-in per-rerun profiling of the pages.
+
+Each page calls `start(page)` at its top and `finish()` at its bottom, and
+wraps its hot paths in `phase(name)` blocks: 'load', 'filter', 'groupby',
+'predict', 'figure' (building a figure) and 'serialize' (turning it into what
+is sent to the browser). Phases may nest; the time of each one excludes the
+phases inside it, and whatever is outside every phase is reported as 'other'.
+When profiling is off every call returns immediately.
+
+Profiling is turned on for the whole process with the environment variable
+SALARY_APP_PROFILE=1 (or =panel), or for one session with the query
+parameter ?profile=1 (or ?profile=panel). Every profiled rerun is then:
+
+- logged as one JSON line on the 'salary_app.profile' logger (stderr);
+- added to process-wide totals, served in the Prometheus text format on
+  http://localhost:<port>/metrics when SALARY_APP_METRICS_PORT is set;
+- shown in a debug panel of the sidebar with 'panel'.
+
+A full cProfile of a rerun is taken for ?cprofile=1 or for a random share of
+the reruns given by SALARY_APP_CPROFILE_SAMPLE (e.g. 0.01). The dump is kept,
+in SALARY_APP_PROFILE_DIR, only when the rerun took at least
+SALARY_APP_SLOW_RERUN_SECONDS, so that the dumps explain the slow reruns.
+
+A rerun Streamlit interrupts (st.rerun, st.stop, a newer widget value, an
+exception) never reaches `finish()`. The next `start()` stops its cProfile
+profiler and logs it as interrupted instead, once its script thread has moved
+on to a new rerun or has ended.
+"""
+
+import cProfile
+import json
+import logging
+import os
+import random
+import tempfile
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+PHASES = ['load', 'filter', 'groupby', 'predict', 'figure', 'serialize']
+
+PROFILE_DIR = os.environ.get('SALARY_APP_PROFILE_DIR') or os.path.join(tempfile.gettempdir(), 'salary-app-profiles')
+CPROFILE_SAMPLE = float(os.environ.get('SALARY_APP_CPROFILE_SAMPLE') or 0)
+SLOW_RERUN_SECONDS = float(os.environ.get('SALARY_APP_SLOW_RERUN_SECONDS') or 0)
+METRICS_PORT = os.environ.get('SALARY_APP_METRICS_PORT')
+
+logger = logging.getLogger('salary_app.profile')
+if not logger.handlers:
+    logger.addHandler(logging.StreamHandler())
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+# Every session runs its page in its own script thread
+_local = threading.local()
+_NO_PHASE = nullcontext()
+
+# Unfinished reruns by script thread (see _finish_interrupted())
+_running = {}
+_running_lock = threading.Lock()
+
+# Process-wide totals: (page, phase) -> [count, seconds]
+_totals = {}
+_totals_lock = threading.Lock()
+_server = None
+
+
+class RerunProfile:
+    """Exclusive time of every phase of one rerun of a page."""
+
+    def __init__(self, page, panel=False, profiler=None):
+        self.page = page
+        self.panel = panel
+        self.profiler = profiler
+        self.phases = {}
+        self._stack = []
+        self._start = time.perf_counter()
+
+    def phase(self, name):
+        return _Phase(self, name)
+
+    def summary(self):
+        total = time.perf_counter() - self._start
+        # Known phases first, in pipeline order
+        names = sorted(self.phases, key=lambda name: PHASES.index(name) if name in PHASES else len(PHASES))
+        phases = {name: round(self.phases[name], 6) for name in names}
+        phases['other'] = round(max(total - sum(self.phases.values()), 0), 6)
+        return {'page': self.page, 'total_seconds': round(total, 6), 'phases': phases}
+
+
+class _Phase:
+
+    def __init__(self, profile, name):
+        self.profile = profile
+        self.name = name
+
+    def __enter__(self):
+        # [start, time spent in nested phases]
+        self.profile._stack.append([time.perf_counter(), 0.0])
+        return self
+
+    def __exit__(self, *exc_info):
+        start, nested = self.profile._stack.pop()
+        elapsed = time.perf_counter() - start
+        phases = self.profile.phases
+        phases[self.name] = phases.get(self.name, 0.0) + elapsed - nested
+        if self.profile._stack:
+            self.profile._stack[-1][1] += elapsed
+        return False
+
+
+def _query_param(name):
+    import streamlit as st
+
+    try:
+        return st.query_params.get(name)
+    except Exception:
+        # Not running in a Streamlit session
+        return None
+
+
+def start(page):
+    """Start profiling a rerun of `page` if profiling is on; return the profile or None."""
+    _finish_interrupted()
+    mode = _query_param('profile') or os.environ.get('SALARY_APP_PROFILE')
+    if not mode or mode == '0':
+        _local.profile = None
+        return None
+    profiler = None
+    if _query_param('cprofile') == '1' or (CPROFILE_SAMPLE and random.random() < CPROFILE_SAMPLE):
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Another session is being profiled (one profiler at a time on Python 3.12+)
+            profiler = None
+    _local.profile = RerunProfile(page, panel=mode == 'panel', profiler=profiler)
+    with _running_lock:
+        _running[threading.current_thread()] = _local.profile
+    if METRICS_PORT:
+        serve_metrics(int(METRICS_PORT))
+    return _local.profile
+
+
+def current():
+    return getattr(_local, 'profile', None)
+
+
+@contextmanager
+def use(profile):
+    """Time the phases of the current thread into `profile` (for work run in other threads)."""
+    previous = current()
+    _local.profile = profile
+    try:
+        yield profile
+    finally:
+        _local.profile = previous
+
+
+def add_phases(phases):
+    # Add phases timed in another thread to the current rerun
+    profile = current()
+    if profile is not None:
+        for name, seconds in phases.items():
+            profile.phases[name] = profile.phases.get(name, 0.0) + seconds
+
+
+def phase(name):
+    """Context manager timing `name` in the current rerun (does nothing when profiling is off)."""
+    profile = current()
+    return profile.phase(name) if profile is not None else _NO_PHASE
+
+
+def _finish_interrupted():
+    # Finish the reruns of this thread (interrupted before finish()) and of the ended threads
+    this_thread = threading.current_thread()
+    with _running_lock:
+        stale = [(thread, profile) for thread, profile in _running.items()
+                 if thread is this_thread or not thread.is_alive()]
+        for thread, _ in stale:
+            del _running[thread]
+    for _, profile in stale:
+        _record(profile, interrupted=True)
+    if stale:
+        _local.profile = None
+
+
+def finish():
+    """Record the current rerun: JSON log, Prometheus totals, cProfile dump and debug panel."""
+    profile = current()
+    if profile is None:
+        return None
+    _local.profile = None
+    with _running_lock:
+        _running.pop(threading.current_thread(), None)
+    return _record(profile)
+
+
+def _record(profile, interrupted=False):
+    if profile.profiler is not None:
+        # First, so that nothing below can leave it running
+        profile.profiler.disable()
+    summary = profile.summary()
+    if interrupted:
+        # Its total runs until it was found: only logged, not added to the totals
+        summary['interrupted'] = True
+        logger.info(json.dumps(dict(summary, time=time.time())))
+        return summary
+    if profile.profiler is not None:
+        if summary['total_seconds'] >= SLOW_RERUN_SECONDS:
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            path = os.path.join(PROFILE_DIR, f"{profile.page}-{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}.prof")
+            profile.profiler.dump_stats(path)
+            summary['cprofile'] = path
+
+    with _totals_lock:
+        for name, seconds in [('total', summary['total_seconds'])] + list(summary['phases'].items()):
+            entry = _totals.setdefault((profile.page, name), [0, 0.0])
+            entry[0] += 1
+            entry[1] += seconds
+    logger.info(json.dumps(dict(summary, time=time.time())))
+    if profile.panel:
+        show_panel(summary)
+    return summary
+
+
+def show_panel(summary):
+    import streamlit as st
+
+    with st.sidebar.expander('Rerun profile', expanded=True):
+        st.write(f"Total: **{summary['total_seconds'] * 1000:.1f} ms**")
+        st.table({
+            'phase': list(summary['phases']),
+            'ms': [round(seconds * 1000, 1) for seconds in summary['phases'].values()],
+        })
+        if 'cprofile' in summary:
+            st.write(f"cProfile dump: `{summary['cprofile']}`")
+
+
+def metrics_text():
+    """Process-wide totals in the Prometheus text exposition format."""
+    with _totals_lock:
+        totals = sorted(_totals.items())
+    lines = [
+        '# HELP salary_app_rerun_seconds Time spent in the reruns of the pages.',
+        '# TYPE salary_app_rerun_seconds summary',
+    ]
+    for (page, name), (count, seconds) in totals:
+        if name == 'total':
+            lines.append(f'salary_app_rerun_seconds_count{{page="{page}"}} {count}')
+            lines.append(f'salary_app_rerun_seconds_sum{{page="{page}"}} {seconds:.6f}')
+    lines += [
+        '# HELP salary_app_phase_seconds Exclusive time spent in each phase of the reruns.',
+        '# TYPE salary_app_phase_seconds summary',
+    ]
+    for (page, name), (count, seconds) in totals:
+        if name != 'total':
+            lines.append(f'salary_app_phase_seconds_count{{page="{page}",phase="{name}"}} {count}')
+            lines.append(f'salary_app_phase_seconds_sum{{page="{page}",phase="{name}"}} {seconds:.6f}')
+    return '\n'.join(lines) + '\n'
+
+
+def serve_metrics(port):
+    """Serve metrics_text() on http://localhost:<port>/metrics from a background thread (once)."""
+    global _server
+    with _totals_lock:
+        if _server is not None:
+            return _server
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = metrics_text().encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        try:
+            _server = ThreadingHTTPServer(('127.0.0.1', port), MetricsHandler)
+        except OSError as error:
+            # Port taken (e.g. by another worker): keep the totals in the logs only
+            logger.warning(f'Metrics endpoint not started on port {port}: {error}')
+            _server = False
+            return _server
+        threading.Thread(target=_server.serve_forever, daemon=True).start()
+        return _server
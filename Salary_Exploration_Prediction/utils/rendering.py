@@ -0,0 +1,151 @@
+"""
+Non-blocking loading and figure rendering for the pages.
+
+Loading a dataset or building a figure that is not cached yet can take
+seconds. Instead of running that work in the script thread of the session,
+the pages submit it to a thread pool shared by all the sessions of the
+process and bounded to RENDER_WORKERS threads, show a placeholder while it
+runs and fill the placeholder when the result is ready. The same work
+requested by several sessions (same key) runs only once and all of them wait
+for it.
+
+When the user switches section while a result is pending, Streamlit stops the
+rerun at the next update of the placeholder; the work of the stopped rerun
+that no other session is waiting for is then cancelled if it has not started
+yet (work already running completes and lands in the caches, so it is not
+lost).
+
+Set SALARY_APP_ASYNC_RENDER=0 to run everything in the script thread.
+"""
+
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError
+
+from utils import profiling
+from utils.figure_cache import cached_plotly, cached_pyplot, figure_key
+
+RENDER_WORKERS = int(os.environ.get('SALARY_APP_RENDER_WORKERS') or min(4, os.cpu_count() or 1))
+ENABLED = os.environ.get('SALARY_APP_ASYNC_RENDER', '1') != '0'
+
+# Time before a placeholder message appears (avoids flickering for cached
+# results) and between its updates, which are the points where a stopped
+# rerun is interrupted
+PLACEHOLDER_DELAY = 0.1
+POLL_SECONDS = 0.25
+
+_pool = ThreadPoolExecutor(max_workers=RENDER_WORKERS, thread_name_prefix='render')
+
+# Work in flight: key -> Task
+_tasks = {}
+# Reentrant: cancelling a future runs its done callback, which takes the lock again
+_lock = threading.RLock()
+
+# Tasks submitted by the current script run and not awaited yet
+_local = threading.local()
+
+
+class Task:
+    """Work running in the pool, shared by every rerun waiting for its key."""
+
+    def __init__(self, key):
+        self.key = key
+        self.future = None
+        self.waiters = 0
+
+    def wait(self, placeholder=None, message='Loading...'):
+        """Return the result, showing `message` in `placeholder` while it is pending."""
+        pending = getattr(_local, 'pending', [])
+        try:
+            start = time.perf_counter()
+            timeout = PLACEHOLDER_DELAY
+            while True:
+                try:
+                    result, phases = self.future.result(timeout=timeout)
+                    profiling.add_phases(phases)
+                    return result
+                except TimeoutError:
+                    timeout = POLL_SECONDS
+                    if placeholder is not None:
+                        # Also where Streamlit stops this rerun if a new one was requested
+                        placeholder.caption(f'⏳ {message} ({time.perf_counter() - start:.0f} s)')
+        except BaseException:
+            # The rerun is stopped: give up everything it submitted
+            for task in list(pending):
+                if task is not self:
+                    _release(task)
+            pending.clear()
+            raise
+        finally:
+            if self in pending:
+                pending.remove(self)
+            _release(self)
+
+
+def _release(task):
+    with _lock:
+        task.waiters -= 1
+        if task.waiters == 0 and not task.future.done():
+            # Nobody wants it any more: drop it unless it is already running
+            if task.future.cancel():
+                _tasks.pop(task.key, None)
+
+
+def _run(work, profiled):
+    # The phases of the work are timed apart and added to the profile of every rerun waiting for it
+    if not profiled:
+        return work(), {}
+    profile = profiling.RerunProfile('render')
+    with profiling.use(profile):
+        return work(), profile.phases
+
+
+def submit(key, work):
+    """Run `work()` in the pool (once for all the reruns asking for `key`) and return its Task."""
+    if not ENABLED:
+        # Run in the script thread, which times the phases itself
+        task = Task(key)
+        task.future = Future()
+        task.future.set_result((work(), {}))
+        task.waiters = 1
+        return task
+    with _lock:
+        task = _tasks.get(key)
+        if task is None:
+            task = _tasks[key] = Task(key)
+            task.future = _pool.submit(_run, work, profiling.current() is not None)
+            task.future.add_done_callback(lambda future: _forget(task))
+        task.waiters += 1
+    if not hasattr(_local, 'pending'):
+        _local.pending = []
+    _local.pending.append(task)
+    return task
+
+
+def _forget(task):
+    with _lock:
+        if _tasks.get(task.key) is task:
+            del _tasks[task.key]
+
+
+def render(key, work, placeholder=None, message='Loading...'):
+    """Return `work()`, computed in the pool while `placeholder` shows `message`."""
+    return submit(key, work).wait(placeholder, message)
+
+
+def render_pyplot(section, filters, datasets, build, placeholder=None):
+    """PNG bytes of cached_pyplot(), rendered in the pool."""
+    return render(('pyplot',) + figure_key(section, filters, datasets),
+                  lambda: cached_pyplot(section, filters, datasets, build), placeholder, 'Drawing the figure')
+
+
+def submit_plotly(section, filters, datasets, build):
+    """Start building the figure of cached_plotly() in the pool; wait for it with the Task."""
+    return submit(('plotly',) + figure_key(section, filters, datasets),
+                  lambda: cached_plotly(section, filters, datasets, build))
+
+
+def render_plotly(section, filters, datasets, build, placeholder=None):
+    """Figure of cached_plotly(), built in the pool."""
+    return submit_plotly(section, filters, datasets, build).wait(placeholder, 'Building the figure')
@@ -0,0 +1,319 @@
+"""
+Bulk salary scoring of candidate rosters.
+
+A roster is a CSV or Parquet file with one candidate per row and a country,
+an education level and years of professional experience (columns Country,
+EdLevel and YearsCodePro, or country, education and experience). It is read
+and scored CHUNK_ROWS rows at a time, so the memory used depends on the
+chunk size and not on the size of the roster:
+
+- countries the model does not know are scored as 'Other', like on the
+  Salary Prediction page;
+- education levels are taken as they are when the model knows them and
+  cleaned like the survey answers when they are one (e.g. "Master’s degree
+  (M.A., M.S., M.Eng., MBA, etc.)"), see utils/cleaning.py; other levels
+  (empty, "PhD", ...) are unrecognized: no Scored EdLevel and no prediction;
+- experience accepts numbers and the survey's 'Less than 1 year' and
+  'More than 50 years'; rows without a valid experience get no prediction.
+
+Every chunk is encoded and predicted with one vectorized call: rows with a
+whole number of years are read from the prediction table (utils/lookup.py)
+when it is available, the others go through the compact forest (or the
+pickled model when there is none). The scored rows
+(the roster columns plus Scored Country, Scored EdLevel and Predicted Salary)
+are appended to the output file as soon as their chunk is done. With
+`workers` > 1 the chunks are scored in a pool of processes. From the app
+folder:
+
+    python -m utils.scoring roster.csv scored.csv --workers 4
+"""
+
+import argparse
+import io
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+import weakref
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+from utils.cleaning import clean_education, is_education_answer
+from utils.prediction import FEATURES, load_regressor
+
+CHUNK_ROWS = 100000
+
+# Accepted names of the roster columns (compared case-insensitively)
+COLUMN_NAMES = {
+    'Country': ['country'],
+    'EdLevel': ['edlevel', 'education', 'education level', 'education_level'],
+    'YearsCodePro': ['yearscodepro', 'experience', 'years of experience', 'years_of_experience'],
+}
+EXPERIENCE_TEXT = {'More than 50 years': '50', 'Less than 1 year': '0.5'}
+
+
+def is_parquet(name):
+    return str(name).lower().endswith(('.parquet', '.pq'))
+
+
+def _parquet():
+    try:
+        import pyarrow.parquet
+    except ImportError:
+        raise RuntimeError('Parquet rosters need pyarrow') from None
+    return pyarrow.parquet
+
+
+def roster_columns(columns):
+    """Map the Country, EdLevel and YearsCodePro features to the matching columns of a roster."""
+    names = {str(column).strip().lower(): column for column in columns}
+    found = {}
+    for feature, aliases in COLUMN_NAMES.items():
+        column = next((names[alias] for alias in [feature.lower()] + aliases if alias in names), None)
+        if column is None:
+            raise ValueError(f'The roster has no {feature} column (or {", ".join(aliases)})')
+        found[feature] = column
+    return found
+
+
+def count_rows(source, name=None):
+    """Number of rows of a roster (path or file object), for the progress; None if unknown."""
+    if is_parquet(name or source):
+        return _parquet().ParquetFile(source).metadata.num_rows
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, 'rb') as file:
+            lines = sum(block.count(b'\n') for block in iter(lambda: file.read(1 << 20), b''))
+    elif hasattr(source, 'getbuffer'):
+        lines = bytes(source.getbuffer()).count(b'\n')
+    else:
+        return None
+    # Without the header (quoted line breaks make this an estimate)
+    return max(lines - 1, 0)
+
+
+def read_roster(source, name=None, chunk_rows=CHUNK_ROWS):
+    """Yield the rows of a CSV or Parquet roster (path or file object), `chunk_rows` at a time."""
+    if is_parquet(name or source):
+        for batch in _parquet().ParquetFile(source).iter_batches(batch_size=chunk_rows):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(source, chunksize=chunk_rows, dtype=str, keep_default_na=False)
+
+
+class RosterScorer:
+    """Normalizes, encodes and predicts chunks of a roster."""
+
+    def __init__(self):
+        from utils.lookup import load_table_first
+
+        # The prediction table answers whole years; the other rows go through the forest, else the pickle
+        self.model = load_table_first()
+        if self.model is None:
+            self.model = load_regressor()[0]
+        self.le_country = self.model.le_country
+        self.le_education = self.model.le_education
+        self.other_code = np.searchsorted(self.le_country.classes_, 'Other')
+        if 'Other' not in self.le_country.classes_:
+            self.other_code = -1
+
+    def encode(self, chunk, columns):
+        """Normalized country and education, their codes and the years of experience of every row."""
+        country = chunk[columns['Country']].astype(str).str.strip()
+        country_codes = pd.Index(self.le_country.classes_).get_indexer(country).astype('int64')
+        country_codes[country_codes < 0] = self.other_code
+
+        education = chunk[columns['EdLevel']].astype(str).str.strip()
+        # Survey answers are cleaned; anything else would fall into 'Less than a Bachelors', so it stays unknown
+        known = education.isin(self.le_education.classes_)
+        answer = ~known & is_education_answer(education)
+        education = education.where(known, clean_education(education).where(answer))
+        education_codes = pd.Index(self.le_education.classes_).get_indexer(education).astype('int64')
+
+        experience = chunk[columns['YearsCodePro']].astype(str).str.strip().replace(EXPERIENCE_TEXT)
+        experience = pd.to_numeric(experience, errors='coerce').to_numpy(dtype=float)
+        return country_codes, education_codes, experience
+
+    def predict(self, country_codes, education_codes, experience):
+        """Predictions of the encoded rows (NaN for the rows that cannot be scored)."""
+        predictions = np.full(len(experience), np.nan)
+        # 'inf' parses as a number but no model can predict it
+        valid = (country_codes >= 0) & (education_codes >= 0) & np.isfinite(experience) & (experience >= 0)
+        if valid.any():
+            X = pd.DataFrame({'Country': country_codes[valid], 'EdLevel': education_codes[valid],
+                              'YearsCodePro': experience[valid]}, columns=FEATURES)
+            predictions[valid] = self.model.predict(X)
+        return predictions
+
+    def score(self, chunk):
+        """The chunk with the Scored Country, Scored EdLevel and Predicted Salary columns added."""
+        columns = roster_columns(chunk.columns)
+        country_codes, education_codes, experience = self.encode(chunk, columns)
+        predictions = self.predict(country_codes, education_codes, experience)
+        known_country = country_codes >= 0
+        known_education = education_codes >= 0
+        return chunk.assign(**{
+            'Scored Country': np.where(known_country, self.le_country.classes_[np.maximum(country_codes, 0)], None),
+            'Scored EdLevel': np.where(known_education, self.le_education.classes_[np.maximum(education_codes, 0)],
+                                       None),
+            'Predicted Salary': predictions.round(2),
+        })
+
+
+# Scorer of a worker process of the pool
+_scorer = None
+
+
+def _init_worker():
+    global _scorer
+    _scorer = RosterScorer()
+
+
+def _score_in_worker(chunk):
+    return _scorer.score(chunk)
+
+
+def score_chunks(chunks, workers=1):
+    """Yield the scored chunks in order, scored here or in a pool of `workers` processes."""
+    if workers <= 1:
+        scorer = RosterScorer()
+        for chunk in chunks:
+            yield scorer.score(chunk)
+        return
+    with multiprocessing.Pool(workers, initializer=_init_worker) as pool:
+        # At most two chunks per worker read ahead
+        pending = deque()
+        for chunk in chunks:
+            pending.append(pool.apply_async(_score_in_worker, (chunk,)))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().get()
+        while pending:
+            yield pending.popleft().get()
+
+
+class RosterWriter:
+    """Appends scored chunks to a CSV or Parquet file (path or binary file object)."""
+
+    def __init__(self, output, parquet=None):
+        self.output = output
+        self.parquet = is_parquet(output) if parquet is None else parquet
+        self._parquet_writer = None
+        self._schema = None
+        self._text = None
+
+    def _parquet_schema(self, chunk):
+        # The scored columns have fixed types: inferred from a first chunk where they are all
+        # missing, they would be of type null and the next chunks would not fit
+        import pyarrow as pa
+
+        schema = pa.Schema.from_pandas(chunk, preserve_index=False)
+        for name, type_ in [('Scored Country', pa.string()), ('Scored EdLevel', pa.string()),
+                            ('Predicted Salary', pa.float64())]:
+            schema = schema.set(schema.get_field_index(name), pa.field(name, type_))
+        return schema
+
+    def write(self, chunk):
+        if self.parquet:
+            import pyarrow as pa
+
+            if self._parquet_writer is None:
+                self._schema = self._parquet_schema(chunk)
+                self._parquet_writer = _parquet().ParquetWriter(self.output, self._schema)
+            self._parquet_writer.write_table(pa.Table.from_pandas(chunk, schema=self._schema, preserve_index=False))
+            return
+        header = self._text is None
+        if header:
+            if isinstance(self.output, (str, os.PathLike)):
+                self._text = open(self.output, 'w', newline='', encoding='utf-8')
+            else:
+                self._text = io.TextIOWrapper(self.output, encoding='utf-8', newline='', write_through=True)
+        chunk.to_csv(self._text, index=False, header=header)
+
+    def close(self):
+        if self._parquet_writer is not None:
+            self._parquet_writer.close()
+        if self._text is not None:
+            if isinstance(self.output, (str, os.PathLike)):
+                self._text.close()
+            else:
+                # Leave the caller's file open
+                self._text.detach()
+
+
+class ScoredRoster:
+    """
+    A scored roster kept in a temporary file, deleted with this object (when
+    it is replaced or when the session that holds it ends) or by `delete()`.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.rows = 0
+        file, self.path = tempfile.mkstemp(prefix='scored_roster_', suffix=os.path.splitext(name)[1])
+        os.close(file)
+        self._delete = weakref.finalize(self, _remove, self.path)
+
+    def read(self):
+        with open(self.path, 'rb') as file:
+            return file.read()
+
+    def delete(self):
+        self._delete()
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def score_file(source, output, name=None, chunk_rows=CHUNK_ROWS, workers=1, progress=None, output_name=None):
+    """
+    Score the roster `source` into `output` (paths or file objects; `name` and
+    `output_name` tell the format of file objects) and return the number of
+    rows scored.
+    `progress(rows_done, total_rows)` is called after every chunk (total_rows
+    is None when it cannot be known in advance).
+    """
+    total = count_rows(source, name)
+    if hasattr(source, 'seek'):
+        source.seek(0)
+    writer = RosterWriter(output, is_parquet(output_name or output))
+    rows = 0
+    try:
+        for scored in score_chunks(read_roster(source, name, chunk_rows), workers):
+            writer.write(scored)
+            rows += len(scored)
+            if progress is not None:
+                progress(rows, total)
+    finally:
+        writer.close()
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Predict the salary of every candidate of a roster.')
+    parser.add_argument('roster', help='CSV or Parquet file with country, education and experience columns')
+    parser.add_argument('output', help='Scored roster (.csv or .parquet)')
+    parser.add_argument('--chunk-rows', type=int, default=CHUNK_ROWS, help='Rows scored at a time')
+    parser.add_argument('--workers', type=int, default=1, help='Processes scoring chunks in parallel')
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+
+    def report(rows, total):
+        elapsed = time.perf_counter() - start
+        done = f'{rows}/{total}' if total else str(rows)
+        print(f'\r{done} rows, {rows / elapsed:,.0f} rows/s', end='', file=sys.stderr, flush=True)
+
+    rows = score_file(args.roster, args.output, chunk_rows=args.chunk_rows, workers=args.workers, progress=report)
+    elapsed = time.perf_counter() - start
+    print(f'\n{rows} rows scored into {args.output} in {elapsed:.1f} s '
+          f'({rows / elapsed * 60 / 1e6:.2f} M rows/min)', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
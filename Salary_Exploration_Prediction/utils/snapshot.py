@@ -0,0 +1,137 @@
+"""
+Columnar snapshots of the app datasets.
+
+A snapshot is an uncompressed Feather (Arrow IPC) copy of a CSV dataset with
+compact dtypes (categoricals for the text columns, float32 for the numbers),
+so the pages can memory-map it instead of parsing text: the numeric columns
+without nulls are read-only views of the mapped file (no copy), and only the
+codes of the categoricals and the columns with nulls are converted into new
+arrays. Each snapshot records the modification time and size of the CSV it
+was built from; when the CSV changes afterwards the snapshot is considered
+stale and ignored.
+
+Rows appended to a CSV (see utils/aggregates.py) are not written into its
+snapshot, which would mean rewriting all of it: each batch is written next to
+it as a delta file (dataset.delta-0001.feather, ...) tagged with the
+signatures of the CSV before and after the append, and the readers
+concatenate the snapshot and its deltas. The snapshot stays fresh as long as
+the deltas follow each other up to the current CSV. The columns of a snapshot
+with deltas are no longer views of a single mapped file and are copied when
+read; rebuilding the snapshot folds the deltas into it.
+
+Build the snapshots from the app folder after running the notebook:
+
+    python -m utils.snapshot
+"""
+
+import glob
+import os
+
+from utils.cache import file_signature
+
+try:
+    import pyarrow as pa
+    from pyarrow import feather
+except ImportError:  # pragma: no cover - the app falls back to CSV
+    pa = None
+    feather = None
+
+# Keys of the schema metadata holding the signature of the source CSV, and for
+# a delta the signature of the CSV before its rows were appended
+SOURCE_KEY = b'source_signature'
+PREVIOUS_KEY = b'previous_signature'
+
+
+def available():
+    return feather is not None
+
+
+def snapshot_path(csv_path):
+    return os.path.splitext(csv_path)[0] + '.feather'
+
+
+def _encode_signature(signature):
+    return '{}:{}'.format(*signature).encode()
+
+
+def delta_paths(path):
+    """The delta files of the snapshot at `path`, in the order they were appended."""
+    return sorted(glob.glob(glob.escape(os.path.splitext(path)[0]) + '.delta-*.feather'))
+
+
+def _write(table, path, metadata):
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}), **metadata})
+    # Compression would prevent memory-mapping the columns
+    feather.write_feather(table, path, compression='uncompressed')
+
+
+def write_snapshot(df, path, source_path):
+    """Write `df` as a memory-mappable Feather file tagged with the signature of `source_path`."""
+    _write(pa.Table.from_pandas(df, preserve_index=False), path,
+           {SOURCE_KEY: _encode_signature(file_signature(source_path))})
+    # The rows of the deltas are in `df`
+    for delta in delta_paths(path):
+        os.remove(delta)
+
+
+def _schema(path):
+    with pa.memory_map(path) as source:
+        return pa.ipc.open_file(source).schema
+
+
+def append_snapshot(df, path, source_path, previous_signature):
+    """
+    Write the rows of `df`, just appended to `source_path` whose signature was
+    `previous_signature`, as the next delta of the snapshot at `path`.
+    """
+    deltas = delta_paths(path)
+    number = int(deltas[-1].rsplit('-', 1)[1].split('.')[0]) + 1 if deltas else 1
+    # Same column types as the snapshot, so that the readers can concatenate them
+    table = pa.Table.from_pandas(df, schema=_schema(path).remove_metadata(), preserve_index=False)
+    delta = f'{os.path.splitext(path)[0]}.delta-{number:04d}.feather'
+    _write(table, delta, {SOURCE_KEY: _encode_signature(file_signature(source_path)),
+                          PREVIOUS_KEY: _encode_signature(previous_signature)})
+    return delta
+
+
+def is_fresh(path, source_path):
+    """Return True if the snapshot at `path` (with its deltas) can be used instead of `source_path`."""
+    if not available() or not os.path.exists(path):
+        return False
+    if not os.path.exists(source_path):
+        # The snapshot is all we have
+        return True
+    recorded = (_schema(path).metadata or {}).get(SOURCE_KEY)
+    for delta in delta_paths(path):
+        metadata = _schema(delta).metadata or {}
+        if metadata.get(PREVIOUS_KEY) != recorded:
+            return False
+        recorded = metadata.get(SOURCE_KEY)
+    return recorded == _encode_signature(file_signature(source_path))
+
+
+def read_snapshot(path, columns=None):
+    """Read the snapshot at `path` and its deltas, memory-mapping the files (see the module docstring)."""
+    table = feather.read_table(path, columns=columns, memory_map=True)
+    deltas = delta_paths(path)
+    if deltas:
+        # With the pandas metadata of the snapshot, for all the rows
+        metadata = table.schema.metadata
+        table = pa.concat_tables([table] + [feather.read_table(delta, columns=columns, memory_map=True)
+                                            .replace_schema_metadata(metadata) for delta in deltas])
+    # One block per column: consolidating the blocks would copy the mapped columns
+    return table.to_pandas(split_blocks=True)
+
+
+def main():
+    from utils.country_summary import SUMMARY_PATH, build_country_summary
+    from utils.data import build_snapshots
+
+    for path in build_snapshots():
+        print(f'Snapshot written: {path}')
+    build_country_summary()
+    print(f'Country summary written: {SUMMARY_PATH}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+"""
+Pre-aggregated salary statistics for the Salary Exploration panel.
+
+Instead of filtering the model dataset with a boolean mask on every rerun,
+the index keeps count, sum, sum of squares, min and max of the salaries for
+every (Country, EdLevel, YearsCodePro) group, plus the same statistics
+combined for the partial keys (Country, EdLevel) and (Country,). Looking up a
+selection is then a dictionary access, and the partial keys give a fallback
+when a selection has no respondents.
+
+The group statistics (group_statistics, combine and with_moments) are also
+what the Overview aggregates are made of, see utils/aggregates.py. Like the
+aggregates, the group statistics of the model dataset are persisted next to
+it (Data/model_statistics.feather, tagged with the signature of
+dataset_model.csv), so that appending a batch of responses only merges the
+statistics of the batch into them.
+"""
+
+import math
+
+import numpy as np
+import pandas as pd
+
+from utils import snapshot
+from utils.cache import load_cached
+from utils.data import data_path, dataset_paths, load_model_data
+
+STATISTICS_PATH = data_path('model_statistics.feather')
+
+KEYS = ['Country', 'EdLevel', 'YearsCodePro']
+
+# How each statistic combines when groups are merged
+COMBINE = {'count': 'sum', 'sum': 'sum', 'sum_sq': 'sum', 'min': 'min', 'max': 'max'}
+
+# Statistics answered for a selection
+STATISTICS = ['count', 'mean', 'std', 'min', 'max']
+
+
+def group_statistics(df, keys=KEYS):
+    """count, sum, sum_sq, min and max of the salaries of `df` per `keys`."""
+    salary = df['Salary'].astype('float64')
+    return df[keys].assign(Salary=salary, SalarySq=salary ** 2).groupby(keys).agg(
+        count=('Salary', 'size'),
+        sum=('Salary', 'sum'),
+        sum_sq=('SalarySq', 'sum'),
+        min=('Salary', 'min'),
+        max=('Salary', 'max'),
+    )
+
+
+def combine(groups, keys):
+    """Merge the statistics of `groups` (indexed by KEYS, possibly repeated) per `keys`."""
+    return groups.groupby(level=keys).agg(COMBINE)
+
+
+def with_moments(groups):
+    """`groups` with the mean and the sample standard deviation (ddof=1, like pandas) of every group."""
+    groups = groups.copy()
+    groups['mean'] = groups['sum'] / groups['count']
+    variance = (groups['sum_sq'] - groups['sum'] ** 2 / groups['count']).clip(lower=0) / (groups['count'] - 1)
+    groups['std'] = np.sqrt(variance.where(groups['count'] > 1))
+    return groups
+
+
+def _normalize(key):
+    # Label codes as ints and years as floats, whatever dtype they come with
+    return tuple(int(value) if i < 2 else float(value) for i, value in enumerate(key))
+
+
+class SalaryStatsIndex:
+    """Salary statistics per (Country, EdLevel, YearsCodePro) group and per key prefix."""
+
+    def __init__(self, groups):
+        self.groups = groups
+        # One dictionary per key length: 1 (Country), 2 (+ EdLevel) and 3 (+ YearsCodePro)
+        self._tables = {}
+        for depth in range(1, len(KEYS) + 1):
+            level = groups if depth == len(KEYS) else combine(groups, KEYS[:depth])
+            level = with_moments(level)[STATISTICS]
+            keys = level.index if depth > 1 else [(key,) for key in level.index]
+            self._tables[depth] = {
+                _normalize(key): row for key, row in zip(keys, level.itertuples(index=False, name=None))
+            }
+
+    @classmethod
+    def from_frame(cls, df):
+        return cls(group_statistics(df))
+
+    def append(self, df):
+        """A new index with the rows of `df` added, at the cost of the batch and the number of groups."""
+        return SalaryStatsIndex(combine(pd.concat([self.groups, group_statistics(df)]), KEYS))
+
+    def get(self, country, education=None, experience=None):
+        """Return count, mean, std, min and max of the salaries matching the given key prefix."""
+        key = tuple(value for value in (country, education, experience) if value is not None)
+        row = self._tables[len(key)].get(_normalize(key))
+        return summarize(row)
+
+
+def summarize(row):
+    # Statistics of a group (NaN when the group is empty)
+    if row is None:
+        return {'count': 0, 'mean': math.nan, 'std': math.nan, 'min': math.nan, 'max': math.nan}
+    return {'count': int(row[0]), **{name: float(value) for name, value in zip(STATISTICS[1:], row[1:])}}
+
+
+def write_statistics(index, path=STATISTICS_PATH):
+    snapshot.write_snapshot(index.groups.reset_index(), path, dataset_paths('model')[0])
+
+
+def read_statistics(path=STATISTICS_PATH):
+    return SalaryStatsIndex(snapshot.read_snapshot(path).set_index(KEYS))
+
+
+def build_stats_index(path=STATISTICS_PATH):
+    """Index the whole model dataset and persist its group statistics next to the data."""
+    index = SalaryStatsIndex.from_frame(load_model_data())
+    if snapshot.available():
+        try:
+            write_statistics(index, path)
+        except OSError:
+            # Read-only data folder: keep the index in memory only
+            pass
+    return index
+
+
+def _read():
+    if snapshot.is_fresh(STATISTICS_PATH, dataset_paths('model')[0]):
+        return read_statistics(STATISTICS_PATH)
+    return build_stats_index(STATISTICS_PATH)
+
+
+def load_stats_index():
+    """Return the index of the model dataset, built once per version of the dataset."""
+    return load_cached(('stats_index',), list(dataset_paths('model')) + [STATISTICS_PATH], _read)
@@ -0,0 +1,229 @@
+"""
+Training pipeline for the salary prediction model.
+
+Reproduces the stages of Salary_Exploration_Prediction.ipynb without Jupyter:
+column selection, null removal, full-time filter, the country cut-off, the
+salary range filter, experience and education cleaning (see
+utils/cleaning.py), label encoding and a GridSearchCV over the random forest
+hyperparameters. The grid search winner is one of the candidate engines of
+utils/engines.py, which are all trained on the same split: the model kept
+is the one with the lowest test RMSE within the latency and size budget.
+
+Each run writes a versioned artifact folder (Models/versions/<version>/) with
+the pickled model and label encoders, a manifest.json recording the data
+hash, the parameters and the test metrics, and engines.json with the
+trade-off table of all the candidate engines, and promotes it to
+Models/saved_steps.pkl, the file the app loads (rebuilding its prediction
+table and, for a random forest, its compact forest, see utils/lookup.py and
+utils/forest.py). Run it from the app folder:
+
+    python -m utils.training --survey Data/survey_results_public.csv --n-jobs -1
+"""
+
+import argparse
+import json
+import os
+import pickle
+import shutil
+import time
+
+import numpy as np
+import pandas as pd
+import sklearn
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.metrics import mean_squared_error, r2_score
+from sklearn.model_selection import GridSearchCV, train_test_split
+from sklearn.preprocessing import LabelEncoder
+
+from utils.cache import file_hash
+from utils.cleaning import COUNTRY_CUTOFF, SALARY_RANGE, SELECTED_COLUMNS, clean_survey
+from utils.data import DATA_DIR, MODELS_DIR, build_snapshots
+from utils.forest import export_saved_model
+from utils.lookup import build_lookup
+
+FEATURES = ['Country', 'EdLevel', 'YearsCodePro']
+
+# Defaults of the notebook
+PARAM_GRID = {'max_depth': [6, 8, 10, 12], 'n_estimators': [50, 100, 200, 300, 500]}
+TEST_SIZE = 0.2
+RANDOM_STATE = 42
+
+
+def encode(df):
+    """Label-encode Country and EdLevel, returning the encoded dataset and both encoders."""
+    le_education = LabelEncoder()
+    le_country = LabelEncoder()
+    df = df.assign(
+        EdLevel=le_education.fit_transform(df['EdLevel']),
+        Country=le_country.fit_transform(df['Country']),
+    )
+    return df, le_country, le_education
+
+
+def split(model_df):
+    # Same split as the notebook
+    X = model_df[FEATURES]
+    y = model_df['Salary']
+    return train_test_split(X, y, test_size=TEST_SIZE, random_state=RANDOM_STATE)
+
+
+def fit_model(X_train, y_train, param_grid=PARAM_GRID, cv=5, n_jobs=-1):
+    """Run the grid search over the random forest and return the fitted search."""
+    gs = GridSearchCV(
+        RandomForestRegressor(random_state=RANDOM_STATE),
+        param_grid,
+        scoring='neg_mean_squared_error',
+        cv=cv,
+        n_jobs=n_jobs,
+    )
+    gs.fit(X_train, y_train)
+    return gs
+
+
+def evaluate(model, X_test, y_test):
+    y_pred = model.predict(X_test)
+    mse = mean_squared_error(y_test, y_pred)
+    return {'mse': float(mse), 'rmse': float(np.sqrt(mse)), 'r2': float(r2_score(y_test, y_pred))}
+
+
+def save_artifact(steps, manifest, models_dir=MODELS_DIR, promote=True, engines=None):
+    """Write a versioned artifact folder and optionally make it the model used by the app."""
+    from utils.engines import TABLE_FILE
+
+    version_dir = os.path.join(models_dir, 'versions', manifest['version'])
+    os.makedirs(version_dir, exist_ok=True)
+    model_path = os.path.join(version_dir, 'saved_steps.pkl')
+    with open(model_path, 'wb') as file:
+        pickle.dump(steps, file)
+    files = ['manifest.json']
+    with open(os.path.join(version_dir, 'manifest.json'), 'w') as file:
+        json.dump(manifest, file, indent=2)
+    if engines is not None:
+        files.append(TABLE_FILE)
+        with open(os.path.join(version_dir, TABLE_FILE), 'w') as file:
+            json.dump(engines, file, indent=2)
+    if promote:
+        shutil.copyfile(model_path, os.path.join(models_dir, 'saved_steps.pkl'))
+        for name in files:
+            shutil.copyfile(os.path.join(version_dir, name), os.path.join(models_dir, name))
+        build_lookup(os.path.join(models_dir, 'saved_steps.pkl'), os.path.join(models_dir, 'prediction_lookup.npz'))
+        # Only forests have trees to flatten; a forest.npz left from an older model is ignored as stale
+        if hasattr(steps['model'], 'estimators_'):
+            export_saved_model(os.path.join(models_dir, 'saved_steps.pkl'), os.path.join(models_dir, 'forest.npz'))
+    return version_dir
+
+
+def run(survey_path, data_dir=DATA_DIR, models_dir=MODELS_DIR, cutoff=COUNTRY_CUTOFF,
+        param_grid=PARAM_GRID, cv=5, n_jobs=-1, promote=True, engines=None, budget=None, log=print):
+    """
+    Run the whole pipeline and return the folder of the written artifact.
+    `engines` are the candidate engines (all of utils.engines.ENGINES by
+    default) and `budget` their latency and size budget (utils.engines.BUDGET).
+    """
+    from utils.engines import BUDGET, benchmark, select_engine, trade_offs
+
+    budget = budget or BUDGET
+    start = time.perf_counter()
+    data_hash = file_hash(survey_path)
+    survey = pd.read_csv(survey_path, usecols=SELECTED_COLUMNS)
+    log(f'Loaded {len(survey)} survey rows from {survey_path}')
+
+    overview_df = clean_survey(survey, cutoff)
+    model_df, le_country, le_education = encode(overview_df)
+    log(f'Cleaned dataset: {len(model_df)} rows, {len(le_country.classes_)} countries')
+
+    # Datasets read by the app
+    if data_dir is not None:
+        os.makedirs(data_dir, exist_ok=True)
+        overview_df.to_csv(os.path.join(data_dir, 'dataset_overview.csv'), index=False)
+        model_df.to_csv(os.path.join(data_dir, 'dataset_model.csv'), index=False)
+        if os.path.abspath(data_dir) == os.path.abspath(DATA_DIR):
+            build_snapshots(['overview', 'model'])
+
+    X_train, X_test, y_train, y_test = split(model_df)
+    models, table = benchmark(X_train, X_test, y_train, y_test, engines, param_grid, cv, n_jobs, log)
+    engine, fits = select_engine(table, budget)
+    selected = next(row for row in table if row['engine'] == engine)
+    metrics = {name: selected[name] for name in ('mse', 'rmse', 'r2')}
+    log(f'Selected engine: {engine} {selected["params"]}, test RMSE: ${metrics["rmse"]:,.02f}, '
+        f'R2: {metrics["r2"]:.4f}' + ('' if fits else ' (no engine within the budget)'))
+
+    manifest = {
+        'version': time.strftime('%Y%m%dT%H%M%S') + '-' + data_hash[:8],
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'data': {
+            'file': os.path.basename(survey_path),
+            'sha256': data_hash,
+            'rows': len(survey),
+            'model_rows': len(model_df),
+        },
+        'params': {
+            'country_cutoff': cutoff,
+            'salary_range': list(SALARY_RANGE),
+            'test_size': TEST_SIZE,
+            'random_state': RANDOM_STATE,
+            'cv': cv,
+            'param_grid': param_grid,
+            'engine': engine,
+            'best_params': selected['params'],
+            'budget': budget,
+            'within_budget': fits,
+        },
+        'metrics': metrics,
+        'countries': le_country.classes_.tolist(),
+        'education_levels': le_education.classes_.tolist(),
+        'sklearn_version': sklearn.__version__,
+        'training_seconds': round(time.perf_counter() - start, 2),
+    }
+    steps = {'model': models[engine], 'le_country': le_country, 'le_education': le_education}
+    version_dir = save_artifact(steps, manifest, models_dir, promote, trade_offs(table, engine, budget))
+    log(f'Model written to {version_dir}')
+    return version_dir
+
+
+def _int_list(text):
+    return [int(value) for value in text.split(',')]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Train the salary prediction model.')
+    parser.add_argument('--survey', default=os.path.join(DATA_DIR, 'survey_results_public.csv'),
+                        help='Survey responses CSV')
+    parser.add_argument('--data-dir', default=DATA_DIR, help='Where to write the cleaned datasets')
+    parser.add_argument('--models-dir', default=MODELS_DIR, help='Where to write the model artifacts')
+    parser.add_argument('--cutoff', type=int, default=COUNTRY_CUTOFF,
+                        help='Minimum registers per country before grouping it into "Other"')
+    parser.add_argument('--max-depth', type=_int_list, default=PARAM_GRID['max_depth'],
+                        help='Comma-separated max_depth values to search')
+    parser.add_argument('--n-estimators', type=_int_list, default=PARAM_GRID['n_estimators'],
+                        help='Comma-separated n_estimators values to search')
+    parser.add_argument('--cv', type=int, default=5, help='Cross-validation folds')
+    parser.add_argument('--n-jobs', type=int, default=-1, help='Parallel jobs of the grid search')
+    parser.add_argument('--engines', nargs='*', help='Candidate engines of utils/engines.py (all by default)')
+    parser.add_argument('--max-single-row-ms', type=float, help='Largest accepted latency of a one-row prediction')
+    parser.add_argument('--max-batch-ms', type=float, help='Largest accepted latency of a batch prediction')
+    parser.add_argument('--max-size-mb', type=float, help='Largest accepted size of the pickled model')
+    parser.add_argument('--no-promote', action='store_true',
+                        help='Do not replace Models/saved_steps.pkl with the new model')
+    args = parser.parse_args(argv)
+
+    from utils.engines import BUDGET
+
+    limits = {'single_row_ms': args.max_single_row_ms, 'batch_ms': args.max_batch_ms, 'size_mb': args.max_size_mb}
+    budget = {name: BUDGET[name] if limit is None else limit for name, limit in limits.items()}
+    run(
+        args.survey,
+        data_dir=args.data_dir,
+        models_dir=args.models_dir,
+        cutoff=args.cutoff,
+        param_grid={'max_depth': args.max_depth, 'n_estimators': args.n_estimators},
+        cv=args.cv,
+        n_jobs=args.n_jobs,
+        promote=not args.no_promote,
+        engines=args.engines,
+        budget=budget,
+    )
+
+
+if __name__ == '__main__':
+    main()